@@ -317,6 +317,22 @@ class BotEnginePyTest:
         # Logging service names to render
         self.logging_service_names = []
 
+        # No execution profiler while testing
+        self.profiler = None
+
+    #============================================================================
+    # Profiler
+    #============================================================================
+    def profile(self, name, size_bytes=None):
+        """
+        Profile a phase of this execution. Nothing is recorded while testing.
+        :param name: Name of this phase
+        :param size_bytes: Number of bytes processed in this phase
+        :return: Context manager for the block of code
+        """
+        import contextlib
+        return contextlib.nullcontext()
+
     #============================================================================
     # Loggers
     #============================================================================
@@ -1806,6 +1822,20 @@ class BotEnginePyTest:
         """
         return True
 
+    def export_analytics(self):
+        """
+        Send the analytics buffered during this execution, as the botengine does while it flushes
+        """
+        try:
+            import analytics
+            analytics_object = analytics.get_analytics(self, must_exist=True)
+
+        except ImportError:
+            return
+
+        if hasattr(analytics_object, "export"):
+            analytics_object.export(self)
+
     #============================================================================
     # Rules
     #============================================================================
@@ -7,14 +7,27 @@ file 'LICENSE.txt', which is part of this source code package.
 @author: David Moss
 '''
 
+import threading
+import weakref
+
 # Analytics Variable Names
 DEPRECATED_ANALYTICS_VARIABLE = "[a]"
 MIXPANEL_VARIABLE = "[mix]"
 AMPLITUDE_VARIABLE = "[amp]"
 
+# Most items we buffer for each analytics service in one execution. Older items are dropped first.
+MAXIMUM_ANALYTICS_ITEMS = 1000
+
 # Global analytics module
 analytics_module = None
 
+# Analytics buffered during each execution, sent once at the end of it
+_buffers = weakref.WeakKeyDictionary()
+
+# HTTP session shared by every analytics service, so warm executions reuse their connections
+_http_session = None
+_http_session_lock = threading.Lock()
+
 def get_analytics(botengine, must_exist=False):
     """
     Required. This is the correct method to use to access your Analytics objects across all microservices.
@@ -26,6 +39,9 @@ def get_analytics(botengine, must_exist=False):
     :param must_exist: True if the analytics module must have been instantiated before attempting to access it now, so we can skip flushing it.
     :return: Analytics object
     """
+    if botengine in _buffers:
+        return _buffers[botengine]
+
     try:
         analytics_deleted = botengine.load_variable("analytics_deleted")
         if analytics_deleted is None:
@@ -39,7 +55,83 @@ def get_analytics(botengine, must_exist=False):
     except:
         pass
 
-    raise ImportError
+    if must_exist:
+        # Nothing was tracked during this execution
+        raise ImportError
+
+    _buffers[botengine] = AnalyticsBuffer()
+    return _buffers[botengine]
+
+
+def _session():
+    """
+    :return: HTTP session shared by every analytics service
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            _http_session = requests.Session()
+        return _http_session
+
+
+class AnalyticsBuffer:
+    """
+    Analytics collected from every microservice during one execution.
+
+    Nothing is sent while the bot executes. botengine.flush_analytics() flushes this buffer with the other outputs,
+    and botengine.export_analytics() then sends one batch to each analytics service in the background.
+    """
+    def __init__(self):
+        # Items to send to each analytics service - { "service": (send, { key: item }) }
+        self.services = {}
+
+    def queue(self, service, send, item, key=None):
+        """
+        Queue up an event or people update to send at the end of this execution
+        :param service: Name of the analytics service
+        :param send: Function to send a batch of items to the service: send(botengine, session, items)
+        :param item: Event or people update, in whatever form the send function expects
+        :param key: Optional key. A newer item with the same key replaces the older one, which is how repeated updates are deduplicated.
+        """
+        if service not in self.services:
+            self.services[service] = (send, {})
+
+        items = self.services[service][1]
+        if key is None:
+            key = object()
+        else:
+            items.pop(key, None)
+
+        items[key] = item
+        while len(items) > MAXIMUM_ANALYTICS_ITEMS:
+            del items[next(iter(items))]
+
+    def flush(self, botengine):
+        """
+        Required. Everything was already queued up, and export() sends it alongside the rest of the flushes.
+        :param botengine: BotEngine
+        """
+        return
+
+    def export(self, botengine):
+        """
+        Send every queued item, one batch per analytics service, through the shared HTTP session
+        :param botengine: BotEngine
+        """
+        if _buffers.get(botengine) is self:
+            del _buffers[botengine]
+
+        services = self.services
+        self.services = {}
+        for service in services:
+            (send, items) = services[service]
+            try:
+                send(botengine, _session(), list(items.values()))
+
+            except Exception as e:
+                import traceback
+                botengine.get_logger(f"{__name__}").warning("analytics.py: Unable to send analytics to {}: {}; {}".format(service, str(e), traceback.format_exc()))
 
 
 class Analytics:
@@ -12,10 +12,16 @@ import localization
 import json
 import utilities.utilities as utilities
 import importlib
+import weakref
+
+import persistence
 
 from startup import StartUpUtil
 from controller import Controller
 
+# Controllers already loaded and tracked during this execution, so reporting statistics doesn't load them all over again
+_loaded_controllers = weakref.WeakKeyDictionary()
+
 def run(botengine):
     """
     Entry point for bot microservices
@@ -35,6 +41,9 @@ def run(botengine):
     """
     localization.initialize(botengine)
 
+    import properties
+    botengine.batch_state_writes = properties.get_property(botengine, "BATCH_STATE_WRITES", complain_if_missing=False) is True
+
     #===========================================================================
     # print("INPUTS: " + json.dumps(botengine.get_inputs(), indent=2, sort_keys=True))
     #===========================================================================
@@ -104,16 +113,18 @@ def run(botengine):
     if trigger_type & botengine.TRIGGER_DATA_REQUEST == 0:
         while len(startup.event_queue) > 0:
             (queue_trigger_type, queue_triggers) = startup.event_queue.pop(0)
-            trigger_event(botengine, controller, queue_trigger_type, queue_triggers)
+            with botengine.profile("trigger_event.{}".format(queue_trigger_type)):
+                trigger_event(botengine, controller, queue_trigger_type, queue_triggers)
 
         # Always save your variables!
-        botengine.save_variable("controller", controller, required_for_each_execution=True)
+        save_controller(botengine, controller)
         startup.reset()
         botengine.save_variable("startup_tool", startup, required_for_each_execution=True)
 
     else:
         # DATA REQUEST
-        trigger_event(botengine, controller, trigger_type, triggers)
+        with botengine.profile("trigger_event.{}".format(trigger_type)):
+            trigger_event(botengine, controller, trigger_type, triggers)
     botengine.get_logger(f"{__name__}").info("<bot()")
 
 def load_controller(botengine):
@@ -123,7 +134,13 @@ def load_controller(botengine):
     """
     botengine.get_logger(f"{__name__}").debug(">load_controller()")
     try:
-        controller = botengine.load_variable("controller")
+        with botengine.profile("controller.load"):
+            controller = botengine.load_variable("controller")
+            if controller is None:
+                controller = persistence.load_controller(botengine)
+                if controller is not None and not persistence.is_enabled(botengine):
+                    # Migrating from a partitioned controller back to a single core variable
+                    persistence.delete_controller(botengine)
     except Exception as e:
         controller = None
         botengine.get_logger(f"{__name__}").warning("|load_controller() Unable to load the controller: {}".format(str(e)))
@@ -131,13 +148,30 @@ def load_controller(botengine):
     if controller is None:
         botengine.get_logger(f"{__name__}").info("|load_controller() Creating a new Controller object. Hello.")
         controller = Controller()
-        botengine.save_variable("controller", controller, required_for_each_execution=True)
+        save_controller(botengine, controller)
 
     botengine.get_logger(f"{__name__}").debug("|load_controller() track devices")
-    controller.track_new_and_deleted_devices(botengine)
+    with botengine.profile("controller.track_devices"):
+        controller.track_new_and_deleted_devices(botengine)
+    _loaded_controllers[botengine] = controller
     botengine.get_logger(f"{__name__}").debug("<load_controller()")
     return controller
 
+def save_controller(botengine, controller):
+    """
+    Save the Controller object, either as a single core variable or partitioned per device and microservice
+    :param botengine: Execution environment
+    :param controller: Controller object
+    """
+    if persistence.is_enabled(botengine):
+        if botengine.load_variable("controller") is not None:
+            # Migrating from a single core variable to a partitioned controller
+            botengine.save_variable("controller", None, required_for_each_execution=True)
+        persistence.save_controller(botengine, controller)
+
+    else:
+        botengine.save_variable("controller", controller, required_for_each_execution=True)
+
 
 def load_startup_tool(botengine):
     """
@@ -160,12 +194,23 @@ def load_startup_tool(botengine):
 
 def get_intelligence_statistics(botengine):
     """
-    Get the microservice statistics
+    Get the microservice statistics, followed by the profile of each phase of this execution
     :param botengine: BotEngine environment
     :return: Microservice statistics
     """
-    controller = load_controller(botengine)
-    return controller.get_intelligence_statistics(botengine)
+    controller = _loaded_controllers.get(botengine)
+    if controller is None:
+        controller = load_controller(botengine)
+
+    stats = controller.get_intelligence_statistics(botengine)
+
+    # Wall time and bytes of each phase of this execution, named apart from the microservice packages
+    if botengine.profiler is not None:
+        for stat in botengine.profiler.get_statistics():
+            stat["name"] = "botengine.{}".format(stat["name"])
+            stats.append(stat)
+
+    return stats
 
 
 def trigger_event(botengine, controller, trigger_type, triggers):
@@ -493,7 +538,7 @@ def _location_intelligence_fired(botengine, argument_tuple):
         import traceback
         botengine.get_logger(f"{__name__}").error("|_location_intelligence_fired() {}; {}".format(str(e), traceback.format_exc()))
 
-    botengine.save_variable("controller", controller, required_for_each_execution=True)
+    save_controller(botengine, controller)
     botengine.get_logger(f"{__name__}").info("<_location_intelligence_fired()")
 
 def start_location_intelligence_timer(botengine, seconds, intelligence_id, argument, reference):
@@ -577,7 +622,7 @@ def _device_intelligence_fired(botengine, argument_tuple):
             import time
             time.sleep(2)
 
-    botengine.save_variable("controller", controller, required_for_each_execution=True)
+    save_controller(botengine, controller)
     botengine.get_logger(f"{__name__}").info("<_device_intelligence_fired()")
     
 
@@ -19,6 +19,12 @@ from devices.button.button_linkhigh import LinkHighButtonDevice
 from devices.gateway.gateway_peoplepower_xseries import PeoplePowerXSeriesDevice
 from devices.movement.touch import TouchDevice
 
+# Device type classes we've already resolved in this process: { device_type: class or None }
+_device_type_classes = {}
+
+# All available device type classes from inspecting the devices directory, when this bot has no device_types.py registry
+_available_device_type_classes = None
+
 class Controller:
     """
     This is the main class that will coordinate all our sensors and behavior
@@ -188,16 +194,12 @@ class Controller:
                         device_object = None
                         continue
                 
-                # Load any available device type class within this bundle
-                device_type_classes = self._extract_available_device_type_classes(botengine)
-                botengine.get_logger(f"{__name__}.{__class__.__name__}").debug("controller: Extracted available device type classes")
-
                 if device_object is None:
                     # Instantiate the device object based on the device type
-                    for device_type_class in device_type_classes:
-                        if device_type in device_type_class.DEVICE_TYPES:
-                            device_object = device_type_class(botengine, location_object, device_id, device_type, device_desc, precache_measurements)
-                            break
+                    device_type_class = self._get_device_type_class(botengine, device_type)
+                    if device_type_class is not None:
+                        device_object = device_type_class(botengine, location_object, device_id, device_type, device_desc, precache_measurements)
+
                     if device_object is None:
                         botengine.get_logger(f"{__name__}.{__class__.__name__}").warn("Unsupported device type: " + str(device_type) + " ('" + device_desc + "')")
                         continue
@@ -589,17 +591,54 @@ class Controller:
         # Notify all locations
         self.new_version(botengine)
 
+    def _get_device_type_class(self, botengine, device_type):
+        """
+        Get the device type class that models the given device type.
+        Generated bots carry a device_types.py registry of { "device_type": { "module": ..., "class": ... } },
+        so we only import the one module we need. Without the registry, we fall back to inspecting the devices directory.
+        :param botengine: BotEngine environment
+        :param device_type: Device type
+        :return: Device type class, or None if this device type is not supported
+        """
+        if device_type in _device_type_classes:
+            return _device_type_classes[device_type]
+
+        device_type_class = None
+        try:
+            import device_types
+            registry = device_types.DEVICE_TYPES
+        except ImportError:
+            registry = None
+
+        if registry is not None:
+            if str(device_type) in registry:
+                import importlib
+                try:
+                    module = importlib.import_module(registry[str(device_type)]["module"])
+                    device_type_class = getattr(module, registry[str(device_type)]["class"])
+                except Exception as e:
+                    botengine.get_logger(f"{__name__}.{__class__.__name__}").warning("controller: Cannot load the device type class for device type {}: {}".format(device_type, e))
+
+        else:
+            for available_device_type_class in self._extract_available_device_type_classes(botengine):
+                if device_type in available_device_type_class.DEVICE_TYPES:
+                    device_type_class = available_device_type_class
+                    break
+
+        _device_type_classes[device_type] = device_type_class
+        return device_type_class
+
     def _extract_available_device_type_classes(self, botengine):
         """
         Extract all available device type classes from a module
         :return List of device type classes
         """
-        # 
-        
-        # Efficiently grab this information once for bot playback
-        if botengine.playback and hasattr(self, "available_device_type_classes"):
-            return self.available_device_type_classes
-        
+        global _available_device_type_classes
+
+        # Efficiently grab this information once for the life of this process
+        if _available_device_type_classes is not None:
+            return _available_device_type_classes
+
         available_device_type_classes = []
         # Walk through our devices directory
         import os
@@ -635,6 +674,5 @@ class Controller:
                             if hasattr(class_, "DEVICE_TYPES") and class_ not in available_device_type_classes:
                                 available_device_type_classes.append(class_)
 
-        if botengine.playback:
-            self.available_device_type_classes = available_device_type_classes
+        _available_device_type_classes = available_device_type_classes
         return available_device_type_classes
\ No newline at end of file
@@ -17,6 +17,12 @@ MAX_ATTEMPTS = 20
 # Time between attempts, in seconds
 TIME_BETWEEN_ATTEMPTS_SEC = 30
 
+# Each unanswered attempt multiplies the time until the next attempt by this much
+ATTEMPT_BACKOFF_MULTIPLIER = 1.5
+
+# Longest time between attempts, in seconds
+MAXIMUM_TIME_BETWEEN_ATTEMPTS_SEC = 300
+
 # Reliability variable name so we prevent typos
 RELIABILITY_VARIABLE_NAME = "reliability"
 
@@ -55,6 +61,227 @@ NEWEST_MEASUREMENT = 0
 VALUE = 0
 TIMESTAMP = 1
 
+class MeasurementHistory:
+    """
+    History of ( value, timestamp ) measurements for a single parameter, newest measurements at index 0.
+
+    This behaves like the list of tuples it replaces, so history[0][0] is still the newest value and history[0][1] its timestamp,
+    and iterating or slicing still returns ( value, timestamp ) tuples newest first.
+
+    Underneath, the values and timestamps are kept oldest first in parallel arrays, so adding a measurement and evicting
+    old measurements are O(1) and duplicate measurements are found in a hashed set instead of a linear scan.
+    """
+
+    def __init__(self, measurements=None):
+        """
+        :param measurements: Optional list of ( value, timestamp ) measurements, newest first
+        """
+        import array
+
+        # Values and timestamps, oldest first, beginning at index self.start.
+        # Values are kept in a typed array while they are all integers or all floats, and in a plain list otherwise.
+        self.values = None
+        self.timestamps = array.array('q')
+        self.start = 0
+
+        # Hashed ( value, timestamp ) pairs to find duplicates
+        self.seen = set()
+
+        # True while every measurement was added in timestamp order, so windows of time can be found with a binary search
+        self.ordered = True
+
+        if measurements is not None:
+            for (value, timestamp) in reversed(list(measurements)):
+                self.add(value, timestamp, deduplicate=False)
+
+    def add(self, value, timestamp, deduplicate=True):
+        """
+        Add the newest measurement
+        :param value: Value
+        :param timestamp: Timestamp in milliseconds
+        :param deduplicate: True to ignore this measurement if it already exists in the history
+        :return: True if the measurement was added
+        """
+        try:
+            key = (value, timestamp)
+            hash(key)
+        except TypeError:
+            # Unhashable value, fall back to a linear search
+            key = None
+
+        if deduplicate:
+            if key is not None:
+                if key in self.seen:
+                    return False
+
+            elif (value, timestamp) in self:
+                return False
+
+        if self.ordered and len(self) > 0:
+            try:
+                self.ordered = timestamp >= self.timestamps[-1]
+            except TypeError:
+                self.ordered = False
+
+        try:
+            self.timestamps.append(timestamp)
+        except (TypeError, OverflowError):
+            # Timestamps that aren't integers get stored in a plain list from now on
+            self.timestamps = list(self.timestamps)
+            self.timestamps.append(timestamp)
+
+        if self.values is None:
+            import array
+            if type(value) is int:
+                self.values = array.array('q')
+            elif type(value) is float:
+                self.values = array.array('d')
+            else:
+                self.values = []
+
+        if not isinstance(self.values, list) and type(value) is not {'q': int, 'd': float}[self.values.typecode]:
+            # Mixed value types get stored in a plain list from now on
+            self.values = list(self.values)
+
+        try:
+            self.values.append(value)
+        except OverflowError:
+            self.values = list(self.values)
+            self.values.append(value)
+
+        if key is not None:
+            self.seen.add(key)
+        return True
+
+    def evict(self, oldest_timestamp_ms):
+        """
+        Evict the oldest measurements with timestamps at or before the given timestamp, always keeping the newest measurement
+        :param oldest_timestamp_ms: Oldest timestamp to keep, exclusive
+        """
+        while len(self) > 1 and self.timestamps[self.start] <= oldest_timestamp_ms:
+            try:
+                self.seen.discard((self.values[self.start], self.timestamps[self.start]))
+            except TypeError:
+                pass
+            if isinstance(self.values, list):
+                self.values[self.start] = None
+            self.start += 1
+
+        # Reclaim space once most of the arrays have been evicted
+        if self.start > 64 and self.start * 2 > len(self.timestamps):
+            del self.values[:self.start]
+            del self.timestamps[:self.start]
+            self.start = 0
+
+    def window(self, oldest_timestamp_ms, newest_timestamp_ms):
+        """
+        Measurements within a window of time, newest first.
+
+        This is a binary search while measurements were added in timestamp order. Otherwise it walks from the newest
+        measurement and stops at the first one older than the window, like a search through the list of tuples always did.
+
+        :param oldest_timestamp_ms: Oldest timestamp, inclusive
+        :param newest_timestamp_ms: Newest timestamp, inclusive
+        :return: Generator of ( value, timestamp ) tuples, newest first
+        """
+        if not self.ordered:
+            for (value, timestamp) in self:
+                if timestamp < oldest_timestamp_ms:
+                    break
+
+                if timestamp > newest_timestamp_ms:
+                    continue
+
+                yield (value, timestamp)
+            return
+
+        import bisect
+        first = bisect.bisect_left(self.timestamps, oldest_timestamp_ms, self.start, len(self.timestamps))
+        last = bisect.bisect_right(self.timestamps, newest_timestamp_ms, first, len(self.timestamps))
+        for i in range(last - 1, first - 1, -1):
+            yield (self.values[i], self.timestamps[i])
+
+    def insert(self, index, measurement):
+        """
+        List compatibility: only inserting the newest measurement at index 0 is supported
+        :param index: 0
+        :param measurement: ( value, timestamp )
+        """
+        if index != 0:
+            raise IndexError("MeasurementHistory only supports inserting the newest measurement at index 0")
+        self.add(measurement[VALUE], measurement[TIMESTAMP], deduplicate=False)
+
+    def _get(self, index):
+        """
+        :param index: Index, newest first
+        :return: ( value, timestamp )
+        """
+        i = len(self.timestamps) - 1 - index
+        return (self.values[i], self.timestamps[i])
+
+    def __len__(self):
+        return len(self.timestamps) - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError("MeasurementHistory index out of range")
+
+        return self._get(index)
+
+    def __iter__(self):
+        for i in range(len(self.timestamps) - 1, self.start - 1, -1):
+            yield (self.values[i], self.timestamps[i])
+
+    def __contains__(self, measurement):
+        for m in self:
+            if m == tuple(measurement):
+                return True
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (MeasurementHistory, list, tuple)):
+            return list(self) == [tuple(m) for m in other]
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getstate__(self):
+        # Only pickle the live portion of the history. Integer timestamps are stored as deltas from the previous
+        # timestamp, which pickle encodes in far fewer bytes than absolute millisecond timestamps.
+        values = list(self.values[self.start:]) if self.values is not None else []
+        timestamps = list(self.timestamps[self.start:])
+        if isinstance(self.timestamps, list):
+            return {
+                "values": values,
+                "timestamps": timestamps
+            }
+
+        return {
+            "values": values,
+            "deltas": [timestamps[i] - timestamps[i - 1] if i > 0 else timestamps[i] for i in range(len(timestamps))]
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        if "deltas" in state:
+            import itertools
+            timestamps = itertools.accumulate(state["deltas"])
+        else:
+            timestamps = state["timestamps"]
+
+        for (value, timestamp) in zip(state["values"], timestamps):
+            self.add(value, timestamp, deduplicate=False)
+
+
 class Device:
     """
     This is a base class for each of our devices
@@ -92,7 +319,7 @@ class Device:
         self.description = device_description.strip()
         
         # Measurements for each parameter, newest measurements at index 0
-        # self.measurements["parameterName"] = [ ( newest_value, newest_timestamp ), ( value, timestamp ), ... ]
+        # self.measurements["parameterName"] = MeasurementHistory([ ( newest_value, newest_timestamp ), ( value, timestamp ), ... ])
         self.measurements = {}
 
         # Last alert received { "alert_type": { "parameter_one" : "value_one", "timestamp_ms": timestamp_ms_set_locally } }
@@ -203,6 +430,11 @@ class Device:
         if not hasattr(self, "is_goal_changed"):
             self.is_goal_changed = False
 
+        # Added October 18, 2026
+        for name in self.measurements:
+            if not isinstance(self.measurements[name], MeasurementHistory):
+                self.measurements[name] = MeasurementHistory(self.measurements[name])
+
         # Synchronize device microservices
         if str(self.device_type) in index.MICROSERVICES['DEVICE_MICROSERVICES']:
             # Synchronize microservices
@@ -428,6 +660,7 @@ class Device:
         Attempt to parse the inputs to update this object
         :param measures: Full or partial measurement block from bot inputs
         """
+        logger = botengine.get_logger(f"{__name__}.{__class__.__name__}")
         self.last_updated_params = []
         self.communicated(botengine.get_timestamp())
 
@@ -459,7 +692,7 @@ class Device:
                     param_name = measure['name']
                     if param_name == 'batteryLevel' and measure['updated']:
                         if 'value' not in measure or measure['value'] == "":
-                            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("device.py: Updated parameter provided no updated value: {}".format(measure))
+                            logger.info("device.py: Updated parameter provided no updated value: %s", measure)
                             continue
                         # Update the battery_level
                         self.battery_level = int(measure['value'])
@@ -467,7 +700,7 @@ class Device:
                         
                     elif param_name not in self.measurements or measure['updated']:
                         if 'value' not in measure:
-                            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("device.py: Updated parameter provided no updated value: {}".format(measure))
+                            logger.info("device.py: Updated parameter provided no updated value: %s", measure)
                             continue
                             
                         value = utilities.normalize_measurement(measure['value'])
@@ -500,7 +733,7 @@ class Device:
                 updated_devices += d
                 updated_metadata += m
 
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("Updated '{}' with params: {}".format(self.description, self.last_updated_params))
+        logger.info("Updated '%s' with params: %s", self.description, self.last_updated_params)
         return (updated_devices, updated_metadata)
 
     def file_uploaded(self, botengine, device_object, file_id, filesize_bytes, content_type, file_extension):
@@ -548,27 +781,19 @@ class Device:
         measurement_updated = False
         if name not in self.measurements:
             # Create the measurement
-            self.measurements[name] = []
+            self.measurements[name] = MeasurementHistory()
 
+        elif not isinstance(self.measurements[name], MeasurementHistory):
+            # Measurements previously stored as a list of tuples
+            self.measurements[name] = MeasurementHistory(self.measurements[name])
+
+        if self.measurements[name].add(value, timestamp):
             measurement_updated = True
             self.measurement_odometer += 1
-            self.measurements[name].insert(0, (value, timestamp))
-        else:
-            is_new_measurement = True
-            for i in range(len(self.measurements[name])):
-                if value == self.measurements[name][i][0] and timestamp == self.measurements[name][i][1]:
-                    is_new_measurement = False
-                    break
-
-            if is_new_measurement:
-                measurement_updated = True
-                self.measurement_odometer += 1
-                self.measurements[name].insert(0, (value, timestamp))
 
         # Auto garbage-collect
         if self.enforce_cache_size:
-            while (len(self.measurements[name]) > 1) and self.measurements[name][-1][1] <= botengine.get_timestamp() - TOTAL_DURATION_TO_CACHE_MEASUREMENTS_MS:
-                del(self.measurements[name][-1])
+            self.measurements[name].evict(botengine.get_timestamp() - TOTAL_DURATION_TO_CACHE_MEASUREMENTS_MS)
 
         return measurement_updated
 
@@ -813,14 +1038,82 @@ class Device:
             botengine --download_device <device_id>
             botengine --download_type <device_type>
 
+        To process weeks of data without holding the whole .csv string in memory, use write_csv() or iter_csv() instead.
+
         :param botengine: BotEngine environment
         :param oldest_timestamp_ms: oldest timestamp in milliseconds
         :param newest_timestamp_ms: newest timestamp in milliseconds
         :param params: List of parameters
         :return: .csv string, largely matching the .csv data you would receive from the "botengine --download_device [device_id]" command line interface. Or None if this device doesn't have data.
         """
+        import io
+        f = io.StringIO()
+        if not self.write_csv(botengine, f, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms, params=params):
+            return None
+        return f.getvalue()
+
+    def write_csv(self, botengine, f, oldest_timestamp_ms=None, newest_timestamp_ms=None, params=[], use_csv_writer=False):
+        """
+        Stream the .csv data into a file-like object, one row at a time.
+
+        By default the rows match get_csv() exactly, including the trailing comma after every field.
+        With use_csv_writer=True, the rows are written through csv.writer instead, which quotes fields properly and drops the trailing commas.
+
+        :param botengine: BotEngine environment
+        :param f: File-like object with a write() method, like an open file or io.StringIO
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :param params: List of parameters
+        :param use_csv_writer: True to write the rows with csv.writer
+        :return: True if anything was written, False if this device doesn't have data
+        """
+        rows = self._get_csv_rows(botengine, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms, params=params)
+        if rows is None:
+            return False
+
+        if use_csv_writer:
+            import csv
+            writer = csv.writer(f, lineterminator="\n")
+            for row in rows:
+                writer.writerow(row)
+
+        else:
+            for row in rows:
+                f.write(_format_csv_row(row))
+
+        return True
+
+    def iter_csv(self, botengine, oldest_timestamp_ms=None, newest_timestamp_ms=None, params=[]):
+        """
+        Generate the .csv data as a sequence of strings, one row per string, starting with the header.
+        Joining every string together produces exactly the output of get_csv().
+
+        Nothing is generated if this device doesn't have data.
+
+        :param botengine: BotEngine environment
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :param params: List of parameters
+        :return: Generator of .csv rows
+        """
+        rows = self._get_csv_rows(botengine, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms, params=params)
+        if rows is None:
+            return
+
+        for row in rows:
+            yield _format_csv_row(row)
+
+    def _get_csv_rows(self, botengine, oldest_timestamp_ms=None, newest_timestamp_ms=None, params=[]):
+        """
+        Download the measurements behind the .csv data
+        :param botengine: BotEngine environment
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :param params: List of parameters
+        :return: Generator of rows, each row a list of fields starting with the header. Or None if this device doesn't have data.
+        """
         if len(self.measurements) == 0:
-            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - This device has no measurements")
+            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - This device has no measurements".format(self.description))
             return None
 
         if params:
@@ -839,16 +1132,9 @@ class Device:
         # Check to see that all the parameters we're requesting have valid measurements in this device object
         # Remember that an index number will modify the name of the parameter to make it unique, and we need to match against the unique name of each parameter
         if not set(params).issubset(last_measurements.keys()):
-            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - Not all of the requested parameters exist for this device")
+            botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - Not all of the requested parameters exist for this device".format(self.description))
             return None
 
-        output = "device_type,device_id,description,timestamp_ms,timestamp_iso,"
-
-        for t in titles:
-            output = "{}{},".format(output, t)
-
-        output += "\n"
-
         try:
             measurements = botengine.get_measurements(self.device_id, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms, param_name=params)
 
@@ -857,43 +1143,53 @@ class Device:
             # botengine.get_logger(f"{__name__}.{__class__.__name__}").warning("Cannot synchronize measurements for device: " + str(self.description))
             return None
 
+        # Only keep what we need from each measurement, so the raw server response can be released before we generate any rows
         processed_readings = {}
-        if 'measures' in measurements:
-            for measure in measurements['measures']:
-                if 'value' not in measure:
-                    continue
+        for measure in measurements.get('measures', []):
+            if 'value' not in measure:
+                continue
 
-                value = utilities.normalize_measurement(measure['value'])
-                param_name = measure['name']
-                time = int(measure['time'])
+            param_name = measure['name']
 
-                # If there's an index number, we just augment the parameter name with the index number to make it a unique parameter name.  param_name.index
-                if 'index' in measure:
-                    if measure['index'] is not None:
-                        if str(measure['index']).lower() != "none":
-                            param_name = "{}.{}".format(param_name, measure['index'])
+            # If there's an index number, we just augment the parameter name with the index number to make it a unique parameter name.  param_name.index
+            if 'index' in measure:
+                if measure['index'] is not None:
+                    if str(measure['index']).lower() != "none":
+                        param_name = "{}.{}".format(param_name, measure['index'])
 
-                processed_readings[time] = (param_name, value)
+            processed_readings[int(measure['time'])] = (param_name, utilities.normalize_measurement(measure['value']))
 
-        measurements = None
-        import gc
-        gc.collect()
+        del measurements
 
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - Processing {} measurements ...".format(self.description, str(len(processed_readings))))
+        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{}: get_csv() - Processing {} measurements ...".format(self.description, len(processed_readings)))
+        return self._generate_csv_rows(botengine, titles, last_measurements, processed_readings)
+
+    def _generate_csv_rows(self, botengine, titles, last_measurements, processed_readings):
+        """
+        Generate the .csv rows
+        :param botengine: BotEngine environment
+        :param titles: Sorted list of parameter names, one per column
+        :param last_measurements: { param_name: value } to fill in the columns that didn't change in a row
+        :param processed_readings: { timestamp_ms: (param_name, value) }
+        :return: Generator of rows, each row a list of fields starting with the header
+        """
+        yield ["device_type", "device_id", "description", "timestamp_ms", "timestamp_iso"] + titles
 
-        for timestamp_ms in sorted(processed_readings.keys()):
-            dt = self.location_object.get_local_datetime_from_timestamp(botengine, timestamp_ms)
-            output += "{},{},{},{},{},".format(self.device_type, self.device_id.replace(",","_"), self.description.replace(",","_"), timestamp_ms, utilities.iso_format(dt))
+        device_id = self.device_id.replace(",", "_")
+        description = self.description.replace(",", "_")
+        timestamps_ms = sorted(processed_readings.keys())
+        local_datetimes = self.location_object.get_local_datetimes_from_timestamps(botengine, timestamps_ms)
+        for timestamp_ms, dt in zip(timestamps_ms, local_datetimes):
+            param_name, value = processed_readings[timestamp_ms]
+            row = [self.device_type, device_id, description, timestamp_ms, utilities.iso_format(dt)]
 
             for t in titles:
-                if t == processed_readings[timestamp_ms][0]:
-                    output += "{},".format(processed_readings[timestamp_ms][1])
+                if t == param_name:
+                    row.append(value)
                 else:
-                    output += "{},".format(last_measurements[t])
-
-            output += "\n"
+                    row.append(last_measurements[t])
 
-        return output
+            yield row
 
 
 #===============================================================================
@@ -968,6 +1264,9 @@ def _attempt_reliable_delivery(botengine, args):
     """
     Attempt reliable delivery of everything in our queue
     This is executed by a timer.
+
+    Each device gets one measurement query covering all of its pending commands, and all of a device's
+    undelivered commands are re-sent together. The time until the next attempt backs off as attempts go unanswered.
     """
     botengine.get_logger(f"{__name__}").info(">reliability")
     queue = botengine.load_variable(RELIABILITY_VARIABLE_NAME)
@@ -982,56 +1281,84 @@ def _attempt_reliable_delivery(botengine, args):
     for device_id in copy.copy(queue):
         # Prune out all our successfully delivered commands, and commands that have timed out
         params_to_remove = []
+        params_to_verify = []
         
         for param_name in queue[device_id]:
             (param_value, attempts, timestamp) = queue[device_id][param_name]
 
             if attempts < MAX_ATTEMPTS:
-                # Check to see if the last attempt went through
-                measures = None
-                try:
-                    measures = botengine.get_measurements(device_id, param_name=param_name, oldest_timestamp_ms=timestamp)
-                except:
-                    # No longer have access to the device
-                    params_to_remove.append(param_name)
+                params_to_verify.append(param_name)
+
+            else:
+                # TODO log this error somewhere
+                logger.debug("RELIABILITY: MAXIMUM ATTEMPTS REACHED FOR DEVICE " + str(device_id) + "; PARAM_NAME=" + str(param_name) + "; PARAM_VALUE=" + str(param_value))
+                params_to_remove.append(param_name)
+
+        if len(params_to_verify) > 0:
+            # Check to see if the last attempts went through, all at once
+            oldest_timestamp_ms = min([queue[device_id][param_name][2] for param_name in params_to_verify])
+            measures = None
+            try:
+                measures = botengine.get_measurements(device_id, param_name=params_to_verify, oldest_timestamp_ms=oldest_timestamp_ms)
+            except:
+                # No longer have access to the device
+                params_to_remove += params_to_verify
 
-                logger.debug("RELIABILITY: measurements since " + str(timestamp) + ": " + str(measures))
+            logger.debug("RELIABILITY: measurements since " + str(oldest_timestamp_ms) + ": " + str(measures))
 
-                if measures is not None:
-                    if 'measures' in measures:
+            if measures is not None:
+                if 'measures' in measures:
+                    for param_name in params_to_verify:
+                        (param_value, attempts, timestamp) = queue[device_id][param_name]
                         for m in measures['measures']:
-                            if m['name'] == param_name and m['value'] == param_value:
+                            if m['name'] == param_name and m['value'] == param_value and m.get('time', timestamp) >= timestamp:
                                 # Command had been delivered reliably
                                 logger.debug("RELIABILITY: COMMAND HAS BEEN DELIVERED RELIABLY")
                                 params_to_remove.append(param_name)
                                 break
                 
-            else:
-                # TODO log this error somewhere
-                logger.debug("RELIABILITY: MAXIMUM ATTEMPTS REACHED FOR DEVICE " + str(device_id) + "; PARAM_NAME=" + str(param_name) + "; PARAM_VALUE=" + str(param_value))
-                params_to_remove.append(param_name)
-                
         for param in params_to_remove:
             if param in queue[device_id]:
                 del(queue[device_id][param])
                 
         if len(queue[device_id]) > 0:
-            botengine.cancel_timers("reliability")
-            botengine.start_timer(TIME_BETWEEN_ATTEMPTS_SEC, _attempt_reliable_delivery, None, "reliability")
-            
+            commands = []
             for param_name in queue[device_id]:
                 # Increment our attempts
                 (param_value, attempts, timestamp) = queue[device_id][param_name]
                 attempts += 1
                 queue[device_id][param_name] = (param_value, attempts, timestamp)
                 logger.debug("RELIABILITY: Re-sending command to " + device_id + ": " + str(param_name) + " = " + str(param_value))
-                botengine.send_command(device_id, param_name, param_value)
+                commands.append(botengine.form_command(param_name, param_value))
+
+            botengine.send_commands(device_id, commands)
 
         else:
             del(queue[device_id])
-                
+
+    if len(queue) > 0:
+        botengine.cancel_timers("reliability")
+        botengine.start_timer(_time_until_next_attempt_sec(queue), _attempt_reliable_delivery, None, "reliability")
+
     logger.debug("RELIABILITY: Cleaned queue looks like " + str(queue))
         
     botengine.save_variable(RELIABILITY_VARIABLE_NAME, queue)
-    
-         
+
+
+def _time_until_next_attempt_sec(queue):
+    """
+    The next attempt comes sooner when any command in the queue is still new, and backs off as every command goes unanswered.
+    :param queue: Reliability queue
+    :return: Seconds until the next attempt
+    """
+    attempts = min([queue[device_id][param_name][1] for device_id in queue for param_name in queue[device_id]])
+    return min(TIME_BETWEEN_ATTEMPTS_SEC * ATTEMPT_BACKOFF_MULTIPLIER ** max(attempts - 1, 0), MAXIMUM_TIME_BETWEEN_ATTEMPTS_SEC)
+
+
+def _format_csv_row(row):
+    """
+    Format one .csv row the way get_csv() always has, with a comma after every field
+    :param row: List of fields
+    :return: .csv row string
+    """
+    return "{},\n".format(",".join([str(field) for field in row]))
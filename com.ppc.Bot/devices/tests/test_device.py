@@ -1,6 +1,7 @@
 
 from botengine_pytest import BotEnginePyTest
 from devices.device import Device
+from devices.device import MeasurementHistory
 
 from locations.location import Location
 import utilities.utilities as utilities
@@ -76,3 +77,155 @@ class TestDevice():
             assert mut.intelligence_modules[i].parent == mut
 
 
+
+    def test_device_add_measurement(self):
+        botengine = BotEnginePyTest({})
+        # Clear out any previous tests
+        botengine.reset()
+
+        # Initialize the location
+        location_object = Location(botengine, 0)
+        mut = Device(botengine, location_object, "A", 0, "Test")
+
+        now = botengine.get_timestamp()
+        assert mut.add_measurement(botengine, "param", 1, now - utilities.ONE_HOUR_MS - 1)
+        assert mut.add_measurement(botengine, "param", 2, now - 1000)
+        assert mut.add_measurement(botengine, "param", 3, now)
+
+        # Duplicates are ignored
+        assert not mut.add_measurement(botengine, "param", 2, now - 1000)
+        assert mut.measurement_odometer == 3
+
+        # Newest first, and measurements older than the cache duration were evicted
+        assert mut.measurements["param"][0][0] == 3
+        assert mut.measurements["param"][0][1] == now
+        assert mut.measurements["param"][-1] == (2, now - 1000)
+        assert mut.get_measurement_history(botengine, "param") == [(3, now), (2, now - 1000)]
+        assert mut.measurements["param"][1:] == [(2, now - 1000)]
+        assert [value for (value, timestamp) in mut.measurements["param"]] == [3, 2]
+
+        # Measurements stored as a list of tuples are converted on the next measurement
+        mut.measurements["legacy"] = [(1, now - 1000)]
+        assert not mut.add_measurement(botengine, "legacy", 1, now - 1000)
+        assert mut.add_measurement(botengine, "legacy", 2, now)
+        assert isinstance(mut.measurements["legacy"], MeasurementHistory)
+        assert mut.measurements["legacy"] == [(2, now), (1, now - 1000)]
+
+    def test_device_measurement_history_pickle(self):
+        import dill
+
+        mut = MeasurementHistory()
+        measurements = []
+        for i in range(1000):
+            mut.add(i % 2 == 0, 1685646000000 + i)
+            measurements.insert(0, (i % 2 == 0, 1685646000000 + i))
+
+        mut.evict(1685646000000 + 99)
+        del measurements[-100:]
+
+        restored = dill.loads(dill.dumps(mut))
+        assert restored == measurements
+        assert not restored.add(True, 1685646000000 + 100)
+        assert len(dill.dumps(mut)) < len(dill.dumps(measurements))
+
+    def test_device_measurement_history_window(self):
+        mut = MeasurementHistory()
+        for i in range(100):
+            mut.add(i, 1685646000000 + i * 1000)
+        mut.evict(1685646000000 + 10000)
+
+        assert mut.ordered
+        assert list(mut.window(1685646000000 + 20000, 1685646000000 + 22500)) == [(22, 1685646022000), (21, 1685646021000), (20, 1685646020000)]
+        assert list(mut.window(1685646000000, 1685646000000 + 11000)) == [(11, 1685646011000)]
+        assert list(mut.window(1685646000000 + 200000, 1685646000000 + 300000)) == []
+
+        # Measurements added out of order are still found by walking the whole history
+        mut.add(5, 1685646000000 + 5000)
+        assert not mut.ordered
+        assert list(mut.window(1685646000000, 1685646000000 + 12000)) == [(5, 1685646005000), (12, 1685646012000), (11, 1685646011000)]
+
+    def test_device_csv(self):
+        import io
+        from unittest.mock import MagicMock
+
+        botengine = BotEnginePyTest({})
+        # Clear out any previous tests
+        botengine.reset()
+
+        location_object = Location(botengine, 0)
+        mut = Device(botengine, location_object, "A", 0, "Test, Device")
+        assert mut.get_csv(botengine) is None
+        assert list(mut.iter_csv(botengine)) == []
+
+        mut.add_measurement(botengine, "param", 0, botengine.get_timestamp())
+        botengine.get_measurements = MagicMock(return_value={
+            "measures": [
+                {"name": "param", "value": "1", "time": 1685646002000},
+                {"name": "param", "value": "2", "time": 1685646001000},
+                {"name": "param", "time": 1685646003000}
+            ]
+        })
+
+        csv_string = mut.get_csv(botengine, oldest_timestamp_ms=1685646000000, params=["param"])
+        lines = csv_string.splitlines()
+        assert lines[0] == "device_type,device_id,description,timestamp_ms,timestamp_iso,param,"
+        assert len(lines) == 3
+        assert lines[1].startswith("0,A,Test_ Device,1685646001000,")
+        assert lines[1].endswith(",2,")
+        assert lines[2].endswith(",1,")
+
+        assert "".join(mut.iter_csv(botengine, oldest_timestamp_ms=1685646000000, params=["param"])) == csv_string
+
+        f = io.StringIO()
+        assert mut.write_csv(botengine, f, oldest_timestamp_ms=1685646000000, params=["param"], use_csv_writer=True)
+        lines = f.getvalue().splitlines()
+        assert lines[0] == "device_type,device_id,description,timestamp_ms,timestamp_iso,param"
+        assert lines[1].endswith(",2")
+
+    def test_device_reliable_delivery(self):
+        import devices.device as device
+        from unittest.mock import MagicMock
+
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        timestamp_ms = botengine.get_timestamp()
+        device.send_command_reliably(botengine, "A", "mode", "1")
+        device.send_command_reliably(botengine, "A", "level", "5")
+        device.send_command_reliably(botengine, "B", "mode", "0")
+
+        # Device A applied its mode, nothing else got through
+        botengine.get_measurements = MagicMock(return_value={
+            "measures": [
+                {"name": "mode", "value": "1", "time": timestamp_ms + 1000},
+                {"name": "level", "value": "5", "time": timestamp_ms - 1000}
+            ]
+        })
+        botengine.send_commands = MagicMock()
+        device._attempt_reliable_delivery(botengine, None)
+
+        # One measurement query and one re-send per device
+        assert [c[0][0] for c in botengine.get_measurements.call_args_list] == ["A", "B"]
+        assert sorted(botengine.get_measurements.call_args_list[0][1]["param_name"]) == ["level", "mode"]
+        assert botengine.send_commands.call_args_list[0][0] == ("A", [{"name": "level", "value": "5"}])
+        assert botengine.send_commands.call_args_list[1][0] == ("B", [{"name": "mode", "value": "0"}])
+        assert device.queued_commands_for_device(botengine, "A") == {"level": ("5", 1, timestamp_ms)}
+        assert botengine.timers["reliability"][0] == timestamp_ms + device.TIME_BETWEEN_ATTEMPTS_SEC * 1000
+
+        # Unanswered attempts back off
+        botengine.get_measurements = MagicMock(return_value={"measures": []})
+        for i in range(10):
+            device._attempt_reliable_delivery(botengine, None)
+        assert botengine.timers["reliability"][0] == timestamp_ms + device.MAXIMUM_TIME_BETWEEN_ATTEMPTS_SEC * 1000
+
+        # Everything gets delivered
+        botengine.get_measurements = MagicMock(return_value={
+            "measures": [
+                {"name": "level", "value": "5", "time": timestamp_ms + 1000},
+                {"name": "mode", "value": "0", "time": timestamp_ms + 1000}
+            ]
+        })
+        botengine.cancel_timers("reliability")
+        device._attempt_reliable_delivery(botengine, None)
+        assert botengine.load_variable(device.RELIABILITY_VARIABLE_NAME) == {}
+        assert "reliability" not in botengine.timers
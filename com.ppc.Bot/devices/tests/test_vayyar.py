@@ -0,0 +1,76 @@
+
+from botengine_pytest import BotEnginePyTest
+from devices.vayyar.vayyar import VayyarDevice
+import devices.vayyar.vayyar as vayyar
+
+from locations.location import Location
+import utilities.utilities as utilities
+
+from unittest.mock import MagicMock
+
+
+class TestVayyarDevice():
+
+    def test_vayyar_occupancy_targets(self):
+        botengine = BotEnginePyTest({})
+        # Clear out any previous tests
+        botengine.reset()
+
+        location_object = Location(botengine, 0)
+        mut = VayyarDevice(botengine, location_object, "A", 2000, "Test")
+        mut.is_connected = True
+        mut._extract_targets = MagicMock(wraps=mut._extract_targets)
+
+        now = botengine.get_timestamp()
+        mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "0:10,20,30", now - utilities.ONE_MINUTE_MS * 45)
+        mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "0:11,21,31;1:-5,100,150", now - utilities.ONE_MINUTE_MS * 10)
+        mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "1:-6,101,151", now - 1000)
+        assert mut._extract_targets.call_count == 3
+
+        # Newest measurement within the last 30 minutes
+        assert mut.get_occupancy_targets(botengine) == {now - 1000: {"1": {"x": -6, "y": 101, "z": 151}}}
+
+        # Every measurement within an explicit window
+        targets = mut.get_occupancy_targets(botengine, now - utilities.ONE_HOUR_MS, now - 5000)
+        assert targets == {
+            now - utilities.ONE_MINUTE_MS * 10: {"0": {"x": 11, "y": 21, "z": 31}, "1": {"x": -5, "y": 100, "z": 150}},
+            now - utilities.ONE_MINUTE_MS * 45: {"0": {"x": 10, "y": 20, "z": 30}}
+        }
+
+        # Callers can't change the cached targets
+        targets[now - utilities.ONE_MINUTE_MS * 45]["0"]["x"] = 0
+        assert mut.get_occupancy_targets(botengine, now - utilities.ONE_HOUR_MS, now)[now - utilities.ONE_MINUTE_MS * 45]["0"]["x"] == 10
+
+        # Each measurement was decoded exactly once
+        mut.get_newest_targets(botengine)
+        assert mut._extract_targets.call_count == 3
+
+        # Disconnected devices have no targets
+        mut.is_connected = False
+        assert mut.get_occupancy_targets(botengine) == {}
+
+    def test_vayyar_occupancy_targets_pruned(self):
+        botengine = BotEnginePyTest({})
+        # Clear out any previous tests
+        botengine.reset()
+
+        location_object = Location(botengine, 0)
+        mut = VayyarDevice(botengine, location_object, "A", 2000, "Test")
+        mut.is_connected = True
+
+        now = botengine.get_timestamp()
+        for minutes in [50, 40, 10]:
+            mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "0:{},20,30".format(minutes), now - utilities.ONE_MINUTE_MS * minutes)
+
+        # Reading targets back decodes them newest first
+        del vayyar._decoded_targets[mut]
+        assert len(mut.get_occupancy_targets(botengine, now - utilities.ONE_HOUR_MS, now)) == 3
+
+        # Targets that fell out of the measurement cache are forgotten, whatever order they were decoded in
+        botengine.set_timestamp(now + utilities.ONE_MINUTE_MS * 45)
+        mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "0:1,20,30", now + utilities.ONE_MINUTE_MS * 45)
+        assert sorted([key[1] for key in vayyar._decoded_targets[mut]]) == [now - utilities.ONE_MINUTE_MS * 10, now + utilities.ONE_MINUTE_MS * 45]
+
+        # Malformed targets are logged and skipped
+        mut.add_measurement(botengine, VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET, "garbage", now + utilities.ONE_MINUTE_MS * 46)
+        assert len(vayyar._decoded_targets[mut]) == 2
@@ -8,14 +8,21 @@ file 'LICENSE.txt', which is part of this source code package.
 '''
 
 from devices.device import Device
+from devices.device import MeasurementHistory
 import signals.vayyar as vayyar
 import utilities.utilities as utilities
 
+import weakref
+
 # We had established code to avoid going all the way to the wall, but this caused interferences between
 # subregions and the arena where subregions were not also adjusted to the arena side. This caused some
 # kinds of false positive presence detects, apparently, so we're backing this feature off for now.
 WALL_PADDING_M = 0
 
+# Occupancy targets already decoded during this execution, so every microservice asking for them doesn't parse the same measurements again
+# { device_object: { ( raw_target, timestamp_ms ): { 'target_id': { 'x': x, 'y': y, 'z': z } } } }
+_decoded_targets = weakref.WeakKeyDictionary()
+
 class VayyarDevice(Device):
     """
     Vayyar Home Device
@@ -418,11 +425,17 @@ class VayyarDevice(Device):
         :param newest_timestamp_ms:
         :return: Dictionary of occupancy targets of the form { timestamp_ms : { 'target_id': { 'x': x, 'y': y, 'z': z } }, ... }
         """
+        logger = botengine.get_logger()
         targets = {}
 
         if self.is_connected:
             if VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET in self.measurements:
-                botengine.get_logger().debug("get_occupancy_targets: pure targets={}".format(self.measurements[VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET]))
+                history = self.measurements[VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET]
+                if not isinstance(history, MeasurementHistory):
+                    # Measurements previously stored as a list of tuples
+                    history = MeasurementHistory(history)
+                    self.measurements[VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET] = history
+
                 extract_multiple = newest_timestamp_ms is not None and oldest_timestamp_ms is not None
 
                 if newest_timestamp_ms is None:
@@ -431,18 +444,17 @@ class VayyarDevice(Device):
                 if oldest_timestamp_ms is None:
                     oldest_timestamp_ms = newest_timestamp_ms - (utilities.ONE_MINUTE_MS * 30)
 
-                for t in self.measurements[VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET]:
-                    if t[1] < oldest_timestamp_ms:
-                        break
-
-                    if t[1] > newest_timestamp_ms:
-                        continue
+                # The whole raw history is too expensive to format on every call
+                logger.debug("get_occupancy_targets: %s cached measurements, window %s to %s", len(history), oldest_timestamp_ms, newest_timestamp_ms)
 
-                    targets[t[1]] = self._extract_targets(t[0])
+                for (target, timestamp_ms) in history.window(oldest_timestamp_ms, newest_timestamp_ms):
+                    # Copies, so nobody can change the decoded targets out from under the next microservice
+                    decoded = self._decode_targets(target, timestamp_ms)
+                    targets[timestamp_ms] = {target_id: dict(decoded[target_id]) for target_id in decoded}
 
                     if not extract_multiple:
                         break
-        botengine.get_logger().info("get_occupancy_targets: targets={}".format(targets))
+        logger.info("get_occupancy_targets: targets=%s", targets)
         return targets
 
     def get_newest_targets(self, botengine):
@@ -1343,6 +1355,52 @@ class VayyarDevice(Device):
         return indices
 
 
+    def add_measurement(self, botengine, name, value, timestamp):
+        """
+        Update the device's status, decoding occupancy targets as soon as they arrive
+        :param botengine: BotEngine environment
+        :param name: Parameter name
+        :param value: Parameter value
+        :param timestamp: Timestamp in milliseconds
+        :return: True if the measurement was updated
+        """
+        measurement_updated = Device.add_measurement(self, botengine, name, value, timestamp)
+
+        if measurement_updated and name == VayyarDevice.MEASUREMENT_NAME_OCCUPANCY_TARGET:
+            try:
+                self._decode_targets(value, timestamp)
+            except Exception as e:
+                # Malformed targets only fail the microservices that ask for them, like they always have
+                botengine.get_logger().warning("VayyarDevice '%s': Couldn't decode occupancy targets '%s' at %s: %s", self.description, value, timestamp, e)
+
+            # Forget decoded targets that fell out of the measurement cache.
+            # Targets get decoded out of order when they're read back newest first, so walk them by timestamp.
+            decoded = _decoded_targets.get(self, {})
+            history = self.measurements[name]
+            oldest_timestamp_ms = history[-1][1] if len(history) > 0 else timestamp
+            for key in sorted(decoded, key=lambda k: k[1]):
+                if key[1] >= oldest_timestamp_ms:
+                    break
+                del decoded[key]
+
+        return measurement_updated
+
+    def _decode_targets(self, target, timestamp_ms):
+        """
+        Decode a single occupancy target measurement, once per execution
+        :param target: Raw occupancy target measurement
+        :param timestamp_ms: Timestamp of the measurement
+        :return: { 'target_id': { 'x': x, 'y': y, 'z': z } }
+        """
+        if self not in _decoded_targets:
+            _decoded_targets[self] = {}
+
+        decoded = _decoded_targets[self]
+        key = (target, timestamp_ms)
+        if key not in decoded:
+            decoded[key] = self._extract_targets(target)
+        return decoded[key]
+
     def _extract_targets(self, target):
         """
         Private method to extract the occupancy targets from a single occupancy presence measurement
@@ -30,3 +30,11 @@ MIXPANEL_TOKEN = ""
 # Analytics: Amplitude Token. You can only have one analytics token.
 AMPLITUDE_TOKEN = ""
 
+# Persist the controller as one skeleton plus a standalone variable for each device and microservice,
+# load each partition on first use, and only upload the partitions that changed during this execution.
+PARTITIONED_CONTROLLER_PERSISTENCE = False
+
+
+# Queue up every state write and flush each state address once at the end of the execution,
+# instead of writing states we haven't retrieved first to the server immediately.
+BATCH_STATE_WRITES = False
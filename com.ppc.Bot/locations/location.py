@@ -9,6 +9,7 @@ file 'LICENSE.txt', which is part of this source code package.
 
 import pytz
 import datetime
+import weakref
 import utilities.utilities as utilities
 from utilities.narrative import *
 import index
@@ -17,6 +18,121 @@ import properties
 
 from users.user import User
 
+# Cache of whether a microservice class overrides an event handler: { (class, event): True/False }
+_subscriptions_by_class = {}
+
+# Timezones by name, shared by every location: { "America/Los_Angeles": tzinfo }
+_timezones = {}
+
+# Local time already computed for each location during this execution: { botengine: { (location_id, name): value } }
+_local_times = weakref.WeakKeyDictionary()
+
+def get_timezone(timezone):
+    """
+    Look up a timezone once, and share it from then on. Timezones from pytz never change.
+    :param timezone: Timezone string, i.e. 'America/Los_Angeles'
+    :return: tzinfo
+    """
+    tzinfo = _timezones.get(timezone)
+    if tzinfo is None:
+        tzinfo = pytz.timezone(timezone)
+        _timezones[timezone] = tzinfo
+    return tzinfo
+
+def subscribes(microservice_object, event, address=None):
+    """
+    Determine if the given microservice overrides the handler for an event, and therefore needs to receive that event.
+    Microservices that don't override datastream_updated() still receive the data stream addresses they implement as methods.
+    :param microservice_object: Microservice object
+    :param event: Name of the event handler, i.e. 'device_measurements_updated'
+    :param address: Data stream address, only used with the 'datastream_updated' event
+    :return: True if the microservice should receive this event
+    """
+    key = (microservice_object.__class__, event)
+    if key not in _subscriptions_by_class:
+        from intelligence.intelligence import Intelligence
+        _subscriptions_by_class[key] = not isinstance(microservice_object, Intelligence) or getattr(microservice_object.__class__, event, None) is not getattr(Intelligence, event)
+
+    if _subscriptions_by_class[key]:
+        return True
+
+    if event == "datastream_updated" and address is not None:
+        return hasattr(microservice_object, address)
+
+    return False
+
+class MicroserviceModules(dict):
+    """
+    Location microservices { 'module_name': microservice_object }, indexed by the events each one subscribes to.
+    The index is cleared whenever a microservice is added, replaced, or removed, and it's never persisted
+    because a new version of a microservice may subscribe to different events.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._invalidate()
+
+    def __reduce__(self):
+        # Only the microservices get pickled, the index starts over empty when they're unpickled
+        return (self.__class__, (), None, None, iter(self.items()))
+
+    def _invalidate(self):
+        # Modules that override each event handler: { 'event': [ 'module_name', ... ] }
+        self.__dict__['subscriptions'] = {}
+
+        # Modules that receive each data stream address: { 'address': [ 'module_name', ... ] }
+        self.__dict__['datastream_subscriptions'] = {}
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._invalidate()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._invalidate()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._invalidate()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = dict.setdefault(self, key, default)
+        self._invalidate()
+        return value
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._invalidate()
+
+    def clear(self):
+        dict.clear(self)
+        self._invalidate()
+
+    def subscribers(self, event, address=None):
+        """
+        Get the microservices that subscribe to the given event
+        :param event: Name of the event handler, i.e. 'device_measurements_updated'
+        :param address: Data stream address, only used with the 'datastream_updated' event
+        :return: List of microservice objects
+        """
+        if event == "datastream_updated":
+            if address not in self.datastream_subscriptions:
+                self.datastream_subscriptions[address] = [module_name for module_name, microservice_object in self.items() if subscribes(microservice_object, event, address)]
+            module_names = self.datastream_subscriptions[address]
+
+        else:
+            if event not in self.subscriptions:
+                self.subscriptions[event] = [module_name for module_name, microservice_object in self.items() if subscribes(microservice_object, event)]
+            module_names = self.subscriptions[event]
+
+        return [self[module_name] for module_name in module_names]
+
 class Location:
     """
     Provide tools and information to manage the Location.
@@ -51,7 +167,7 @@ class Location:
         self.devices = {}
 
         # All Location Intelligence modules
-        self.intelligence_modules = {}
+        self.intelligence_modules = MicroserviceModules()
 
         # Mode of this location (i.e. "HOME", "AWAY", etc.). This is the mode of the security system.
         self.mode = botengine.get_mode(self.location_id)
@@ -137,6 +253,13 @@ class Location:
         if not hasattr(self, 'skip_handled_message'):
             self.skip_handled_message = False
 
+        # Added October 18, 2026
+        if not isinstance(self.intelligence_modules, MicroserviceModules):
+            self.intelligence_modules = MicroserviceModules(self.intelligence_modules)
+
+        # Microservices in this version may subscribe to different events
+        self.intelligence_modules._invalidate()
+
         # Synchronize all microservices
         if 'LOCATION_MICROSERVICES' in index.MICROSERVICES:
             self._sync_modules(botengine, self.intelligence_modules, index.MICROSERVICES['LOCATION_MICROSERVICES'])
@@ -270,7 +393,7 @@ class Location:
                     import traceback
                     botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
 
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("device_added"):
             try:
                 import time
                 t = time.time()
@@ -311,7 +434,7 @@ class Location:
 
             del self.devices[device_id]
 
-            for microservice_object in self.intelligence_modules.values():
+            for microservice_object in self._get_subscribers("device_deleted"):
                 try:
                     import time
                     t = time.time()
@@ -338,7 +461,7 @@ class Location:
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info("location mode_updated(): " + self.mode + " mode.")
 
         # Location microservices
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("mode_updated"):
             try:
                 import time
                 t = time.time()
@@ -357,6 +480,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "mode_updated"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].mode_updated(botengine, mode)
                     except Exception as e:
@@ -407,7 +532,7 @@ class Location:
         :param botengine: BotEngine environment
         :param device_object: Device object that was updated
         """
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("device_measurements_updated"):
             try:
                 import time
                 t = time.time()
@@ -428,7 +553,7 @@ class Location:
         :param botengine: BotEngine environment
         :param device_object: Device object that was updated
         """
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("device_metadata_updated"):
             try:
                 import time
                 t = time.time()
@@ -450,7 +575,7 @@ class Location:
         :param device_object: Device object that sent the alert
         :param alerts_list: List of alerts
         """
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("device_alert"):
             try:
                 import time
                 t = time.time()
@@ -472,7 +597,7 @@ class Location:
         :param question: Question object
         """
         # Microservices
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("question_answered"):
             try:
                 import time
                 t = time.time()
@@ -487,6 +612,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "question_answered"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].question_answered(botengine, question)
                     except Exception as e:
@@ -510,21 +637,21 @@ class Location:
         :param address: Data Stream address
         :param content: Data Stream content
         """
+        logger = botengine.get_logger(f"{__name__}.{__class__.__name__}")
+
         # Top priority - Location microservices
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").debug("location.py - Delivering datastream message '{}' to microservices: {}".format(address, address))
-        for microservice_object in self.intelligence_modules.values():
-            if not hasattr(microservice_object, "datastream_updated"):
-                continue
-            botengine.get_logger(f"{__name__}.{__class__.__name__}").debug("location.py - Delivering datastream message '{}' to location microservice: {}".format(address, microservice_object))
+        logger.debug("location.py - Delivering datastream message '%s' to microservices: %s", address, address)
+        for microservice_object in self._get_subscribers("datastream_updated", address):
+            logger.debug("location.py - Delivering datastream message '%s' to location microservice: %s", address, microservice_object)
             try:
                 import time
                 t = time.time()
                 microservice_object.datastream_updated(botengine, address, content.copy() if isinstance(content, dict) else content)
                 microservice_object.track_statistics(botengine, (time.time() - t) * 1000)
             except Exception as e:
-                botengine.get_logger(f"{__name__}.{__class__.__name__}").warning("location.py - Error delivering datastream message '{}' to location microservice (continuing execution): {}".format(address, str(e)))
+                logger.warning("location.py - Error delivering datastream message '%s' to location microservice (continuing execution): %s", address, e)
                 import traceback
-                botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
+                logger.error(traceback.format_exc())
                 if botengine.playback:
                     # Give us a chance to see the error as we playback data in fast-forward mode
                     import time
@@ -532,16 +659,18 @@ class Location:
 
         # Second priority - Device microservices
         for device_object in self.devices.values():
-            botengine.get_logger(f"{__name__}.{__class__.__name__}").debug("location.py - Delivering datastream message '{}' to device: {}".format(address, device_object))
+            logger.debug("location.py - Delivering datastream message '%s' to device: %s", address, device_object)
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
-                    botengine.get_logger(f"{__name__}.{__class__.__name__}").debug("location.py - Delivering datastream message '{}' to device microservice: {}".format(address, intelligence_id))
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "datastream_updated", address):
+                        continue
+                    logger.debug("location.py - Delivering datastream message '%s' to device microservice: %s", address, intelligence_id)
                     try:
                         device_object.intelligence_modules[intelligence_id].datastream_updated(botengine, address, content.copy() if isinstance(content, dict) else content)
                     except Exception as e:
-                        botengine.get_logger(f"{__name__}.{__class__.__name__}").warning("location.py - Error delivering datastream message '{}' to device microservice (continuing execution): {}".format(address, str(e)))
+                        logger.warning("location.py - Error delivering datastream message '%s' to device microservice (continuing execution): %s", address, e)
                         import traceback
-                        botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
+                        logger.error(traceback.format_exc())
                         if botengine.playback:
                             # Give us a chance to see the error as we playback data in fast-forward mode
                             import time
@@ -583,7 +712,7 @@ class Location:
                     time.sleep(2)
 
         # Location intelligence modules
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("schedule_fired"):
             try:
                 import time
                 t = time.time()
@@ -602,6 +731,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "schedule_fired"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].schedule_fired(botengine, schedule_id)
                     except Exception as e:
@@ -663,7 +794,7 @@ class Location:
         :param content_type: The content type, for example 'video/mp4'
         :param file_extension: The file extension, for example 'mp4'
         """
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("file_uploaded"):
             try:
                 import time
                 t = time.time()
@@ -698,7 +829,7 @@ class Location:
                 botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
 
         # Location intelligence modules
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("user_role_updated"):
             try:
                 import time
                 t = time.time()
@@ -713,6 +844,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "user_role_updated"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].user_role_updated(botengine, user_id, role, category, location_access, previous_category, previous_location_access)
                     except Exception as e:
@@ -728,7 +861,7 @@ class Location:
         :param status: Current call center status
         """
         # Location intelligence modules
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("call_center_updated"):
             try:
                 import time
                 t = time.time()
@@ -743,6 +876,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "call_center_updated"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].call_center_updated(botengine, user_id, status)
                     except Exception as e:
@@ -768,7 +903,7 @@ class Location:
                 botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
 
         # Location microservices
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("data_request_ready"):
             try:
                 import time
                 t = time.time()
@@ -783,6 +918,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "data_request_ready"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].data_request_ready(botengine, reference, device_csv_dict)
                     except Exception as e:
@@ -806,7 +943,7 @@ class Location:
             self.latitude = latitude
             self.longitude = longitude
 
-            for microservice_object in self.intelligence_modules.values():
+            for microservice_object in self._get_subscribers("coordinates_updated"):
                 try:
                     import time
                     t = time.time()
@@ -832,7 +969,7 @@ class Location:
                 botengine.get_logger(f"{__name__}.{__class__.__name__}").error(traceback.format_exc())
 
         # Location microservices
-        for microservice_object in self.intelligence_modules.values():
+        for microservice_object in self._get_subscribers("language_updated"):
             try:
                 import time
                 t = time.time()
@@ -847,6 +984,8 @@ class Location:
         for device_object in self.devices.values():
             if hasattr(device_object, "intelligence_modules"):
                 for intelligence_id in device_object.intelligence_modules:
+                    if not subscribes(device_object.intelligence_modules[intelligence_id], "language_updated"):
+                        continue
                     try:
                         device_object.intelligence_modules[intelligence_id].language_updated(botengine, language)
                     except Exception as e:
@@ -1384,9 +1523,7 @@ class Location:
         Get formatted date in the user's local timezone
         :returns: eg:30/01/2021
         """
-        timestamp_ms = botengine.get_timestamp()
-        timezone = self.get_local_timezone_string(botengine)
-        return datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, pytz.timezone(timezone)).strftime("%d/%m/%y")
+        return self.get_local_datetime(botengine).strftime("%d/%m/%y")
 
     def get_local_datetime_from_timestamp(self, botengine, timestamp_ms):
         """
@@ -1396,6 +1533,18 @@ class Location:
         """
         return self.get_datetime_from_timestamp(botengine, timestamp_ms, self.get_local_timezone_string(botengine))
 
+    def get_local_datetimes_from_timestamps(self, botengine, timestamps_ms):
+        """
+        Get datetimes in the user's local timezone for many timestamps at once, like the rows of a .csv file.
+        The timezone is only looked up once for all of them.
+        :param botengine: BotEngine environment
+        :param timestamps_ms: Iterable of timestamps in milliseconds
+        :return: Generator of timezone-aware datetime objects, in the same order as the timestamps
+        """
+        tzinfo = get_timezone(self.get_local_timezone_string(botengine))
+        for timestamp_ms in timestamps_ms:
+            yield datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, tzinfo)
+
     def get_datetime_from_timestamp(self, botengine, timestamp_ms=None, timezone=None):
         """
         Get a datetime in the user's local timezone, based on an input timestamp_ms
@@ -1408,7 +1557,12 @@ class Location:
 
         if timezone is None:
             timezone = self.get_local_timezone_string(botengine)
-        return datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, pytz.timezone(timezone))
+
+        if timestamp_ms == botengine.get_timestamp():
+            # The current time is asked for over and over during an execution
+            return self._get_cached_local_time(botengine, "now", timezone, lambda: datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, get_timezone(timezone)))
+
+        return datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, get_timezone(timezone))
 
     def get_local_timezone_string(self, botengine):
         """
@@ -1416,14 +1570,26 @@ class Location:
         :param botengine: BotEngine environment
         :return: timezone string
         """
-        location_block = botengine.get_location_info()
+        if botengine not in _local_times:
+            _local_times[botengine] = {}
+
+        cache = _local_times[botengine]
+        key = (self.location_id, "timezone")
+        if key not in cache:
+            timezone = None
+            location_block = botengine.get_location_info()
 
-        # Try to get the user's location's timezone string
-        if 'location' in location_block:
-            if 'timezone' in location_block['location']:
-                return location_block['location']['timezone']['id']
+            # Try to get the user's location's timezone string
+            if location_block is not None and 'location' in location_block:
+                if 'timezone' in location_block['location']:
+                    timezone = location_block['location']['timezone']['id']
 
-        return properties.get_property(botengine, "DEFAULT_TIMEZONE")
+            if timezone is None:
+                timezone = properties.get_property(botengine, "DEFAULT_TIMEZONE")
+
+            cache[key] = timezone
+
+        return cache[key]
 
     def get_relative_time_of_day(self, botengine, timestamp_ms=None, timezone=None):
         """
@@ -1442,7 +1608,7 @@ class Location:
         :param botengine: BotEngine environment
         :return: Datetime object of midnight last night in the local timezone
         """
-        return self.get_local_datetime(botengine).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self._get_cached_local_time(botengine, "midnight_last_night", self.get_local_timezone_string(botengine), lambda: self.get_local_datetime(botengine).replace(hour=0, minute=0, second=0, microsecond=0))
 
     def get_midnight_tonight(self, botengine):
         """
@@ -1450,7 +1616,28 @@ class Location:
         :param botengine: BotEngine environment
         :return: Datetime object of midnight tonight in the local timezone
         """
-        return self.get_local_datetime(botengine).replace(hour=23, minute=59, second=59, microsecond=999999)
+        return self._get_cached_local_time(botengine, "midnight_tonight", self.get_local_timezone_string(botengine), lambda: self.get_local_datetime(botengine).replace(hour=23, minute=59, second=59, microsecond=999999))
+
+    def _get_cached_local_time(self, botengine, name, timezone, compute):
+        """
+        Compute a local time derived from the current time once, and reuse it until the current time or timezone changes.
+        Datetimes are immutable, so everyone can safely share the same object.
+        :param botengine: BotEngine environment
+        :param name: Name of the local time
+        :param timezone: Timezone string the local time is computed in
+        :param compute: Function to compute the local time
+        :return: Local time
+        """
+        if botengine not in _local_times:
+            _local_times[botengine] = {}
+
+        cache = _local_times[botengine]
+        key = (self.location_id, name)
+        current = (botengine.get_timestamp(), timezone)
+        if key not in cache or cache[key][0] != current:
+            cache[key] = (current, compute())
+
+        return cache[key][1]
 
     def local_timestamp_ms_from_relative_hours(self, botengine, weekday, hours, future=True):
         """
@@ -1614,6 +1801,15 @@ class Location:
                             import time
                             time.sleep(5)
 
+    def _get_subscribers(self, event, address=None):
+        """
+        Get the location microservices that subscribe to the given event
+        :param event: Name of the event handler, i.e. 'device_measurements_updated'
+        :param address: Data stream address, only used with the 'datastream_updated' event
+        :return: List of microservice objects
+        """
+        return self.intelligence_modules.subscribers(event, address)
+
     #===========================================================================
     # CSV methods for machine learning algorithm integrations
     #===========================================================================
@@ -1625,8 +1821,63 @@ class Location:
         :param newest_timestamp_ms: newest timestamp in milliseconds
         :return: .csv string, largely matching the .csv data you would receive from the "botengine --download_device [device_id]" command line interface. Or None if this device doesn't have data.
         """
-        output = "location_id,timestamp_ms,timestamp_iso,event,source_type\n"
+        import io
+        f = io.StringIO()
+        if not self.write_csv(botengine, f, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms):
+            return None
+        return f.getvalue()
+
+    def write_csv(self, botengine, f, oldest_timestamp_ms=None, newest_timestamp_ms=None, use_csv_writer=False):
+        """
+        Stream the .csv mode history into a file-like object, one row at a time
+        :param botengine: BotEngine environment
+        :param f: File-like object with a write() method, like an open file or io.StringIO
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :param use_csv_writer: True to write the rows with csv.writer, which quotes fields instead of rewriting commas in event names
+        :return: True if anything was written, False if this location doesn't have data
+        """
+        rows = self._get_csv_rows(botengine, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms, escape=not use_csv_writer)
+        if rows is None:
+            return False
+
+        if use_csv_writer:
+            import csv
+            writer = csv.writer(f, lineterminator="\n")
+            for row in rows:
+                writer.writerow(row)
+
+        else:
+            for row in rows:
+                f.write("{}\n".format(",".join([str(field) for field in row])))
+
+        return True
+
+    def iter_csv(self, botengine, oldest_timestamp_ms=None, newest_timestamp_ms=None):
+        """
+        Generate the .csv mode history as a sequence of strings, one row per string, starting with the header.
+        Joining every string together produces exactly the output of get_csv(). Nothing is generated if this location doesn't have data.
+        :param botengine: BotEngine environment
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :return: Generator of .csv rows
+        """
+        rows = self._get_csv_rows(botengine, oldest_timestamp_ms=oldest_timestamp_ms, newest_timestamp_ms=newest_timestamp_ms)
+        if rows is None:
+            return
+
+        for row in rows:
+            yield "{}\n".format(",".join([str(field) for field in row]))
 
+    def _get_csv_rows(self, botengine, oldest_timestamp_ms=None, newest_timestamp_ms=None, escape=True):
+        """
+        Download the mode history behind the .csv data
+        :param botengine: BotEngine environment
+        :param oldest_timestamp_ms: oldest timestamp in milliseconds
+        :param newest_timestamp_ms: newest timestamp in milliseconds
+        :param escape: True to replace commas in event names with periods
+        :return: Generator of rows, each row a list of fields starting with the header. Or None if this location doesn't have data.
+        """
         # This number happens to be the oldest timestamp
         if oldest_timestamp_ms < 1262304000000:
             oldest_timestamp_ms = 1262304000000
@@ -1644,14 +1895,24 @@ class Location:
             return None
 
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info("{} mode changes captured".format(len(modes['events'])))
+        return self._generate_csv_rows(botengine, modes['events'], escape)
 
-        for event in modes['events']:
-            timestamp_ms = event['eventDateMs']
-            dt = self.get_local_datetime_from_timestamp(botengine, timestamp_ms)
+    def _generate_csv_rows(self, botengine, events, escape):
+        """
+        Generate the .csv rows
+        :param botengine: BotEngine environment
+        :param events: Mode history events from the server
+        :param escape: True to replace commas in event names with periods
+        :return: Generator of rows, each row a list of fields starting with the header
+        """
+        yield ["location_id", "timestamp_ms", "timestamp_iso", "event", "source_type"]
 
-            event_name = event['event'].replace(",",".")
+        local_datetimes = self.get_local_datetimes_from_timestamps(botengine, [event['eventDateMs'] for event in events])
+        for event, dt in zip(events, local_datetimes):
+            timestamp_ms = event['eventDateMs']
 
-            output += "{},{},{},{},{}".format(self.location_id, timestamp_ms, utilities.iso_format(dt), event_name, event['sourceType'])
-            output += "\n"
+            event_name = event['event']
+            if escape:
+                event_name = event_name.replace(",", ".")
 
-        return output
+            yield [self.location_id, timestamp_ms, utilities.iso_format(dt), event_name, event['sourceType']]
@@ -2,11 +2,20 @@
 from botengine_pytest import BotEnginePyTest
 
 from locations.location import *
+import locations.location as location
 import utilities.utilities as utilities
+from intelligence.intelligence import Intelligence
 
+import dill
 import unittest
 from unittest.mock import MagicMock, patch
 
+class UpgradedMicroservice(Intelligence):
+    """
+    Location microservice whose event handlers change between versions
+    """
+    pass
+
 class TestLocation(unittest.TestCase):
 
     def test_location_constructor(self):
@@ -58,4 +67,121 @@ class TestLocation(unittest.TestCase):
         # print("Total time described by microservices: {}".format(dt))
 
         # The reported time should be relatively close to the total time
-        assert abs(dt - x) < 1000 # Allow for some error in the timing
\ No newline at end of file
+        assert abs(dt - x) < 1000 # Allow for some error in the timing
+
+
+    def test_location_subscriptions(self):
+        # Initial setup
+        botengine = BotEnginePyTest({})
+        mut = Location(botengine, 0)
+
+        from intelligence.intelligence import Intelligence
+
+        class MeasurementsMicroservice(Intelligence):
+            def device_measurements_updated(self, botengine, device_object):
+                self.updated = True
+
+            def custom_address(self, botengine, content):
+                self.content = content
+
+        subscriber = MeasurementsMicroservice(botengine, mut)
+        bystander = Intelligence(botengine, mut)
+        mut.intelligence_modules["intelligence.subscriber"] = subscriber
+        mut.intelligence_modules["intelligence.bystander"] = bystander
+
+        # Only microservices that override the event handler receive the event
+        assert mut._get_subscribers("device_measurements_updated") == [subscriber]
+        assert mut._get_subscribers("device_alert") == []
+
+        mut.device_measurements_updated(botengine, None)
+        assert subscriber.updated
+        assert subscriber.get_statistics(botengine)["calls"] == 1
+        assert bystander.get_statistics(botengine)["calls"] == 0
+
+        # Data stream addresses are delivered to the microservices that implement them
+        mut.datastream_updated(botengine, "custom_address", {"a": 1})
+        assert subscriber.content == {"a": 1}
+        assert mut.intelligence_modules.datastream_subscriptions["custom_address"] == ["intelligence.subscriber"]
+        assert mut._get_subscribers("datastream_updated", "other_address") == []
+
+        # Microservices added outside of _sync_modules() get indexed
+        another = MeasurementsMicroservice(botengine, mut)
+        mut.intelligence_modules["intelligence.another"] = another
+        assert mut._get_subscribers("device_measurements_updated") == [subscriber, another]
+
+        # Microservices that are removed no longer receive events
+        del mut.intelligence_modules["intelligence.subscriber"]
+        assert mut._get_subscribers("device_measurements_updated") == [another]
+        assert mut._get_subscribers("datastream_updated", "custom_address") == [another]
+
+        # A new version of the bot re-indexes every microservice
+        mut.intelligence_modules.subscriptions["device_alert"] = ["intelligence.another"]
+        mut.new_version(botengine)
+        assert "device_alert" not in mut.intelligence_modules.subscriptions
+
+    def test_location_subscriptions_not_persisted(self):
+        botengine = BotEnginePyTest({})
+        mut = Location(botengine, 0)
+        microservice = UpgradedMicroservice(botengine, mut)
+        mut.intelligence_modules["intelligence.upgraded"] = microservice
+        assert mut._get_subscribers("device_alert") == []
+        assert mut._get_subscribers("datastream_updated", "custom_address") == []
+
+        saved = dill.dumps(mut)
+
+        # The next version of the microservice overrides device_alert and implements a data stream address
+        def device_alert(self, botengine, device_object, alert_type, alert_params):
+            self.alert_type = alert_type
+
+        def custom_address(self, botengine, content):
+            self.content = content
+
+        try:
+            UpgradedMicroservice.device_alert = device_alert
+            UpgradedMicroservice.custom_address = custom_address
+            location._subscriptions_by_class.clear()
+
+            mut = dill.loads(saved)
+            microservice = mut.intelligence_modules["intelligence.upgraded"]
+            mut.device_alert(botengine, None, "fall", {})
+            mut.datastream_updated(botengine, "custom_address", {"a": 1})
+            assert microservice.alert_type == "fall"
+            assert microservice.content == {"a": 1}
+
+        finally:
+            del UpgradedMicroservice.device_alert
+            del UpgradedMicroservice.custom_address
+            location._subscriptions_by_class.clear()
+
+    def test_location_local_time_cache(self):
+        botengine = BotEnginePyTest({})
+        botengine.set_timestamp(1684076795000)
+        mut = Location(botengine, 0)
+
+        # The access block is only scanned once per execution
+        botengine.get_location_info = MagicMock(wraps=botengine.get_location_info)
+        timezone = mut.get_local_timezone_string(botengine)
+        assert mut.get_local_timezone_string(botengine) == timezone
+        assert botengine.get_location_info.call_count == 1
+        assert get_timezone(timezone) is get_timezone(timezone)
+
+        # Now, midnight and the day boundaries are computed once while the current time stays the same
+        now = mut.get_local_datetime(botengine)
+        assert now == datetime.datetime.fromtimestamp(1684076795, pytz.timezone(timezone))
+        assert mut.get_local_datetime(botengine) is now
+        assert mut.get_midnight_last_night(botengine) is mut.get_midnight_last_night(botengine)
+        assert mut.get_midnight_last_night(botengine) == now.replace(hour=0, minute=0, second=0, microsecond=0)
+        assert mut.get_midnight_tonight(botengine) == now.replace(hour=23, minute=59, second=59, microsecond=999999)
+        assert mut.get_local_format_date(botengine) == now.strftime("%d/%m/%y")
+
+        # Moving the clock forward moves them too
+        botengine.set_timestamp(1684076795000 + utilities.ONE_DAY_MS)
+        assert mut.get_local_datetime(botengine) == now + datetime.timedelta(days=1)
+        assert mut.get_midnight_last_night(botengine) == now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+
+        # Explicit timezones are still honored
+        assert mut.get_datetime_from_timestamp(botengine, timezone="UTC").tzinfo == pytz.utc
+
+        # Bulk conversion matches converting one timestamp at a time
+        timestamps_ms = [1684076795000 + i * utilities.ONE_HOUR_MS for i in range(48)]
+        assert list(mut.get_local_datetimes_from_timestamps(botengine, timestamps_ms)) == [mut.get_local_datetime_from_timestamp(botengine, t) for t in timestamps_ms]
@@ -0,0 +1,371 @@
+'''
+Created on October 18, 2026
+
+This file is subject to the terms and conditions defined in the
+file 'LICENSE.txt', which is part of this source code package.
+
+@author: David Moss
+'''
+
+import io
+import weakref
+import urllib.parse
+
+import dill
+
+# Core variable holding the controller skeleton and the manifest of its partitions
+CONTROLLER_MANIFEST_VARIABLE_NAME = "controller_manifest"
+
+# Each partition is stored in its own (non-core) variable with this prefix
+CONTROLLER_PARTITION_VARIABLE_PREFIX = "controller."
+
+# Partition key types
+PARTITION_TYPE_DEVICE = "d"
+PARTITION_TYPE_INTELLIGENCE = "i"
+
+# Locations stay inside the skeleton, but partitions may refer back to them
+REFERENCE_TYPE_LOCATION = "l"
+
+# Attribute of an unloaded partition holding ( assembly, key ) until its partition is deserialized
+PARTITION_ATTRIBUTE = "_persistence_partition"
+
+# Controllers we already reassembled or saved during this execution: { botengine: _Assembly }
+_assemblies = weakref.WeakKeyDictionary()
+
+# Stand-in subclass for each partitioned class, so the first attribute access loads the partition: { class: lazy class }
+_lazy_classes = {}
+
+
+def is_enabled(botengine):
+    """
+    :param botengine: BotEngine environment
+    :return: True if the controller should be persisted in partitions
+    """
+    import properties
+    return properties.get_property(botengine, "PARTITIONED_CONTROLLER_PERSISTENCE", complain_if_missing=False) is True
+
+
+def save_controller(botengine, controller):
+    """
+    Save the controller as a skeleton in the core variables plus one standalone variable for each device and microservice.
+
+    Partitions that were never loaded during this execution can't have changed, so they're skipped without being touched.
+    Every other partition is serialized and compared against the bytes it was loaded from or last saved as,
+    and only the partitions that differ are handed to botengine.save_variable(), so only those get uploaded.
+    Changes are found no matter what modified the object. Partitions of devices and microservices that no longer exist are deleted.
+
+    Partitions must only share mutable objects through the controller, location, device, and microservice objects themselves.
+    Anything else shared across partitions will come back as separate copies.
+
+    :param botengine: BotEngine environment
+    :param controller: Controller object
+    """
+    assembly = _assemblies.get(botengine)
+    if assembly is None or assembly.controller is not controller:
+        assembly = _Assembly(botengine, controller, botengine.load_variable(CONTROLLER_MANIFEST_VARIABLE_NAME))
+        _assemblies[botengine] = assembly
+
+    references, partitions, children = _index(assembly)
+    classes = {}
+    saved = 0
+    for key, obj in partitions.items():
+        if obj is None or not is_loaded(obj):
+            # Never loaded during this execution
+            classes[key] = assembly.manifest["classes"][key]
+            continue
+
+        classes[key] = obj.__class__
+        payload = _dumps(obj.__dict__, references)
+        if assembly.payloads.get(key) != payload:
+            botengine.save_variable(_variable_name(key), payload)
+            assembly.payloads[key] = payload
+            saved += 1
+
+    for key in assembly.manifest["classes"]:
+        if key not in classes:
+            botengine.delete_variable(_variable_name(key))
+            assembly.payloads.pop(key, None)
+
+    # The skeleton only swaps out the partitioned objects, the locations themselves stay inline
+    skeleton_references = {}
+    for key, obj in partitions.items():
+        if obj is not None:
+            skeleton_references[id(obj)] = key
+
+    assembly.manifest = {
+        "skeleton": _dumps(controller, skeleton_references),
+        "classes": classes,
+        "children": children
+    }
+    botengine.save_variable(CONTROLLER_MANIFEST_VARIABLE_NAME, assembly.manifest, required_for_each_execution=True)
+    botengine.get_logger(f"{__name__}").info("|save_controller() Saved %s of %s partitions", saved, len(partitions))
+
+
+def load_controller(botengine):
+    """
+    Reassemble the controller from its skeleton.
+
+    Devices and microservices start out as empty stand-ins. Each one downloads and deserializes its own partition
+    the first time any of its attributes is used, so partitions this execution never touches are never downloaded.
+
+    :param botengine: BotEngine environment
+    :return: Controller object, or None if there is no partitioned controller
+    """
+    manifest = botengine.load_variable(CONTROLLER_MANIFEST_VARIABLE_NAME)
+    if manifest is None:
+        # Never saved, or the core memory was destroyed
+        _assemblies.pop(botengine, None)
+        return None
+
+    if botengine in _assemblies:
+        return _assemblies[botengine].controller
+
+    assembly = _Assembly(botengine, None, manifest)
+    assembly.controller = _loads(manifest["skeleton"], assembly.resolve)
+    for location_id, location in assembly.controller.locations.items():
+        assembly.add(_key(REFERENCE_TYPE_LOCATION, location_id), location)
+
+    _assemblies[botengine] = assembly
+    return assembly.controller
+
+
+def delete_controller(botengine):
+    """
+    Delete the partitioned controller.
+    Every partition of a controller we already loaded gets loaded first, so that controller can still be saved some other way.
+    :param botengine: BotEngine environment
+    """
+    assembly = _assemblies.pop(botengine, None)
+    if assembly is not None:
+        # Loading a partition may reference partitions nothing referenced before
+        pending = [obj for obj in assembly.objects.values() if not is_loaded(obj)]
+        while len(pending) > 0:
+            for obj in pending:
+                load(obj)
+            pending = [obj for obj in assembly.objects.values() if not is_loaded(obj)]
+
+    manifest = botengine.load_variable(CONTROLLER_MANIFEST_VARIABLE_NAME)
+    if manifest is not None:
+        for key in manifest["classes"]:
+            botengine.delete_variable(_variable_name(key))
+        botengine.save_variable(CONTROLLER_MANIFEST_VARIABLE_NAME, None, required_for_each_execution=True)
+
+
+def is_loaded(obj):
+    """
+    :param obj: Any object
+    :return: False if the object is a device or microservice whose partition hasn't been loaded yet
+    """
+    return not getattr(type(obj), "_lazy_partition", False)
+
+
+def load(obj):
+    """
+    Load an object's partition now, if it hasn't been loaded yet
+    :param obj: Any object
+    """
+    if is_loaded(obj):
+        return
+
+    state = object.__getattribute__(obj, "__dict__")
+    (assembly, key) = state[PARTITION_ATTRIBUTE]
+    botengine = assembly.botengine()
+    payload = botengine.load_variable(_variable_name(key)) if botengine is not None else None
+    if payload is None:
+        raise ValueError("Missing controller partition {}".format(key))
+
+    del state[PARTITION_ATTRIBUTE]
+    object.__setattr__(obj, "__class__", type(obj).__bases__[0])
+    state.update(_loads(payload, assembly.resolve))
+    assembly.payloads[key] = payload
+
+
+class _Assembly(object):
+    """
+    One controller's partitioned objects during a single execution
+    """
+
+    def __init__(self, botengine, controller, manifest):
+        """
+        :param botengine: BotEngine environment
+        :param controller: Controller object
+        :param manifest: Manifest the controller was loaded from, or None
+        """
+        if manifest is None:
+            manifest = {
+                "classes": {},
+                "children": {}
+            }
+
+        self.botengine = weakref.ref(botengine)
+        self.controller = controller
+        self.manifest = manifest
+
+        # { key: object } and { id(object): key } for every partitioned object and location we created or saved.
+        # Holding on to every object also keeps its id from being reused during this execution.
+        self.objects = {}
+        self.keys = {}
+
+        # Serialized partitions as they were loaded or last saved: { key: bytes }
+        self.payloads = {}
+
+    def add(self, key, obj):
+        """
+        Remember the key of a partitioned object or location
+        """
+        self.objects[key] = obj
+        self.keys[id(obj)] = key
+
+    def resolve(self, key):
+        """
+        :param key: Partition key
+        :return: The object for this key, created as an unloaded stand-in the first time it's referenced
+        """
+        if key not in self.objects:
+            cls = self.manifest["classes"][key]
+            lazy_cls = _lazy_class(cls)
+            obj = cls.__new__(lazy_cls)
+            object.__getattribute__(obj, "__dict__")[PARTITION_ATTRIBUTE] = (self, key)
+            self.add(key, obj)
+        return self.objects[key]
+
+    def key(self, obj, partition_type, identifier):
+        """
+        :return: Partition key of an object, without loading it
+        """
+        if id(obj) in self.keys:
+            return self.keys[id(obj)]
+        return _key(partition_type, identifier())
+
+
+def _lazy_class(cls):
+    """
+    :param cls: Partitioned class
+    :return: Subclass whose instances load their partition and turn back into cls on first use
+    """
+    if cls not in _lazy_classes:
+        def __getattribute__(self, name):
+            if name == "__class__":
+                return cls
+            load(self)
+            return getattr(self, name)
+
+        def __setattr__(self, name, value):
+            load(self)
+            setattr(self, name, value)
+
+        def __delattr__(self, name):
+            load(self)
+            delattr(self, name)
+
+        _lazy_classes[cls] = type(cls.__name__, (cls,), {
+            "__module__": cls.__module__,
+            "__getattribute__": __getattribute__,
+            "__setattr__": __setattr__,
+            "__delattr__": __delattr__,
+            "_lazy_partition": True
+        })
+
+    return _lazy_classes[cls]
+
+
+def _index(assembly):
+    """
+    Find every partition in the controller's object graph, without loading any of them
+    :param assembly: _Assembly
+    :return: ( { id(obj): key } for every object a partition may refer to, { key: obj or None if never referenced }, { device key: [ microservice key, ... ] } )
+    """
+    references = {}
+    partitions = {}
+    children = {}
+    for location_id, location in assembly.controller.locations.items():
+        assembly.add(_key(REFERENCE_TYPE_LOCATION, location_id), location)
+        references[id(location)] = _key(REFERENCE_TYPE_LOCATION, location_id)
+
+        for microservice in location.intelligence_modules.values():
+            key = assembly.key(microservice, PARTITION_TYPE_INTELLIGENCE, lambda: microservice.intelligence_id)
+            partitions[key] = microservice
+
+        for device_id, device in location.devices.items():
+            device_key = _key(PARTITION_TYPE_DEVICE, device_id)
+            partitions[device_key] = device
+
+            if is_loaded(device):
+                children[device_key] = []
+                for microservice in device.intelligence_modules.values():
+                    key = assembly.key(microservice, PARTITION_TYPE_INTELLIGENCE, lambda: microservice.intelligence_id)
+                    partitions[key] = microservice
+                    children[device_key].append(key)
+
+            else:
+                # The device hasn't changed, and neither has the list of its microservices
+                children[device_key] = assembly.manifest["children"][device_key]
+                for key in children[device_key]:
+                    partitions[key] = assembly.objects.get(key)
+
+    for key, obj in partitions.items():
+        if obj is not None:
+            assembly.add(key, obj)
+            references[id(obj)] = key
+
+    return references, partitions, children
+
+
+def _key(partition_type, identifier):
+    """
+    :return: Partition key
+    """
+    return "{}:{}".format(partition_type, identifier)
+
+
+def _variable_name(key):
+    """
+    :return: Name of the variable storing the given partition
+    """
+    return CONTROLLER_PARTITION_VARIABLE_PREFIX + urllib.parse.quote(key, safe="")
+
+
+def _dumps(obj, references):
+    """
+    Serialize an object, replacing every referenced object with its key
+    :param obj: Object to serialize
+    :param references: { id(obj): key }
+    :return: bytes
+    """
+    f = io.BytesIO()
+    _PartitionPickler(f, references).dump(obj)
+    return f.getvalue()
+
+
+def _loads(payload, resolve):
+    """
+    Deserialize an object, resolving every key back into its object
+    :param payload: bytes
+    :param resolve: Function that takes a key and returns its object
+    :return: Object
+    """
+    unpickler = _PartitionUnpickler(io.BytesIO(payload))
+    unpickler.resolve = resolve
+    return unpickler.load()
+
+
+class _PartitionPickler(dill.Pickler):
+    """
+    Pickler that stores partitioned objects by key instead of by value
+    """
+    def __init__(self, f, references):
+        dill.Pickler.__init__(self, f)
+        self.references = references
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class _PartitionUnpickler(dill.Unpickler):
+    """
+    Unpickler that turns keys back into partitioned objects
+    """
+    resolve = None
+
+    def persistent_load(self, key):
+        return self.resolve(key)
@@ -0,0 +1,50 @@
+from botengine_pytest import BotEnginePyTest
+
+import analytics
+
+from unittest.mock import MagicMock
+
+
+class TestAnalytics():
+
+    def test_analytics_buffer(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        # Nothing to flush until something was tracked during this execution
+        try:
+            analytics.get_analytics(botengine, must_exist=True)
+            assert False, "Expected ImportError without any analytics"
+        except ImportError:
+            pass
+
+        mut = analytics.get_analytics(botengine)
+        assert analytics.get_analytics(botengine, must_exist=True) is mut
+
+        send = MagicMock()
+        mut.queue("service", send, "event 1")
+        mut.queue("service", send, {"user": 1}, key="user")
+        mut.queue("service", send, "event 2")
+        mut.queue("service", send, {"user": 2}, key="user")
+
+        mut.export(botengine)
+        send.assert_called_once()
+        assert send.call_args[0][0] is botengine
+        assert send.call_args[0][2] == ["event 1", "event 2", {"user": 2}]
+
+        # The next execution starts over
+        try:
+            analytics.get_analytics(botengine, must_exist=True)
+            assert False, "Expected ImportError after exporting"
+        except ImportError:
+            pass
+
+    def test_analytics_buffer_bounded(self):
+        mut = analytics.AnalyticsBuffer()
+        send = MagicMock()
+        for i in range(analytics.MAXIMUM_ANALYTICS_ITEMS + 10):
+            mut.queue("service", send, i)
+
+        items = list(mut.services["service"][1].values())
+        assert len(items) == analytics.MAXIMUM_ANALYTICS_ITEMS
+        assert items[0] == 10
@@ -9,6 +9,7 @@ import domain
 import bot
 
 from unittest.mock import MagicMock
+from unittest.mock import patch
 
 class TestBot():
     """
@@ -320,6 +321,34 @@ class TestBot():
         bot.run(botengine)
         assert len(controller.locations) == 1
 
+    def test_bot_statistics_track_devices_once(self):
+        """
+        Reporting statistics at the end of an execution reuses the controller this trigger already loaded
+        """
+        from controller import Controller
+
+        botengine = BotEnginePyTest(
+            {
+                'time': 1687373406646,
+                'trigger': 0,
+                'source': 0,
+                'locationId': 1546987,
+                'access': [
+                    {
+                        'category': 1, 'trigger': False, 'read': True, 'control': True, 'location': {'locationId': 1546987, 'name': "Destry Teeter's Home", 'event': 'HOME.:.PRESENT.AI', 'timezone': {'id': 'America/Los_Angeles', 'offset': -480, 'dst': True, 'name': 'Pacific Standard Time'}, 'zip': '83501', 'latitude': '46.39950', 'longitude': '-117.02710', 'language': 'en', 'priorityCategory': 4, 'priorityRank': 73, 'priorityDateMs': 1687363210000, 'organizationId': 202, 'organization': {'organizationId': 202, 'organizationName': 'PPCg Dev', 'domainName': 'ppcgdev', 'brand': 'familycare', 'parentId': 104, 'features': 'b,g,m,n,p'}}
+                    }
+                ]
+            }
+        )
+
+        with patch.object(Controller, "track_new_and_deleted_devices", autospec=True, side_effect=Controller.track_new_and_deleted_devices) as track:
+            bot.run(botengine)
+            assert track.call_count == 1
+
+            stats = bot.get_intelligence_statistics(botengine)
+            assert isinstance(stats, list)
+            assert track.call_count == 1
+
     def test_properties(self):
         botengine = BotEnginePyTest({})
 
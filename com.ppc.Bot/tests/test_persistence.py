@@ -0,0 +1,159 @@
+from botengine_pytest import BotEnginePyTest
+
+from controller import Controller
+from devices.device import Device
+from devices.vayyar.vayyar import VayyarDevice
+from intelligence.intelligence import Intelligence
+from locations.location import Location
+
+import dill
+import persistence
+
+from unittest.mock import MagicMock
+
+
+class DeviceConfiguringMicroservice(Intelligence):
+    """
+    Location microservice that changes a device directly
+    """
+    def configure(self, botengine, device_id):
+        device_object = self.parent.devices[device_id]
+        device_object.set_learning_mode(botengine, False)
+        device_object.record_subregion(botengine, "1", 2, "Bed")
+
+
+class TestPersistence():
+
+    def _controller(self, botengine):
+        """
+        Build a controller with one location, one location microservice, and two devices with one microservice each
+        """
+        controller = Controller()
+        location_object = Location(botengine, 0)
+        controller.locations[0] = location_object
+        location_object.intelligence_modules["intelligence.location"] = Intelligence(botengine, location_object)
+
+        for device_id in ["A", "B"]:
+            device_object = Device(botengine, location_object, device_id, 0, "Test {}".format(device_id))
+            device_object.intelligence_modules["intelligence.device"] = Intelligence(botengine, device_object)
+            location_object.devices[device_id] = device_object
+            controller.location_devices[device_id] = 0
+
+        return controller
+
+    def _next_execution(self, botengine):
+        """
+        Start a new execution with the same variables
+        """
+        next_botengine = BotEnginePyTest({})
+        next_botengine.variables = dict(botengine.variables)
+        return next_botengine
+
+    def test_persistence_round_trip(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        controller = self._controller(botengine)
+        controller.locations[0].devices["A"].measurements["param"] = [(1, 1000)]
+        persistence.save_controller(botengine, controller)
+
+        botengine = self._next_execution(botengine)
+        assert persistence.load_controller(botengine) is not controller
+
+        mut = persistence.load_controller(botengine)
+        location_object = mut.locations[0]
+        device_object = location_object.devices["A"]
+        assert mut.location_devices == {"A": 0, "B": 0}
+        assert device_object.description == "Test A"
+        assert device_object.measurements["param"] == [(1, 1000)]
+        assert device_object.location_object is location_object
+        assert device_object.intelligence_modules["intelligence.device"].parent is device_object
+        assert location_object.intelligence_modules["intelligence.location"].parent is location_object
+
+        # Every later load during the same execution returns the same object graph
+        assert persistence.load_controller(botengine) is mut
+
+    def test_persistence_loads_partitions_lazily(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        persistence.save_controller(botengine, self._controller(botengine))
+
+        # Only the manifest is downloaded until a device or microservice is used
+        botengine = self._next_execution(botengine)
+        botengine.load_variable = MagicMock(wraps=botengine.load_variable)
+        devices = persistence.load_controller(botengine).locations[0].devices
+        assert {c[0][0] for c in botengine.load_variable.call_args_list} == {persistence.CONTROLLER_MANIFEST_VARIABLE_NAME}
+        assert not persistence.is_loaded(devices["A"])
+        assert isinstance(devices["A"], Device)
+
+        assert devices["A"].description == "Test A"
+        assert persistence.is_loaded(devices["A"])
+        assert type(devices["A"]) is Device
+        assert not persistence.is_loaded(devices["B"])
+        assert {c[0][0] for c in botengine.load_variable.call_args_list} == {persistence.CONTROLLER_MANIFEST_VARIABLE_NAME, "controller.d%3AA"}
+
+    def test_persistence_saves_changed_partitions_only(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        controller = self._controller(botengine)
+        location_object = controller.locations[0]
+        location_object.intelligence_modules["intelligence.configure"] = DeviceConfiguringMicroservice(botengine, location_object)
+        location_object.devices["V"] = VayyarDevice(botengine, location_object, "V", 2000, "Test V")
+        controller.location_devices["V"] = 0
+        persistence.save_controller(botengine, controller)
+
+        # Nothing changed, so only the manifest is saved
+        botengine = self._next_execution(botengine)
+        controller = persistence.load_controller(botengine)
+        assert controller.locations[0].devices["A"].description == "Test A"
+        botengine.save_variable = MagicMock(wraps=botengine.save_variable)
+        persistence.save_controller(botengine, controller)
+        assert [c[0][0] for c in botengine.save_variable.call_args_list] == [persistence.CONTROLLER_MANIFEST_VARIABLE_NAME]
+
+        # A location microservice changes a device through its own methods, without telling anyone
+        botengine.save_variable.reset_mock()
+        controller.locations[0].intelligence_modules["intelligence.configure"].configure(botengine, "V")
+        persistence.save_controller(botengine, controller)
+        assert [c[0][0] for c in botengine.save_variable.call_args_list] == ["controller.d%3AV", persistence.CONTROLLER_MANIFEST_VARIABLE_NAME]
+
+        botengine = self._next_execution(botengine)
+        devices = persistence.load_controller(botengine).locations[0].devices
+        assert devices["V"].learning_mode_status == VayyarDevice.LEARNING_MODE_DONE
+        assert devices["V"].subregions == {"1": (2, "Bed")}
+        assert devices["A"].intelligence_modules["intelligence.device"].parent is devices["A"]
+
+    def test_persistence_deleted_device(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        controller = self._controller(botengine)
+        persistence.save_controller(botengine, controller)
+        assert "d:B" in botengine.variables[persistence.CONTROLLER_MANIFEST_VARIABLE_NAME]["classes"]
+        assert "controller.d%3AB" in botengine.variables
+
+        del controller.locations[0].devices["B"]
+        persistence.save_controller(botengine, controller)
+        assert "d:B" not in botengine.variables[persistence.CONTROLLER_MANIFEST_VARIABLE_NAME]["classes"]
+        assert "controller.d%3AB" not in botengine.variables
+
+        botengine = self._next_execution(botengine)
+        assert list(persistence.load_controller(botengine).locations[0].devices.keys()) == ["A"]
+
+    def test_persistence_delete_controller(self):
+        botengine = BotEnginePyTest({})
+        botengine.reset()
+
+        persistence.save_controller(botengine, self._controller(botengine))
+
+        # Migrating away from partitions loads everything first, so the controller can still be saved as a whole
+        botengine = self._next_execution(botengine)
+        controller = persistence.load_controller(botengine)
+        persistence.delete_controller(botengine)
+        assert [name for name in botengine.variables if name.startswith(persistence.CONTROLLER_PARTITION_VARIABLE_PREFIX)] == []
+        assert botengine.variables[persistence.CONTROLLER_MANIFEST_VARIABLE_NAME] is None
+
+        device_object = dill.loads(dill.dumps(controller)).locations[0].devices["B"]
+        assert type(device_object) is Device
+        assert device_object.intelligence_modules["intelligence.device"].parent is device_object
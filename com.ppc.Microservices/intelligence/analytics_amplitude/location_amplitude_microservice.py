@@ -15,6 +15,15 @@ AMPLITUDE_USER_PROPERTIES_VARIABLE_NAME = "amplitude_user"
 # HTTP timeout
 AMPLITUDE_HTTP_TIMEOUT_S = 2
 
+# Name of this service in the analytics buffer
+AMPLITUDE_SERVICE_NAME = "amplitude"
+
+# Most events Amplitude accepts in one request
+AMPLITUDE_MAXIMUM_EVENTS_PER_REQUEST = 2000
+
+# Only the newest user properties of an execution are sent, since they include every update before them
+AMPLITUDE_USER_PROPERTIES_KEY = "user_properties"
+
 class LocationAmplitudeMicroservice(Intelligence):
 
     def __init__(self, botengine, parent):
@@ -63,20 +72,18 @@ class LocationAmplitudeMicroservice(Intelligence):
         event_properties["locationId"] = botengine.get_location_id()
         event_properties["organizationId"] = botengine.get_organization_id()
 
-        self._flush(botengine,
-                   [
-                        {
-                            "user_id": self._get_user_id(botengine),
-                            "device_id": self._get_device_id(botengine),
-                            "time": event_time,
-                            "event_type": event_name,
-                            "event_properties": event_properties,
-                            "user_properties": {
-                                "locationId": botengine.get_location_id(),
-                                "organizationId": botengine.get_organization_id()
-                            }
+        self._queue(botengine,
+                    {
+                        "user_id": self._get_user_id(botengine),
+                        "device_id": self._get_device_id(botengine),
+                        "time": event_time,
+                        "event_type": event_name,
+                        "event_properties": event_properties,
+                        "user_properties": {
+                            "locationId": botengine.get_location_id(),
+                            "organizationId": botengine.get_organization_id()
                         }
-                   ])
+                    })
 
     def analytics_people_set(self, botengine, content):
         """
@@ -100,15 +107,14 @@ class LocationAmplitudeMicroservice(Intelligence):
         focused_properties["organizationId"] = botengine.get_organization_id()
         botengine.save_variable(AMPLITUDE_USER_PROPERTIES_VARIABLE_NAME, focused_properties, required_for_each_execution=False)
 
-        self._flush(botengine,
-                    [
-                        {
-                            "user_id": self._get_user_id(botengine),
-                            "device_id": self._get_device_id(botengine),
-                            "time": botengine.get_timestamp(),
-                            "user_properties": focused_properties
-                        }
-                    ])
+        self._queue(botengine,
+                    {
+                        "user_id": self._get_user_id(botengine),
+                        "device_id": self._get_device_id(botengine),
+                        "time": botengine.get_timestamp(),
+                        "user_properties": focused_properties
+                    },
+                    key=AMPLITUDE_USER_PROPERTIES_KEY)
 
     def analytics_people_increment(self, botengine, content):
         """
@@ -137,15 +143,14 @@ class LocationAmplitudeMicroservice(Intelligence):
         focused_properties["organizationId"] = botengine.get_organization_id()
         botengine.save_variable(AMPLITUDE_USER_PROPERTIES_VARIABLE_NAME, focused_properties, required_for_each_execution=False)
 
-        self._flush(botengine,
-                    [
-                        {
-                            "user_id": self._get_user_id(botengine),
-                            "device_id": self._get_device_id(botengine),
-                            "time": botengine.get_timestamp(),
-                            "user_properties": focused_properties
-                        }
-                    ])
+        self._queue(botengine,
+                    {
+                        "user_id": self._get_user_id(botengine),
+                        "device_id": self._get_device_id(botengine),
+                        "time": botengine.get_timestamp(),
+                        "user_properties": focused_properties
+                    },
+                    key=AMPLITUDE_USER_PROPERTIES_KEY)
 
     def analytics_people_unset(self, botengine, content):
         """
@@ -174,25 +179,36 @@ class LocationAmplitudeMicroservice(Intelligence):
         focused_properties["organizationId"] = botengine.get_organization_id()
         botengine.save_variable(AMPLITUDE_USER_PROPERTIES_VARIABLE_NAME, focused_properties, required_for_each_execution=False)
 
-        self._flush(botengine,
-                    [
-                        {
-                            "user_id": self._get_user_id(botengine),
-                            "device_id": self._get_device_id(botengine),
-                            "time": botengine.get_timestamp(),
-                            "user_properties": focused_properties
-                        }
-                    ])
+        self._queue(botengine,
+                    {
+                        "user_id": self._get_user_id(botengine),
+                        "device_id": self._get_device_id(botengine),
+                        "time": botengine.get_timestamp(),
+                        "user_properties": focused_properties
+                    },
+                    key=AMPLITUDE_USER_PROPERTIES_KEY)
 
-    def _flush(self, botengine, data):
+    def _queue(self, botengine, event, key=None):
         """
-        Required. Implement the mechanisms to flush your analytics.
+        Buffer an event to send at the end of this execution
         :param botengine: BotEngine
+        :param event: Amplitude event
+        :param key: Optional key, so a newer event replaces an older one with the same key
         """
         if botengine.is_test_location() or botengine.is_playback():
             botengine.get_logger().debug("Analytics: This test location will not record analytics.")
             return
 
+        import analytics
+        analytics.get_analytics(botengine).queue(AMPLITUDE_SERVICE_NAME, self._send, event, key=key)
+
+    def _send(self, botengine, session, events):
+        """
+        Send every event buffered during this execution
+        :param botengine: BotEngine
+        :param session: HTTP session
+        :param events: Amplitude events
+        """
         import properties
         import json
         import requests
@@ -216,33 +232,32 @@ class LocationAmplitudeMicroservice(Intelligence):
             return
 
         http_headers = {"Content-Type": "application/json"}
-
-        body = {
-            "api_key": token,
-            "events": data
-        }
-
         url = "https://api.amplitude.com/2/httpapi"
 
-        try:
-            requests.post(url, headers=http_headers, data=json.dumps(body), timeout=AMPLITUDE_HTTP_TIMEOUT_S)
-            botengine.get_logger().info("location_amplitude_microservice: Flushed()")
+        for i in range(0, len(events), AMPLITUDE_MAXIMUM_EVENTS_PER_REQUEST):
+            body = {
+                "api_key": token,
+                "events": events[i:i + AMPLITUDE_MAXIMUM_EVENTS_PER_REQUEST]
+            }
 
-        except requests.HTTPError:
-            botengine.get_logger().info("Generic HTTP error calling POST " + url)
+            try:
+                session.post(url, headers=http_headers, data=json.dumps(body), timeout=AMPLITUDE_HTTP_TIMEOUT_S)
+                botengine.get_logger().info("location_amplitude_microservice: Flushed {} events".format(len(body["events"])))
 
-        except requests.ConnectionError:
-            botengine.get_logger().info("Connection HTTP error calling POST " + url)
+            except requests.HTTPError:
+                botengine.get_logger().info("Generic HTTP error calling POST " + url)
 
-        except requests.Timeout:
-            botengine.get_logger().info(str(AMPLITUDE_HTTP_TIMEOUT_S) + " second HTTP Timeout calling POST " + url)
+            except requests.ConnectionError:
+                botengine.get_logger().info("Connection HTTP error calling POST " + url)
 
-        except requests.TooManyRedirects:
-            botengine.get_logger().info("Too many redirects HTTP error calling POST " + url)
+            except requests.Timeout:
+                botengine.get_logger().info(str(AMPLITUDE_HTTP_TIMEOUT_S) + " second HTTP Timeout calling POST " + url)
 
-        except Exception as e:
-            return
+            except requests.TooManyRedirects:
+                botengine.get_logger().info("Too many redirects HTTP error calling POST " + url)
 
+            except Exception as e:
+                return
 
     def _get_user_id(self, botengine):
         """
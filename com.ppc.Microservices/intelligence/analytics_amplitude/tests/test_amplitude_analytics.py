@@ -1,5 +1,6 @@
 from locations.location import Location
 
+import analytics
 import properties
 import bundle
 
@@ -61,6 +62,10 @@ class TestLocationAnalyticsAmplitudeMicroservice(unittest.TestCase):
         mock_for_requests.post("https://api.amplitude.com/2/httpapi", headers={}, json={"status": 200})
         mut.analytics_track(botengine, {"event_name": "test", "event_time": botengine.get_timestamp(), "properties": {"test": "test"}})
 
+        # Events are buffered until the end of the execution
+        assert not mock_for_requests.called
+        analytics.get_analytics(botengine).export(botengine)
+
         assert mock_for_requests.called
         assert mock_for_requests.call_count == 1
 
@@ -90,4 +95,39 @@ class TestLocationAnalyticsAmplitudeMicroservice(unittest.TestCase):
         assert request_json['events'][-1]['event_type'] == 'test'
         assert request_json['events'][-1]['event_properties'] == {'test': 'test', 'locationId': 0, 'organizationId': 0}
 
-        
\ No newline at end of file
+    @requests_mock.mock()
+    @patch('botengine_pytest.BotEnginePyTest.is_test_location')
+    @patch('botengine_pytest.BotEnginePyTest.is_playback')
+    def test_analytics_amplitude_batch(self, mock_for_requests, mock_is_playback, mock_is_test_location):
+        botengine = BotEnginePyTest({})
+        mock_is_test_location.return_value = True
+        mock_is_playback.return_value = False
+
+        # Clear out any previous tests
+        botengine.reset()
+
+        # Initialize the location
+        location_object = Location(botengine, 0)
+        location_object.new_version(botengine)
+        location_object.initialize(botengine)
+
+        mut = location_object.intelligence_modules["intelligence.analytics_amplitude.location_amplitude_microservice"]
+        mock_is_test_location.return_value = False
+
+        mock_for_requests.post("https://api.amplitude.com/2/httpapi", headers={}, json={"status": 200})
+        mut.analytics_track(botengine, {"event_name": "first", "event_time": botengine.get_timestamp(), "properties": {}})
+        mut.analytics_people_set(botengine, {"properties_dict": {"a": 1}})
+        mut.analytics_track(botengine, {"event_name": "second", "event_time": botengine.get_timestamp(), "properties": {}})
+        mut.analytics_people_set(botengine, {"properties_dict": {"b": 2}})
+
+        # Everything goes out in one request, with only the newest user properties
+        analytics.get_analytics(botengine).export(botengine)
+        assert mock_for_requests.call_count == 1
+
+        events = mock_for_requests.last_request.json()['events']
+        assert [e.get('event_type') for e in events] == ['first', 'second', None]
+        assert events[-1]['user_properties'] == {'a': 1, 'b': 2, 'locationId': 0, 'organizationId': 0}
+
+        # Nothing is left to send
+        analytics.get_analytics(botengine).export(botengine)
+        assert mock_for_requests.call_count == 1
@@ -17,6 +17,9 @@ MIXPANEL_HTTP_TIMEOUT_S = 2
 # Distinct ID variable
 VARIABLE_DISTINCT_ID = "-distinctid-"
 
+# Name of this service in the analytics buffer
+MIXPANEL_SERVICE_NAME = "mixpanel"
+
 
 class LocationMixpanelMicroservice(Intelligence):
     """
@@ -49,10 +52,8 @@ class LocationMixpanelMicroservice(Intelligence):
         event_name = content['event_name']
         event_properties = content['event_properties']
 
-        botengine.get_logger().info("Analytics: Tracking {} => {}".format(self.total, event_name))
-        mp = mixpanel.Mixpanel(properties.get_property(botengine, "MIXPANEL_TOKEN"), consumer=mixpanel.BufferedConsumer(request_timeout=MIXPANEL_HTTP_TIMEOUT_S))
-        mp.track(self._get_distinct_id(botengine), event_name, event_properties)
-        self._flush(botengine, mp)
+        botengine.get_logger().info("Analytics: Tracking {}".format(event_name))
+        self._queue(botengine, ("track", self._get_distinct_id(botengine), event_name, event_properties))
 
     def analytics_people_set(self, botengine, content):
         """
@@ -66,9 +67,7 @@ class LocationMixpanelMicroservice(Intelligence):
         properties_dict = content['properties_dict']
 
         botengine.get_logger().debug("analytics.py: Setting user info - {}".format(properties_dict))
-        mp = mixpanel.Mixpanel(properties.get_property(botengine, "MIXPANEL_TOKEN"), consumer=mixpanel.BufferedConsumer(request_timeout=MIXPANEL_HTTP_TIMEOUT_S))
-        mp.people_set(self._get_distinct_id(botengine), properties_dict)
-        self._flush(botengine, mp)
+        self._queue(botengine, ("people_set", self._get_distinct_id(botengine), properties_dict))
 
     def analytics_people_increment(self, botengine, content):
         """
@@ -82,9 +81,7 @@ class LocationMixpanelMicroservice(Intelligence):
         properties_dict = content['properties_dict']
 
         botengine.get_logger().info("Analytics: Incrementing user info - {}".format(properties_dict))
-        mp = mixpanel.Mixpanel(properties.get_property(botengine, "MIXPANEL_TOKEN"), consumer=mixpanel.BufferedConsumer(request_timeout=MIXPANEL_HTTP_TIMEOUT_S))
-        mp.people_increment(self._get_distinct_id(botengine), properties_dict)
-        self._flush(botengine, mp)
+        self._queue(botengine, ("people_increment", self._get_distinct_id(botengine), properties_dict))
 
     def analytics_people_unset(self, botengine, content):
         """
@@ -98,18 +95,32 @@ class LocationMixpanelMicroservice(Intelligence):
         properties_list = content['properties_list']
 
         botengine.get_logger().info("Analytics: Removing user info - {}".format(properties_list))
-        mp = mixpanel.Mixpanel(properties.get_property(botengine, "MIXPANEL_TOKEN"), consumer=mixpanel.BufferedConsumer(request_timeout=MIXPANEL_HTTP_TIMEOUT_S))
-        mp.people_unset(self._get_distinct_id(botengine), properties_list)
-        self._flush(botengine, mp)
+        self._queue(botengine, ("people_unset", self._get_distinct_id(botengine), properties_list))
 
-    def _flush(self, botengine, mp):
+    def _queue(self, botengine, call):
         """
-        Required. Implement the mechanisms to flush your analytics.
-        :param botengine: BotEngine
+        Buffer a Mixpanel call to make at the end of this execution
+        :param botengine: BotEngine environment
+        :param call: (method name, arguments...) of the mixpanel.Mixpanel call
+        """
+        import analytics
+        analytics.get_analytics(botengine).queue(MIXPANEL_SERVICE_NAME, self._send, call)
+
+    def _send(self, botengine, session, calls):
+        """
+        Make every Mixpanel call buffered during this execution through one buffered client.
+        Mixpanel keeps its own HTTP connections, so the shared session isn't used here.
+        :param botengine: BotEngine environment
+        :param session: HTTP session
+        :param calls: [ (method name, arguments...), ... ]
         """
         try:
+            mp = mixpanel.Mixpanel(properties.get_property(botengine, "MIXPANEL_TOKEN"), consumer=mixpanel.BufferedConsumer(request_timeout=MIXPANEL_HTTP_TIMEOUT_S))
+            for call in calls:
+                getattr(mp, call[0])(*call[1:])
+
+            # One user sync for the whole execution
             self._sync_user(botengine, mp)
-            mp._consumer._consumer._request_timeout = MIXPANEL_HTTP_TIMEOUT_S
             mp._consumer.flush()
 
         except Exception as e:
@@ -0,0 +1,51 @@
+from locations.location import Location
+
+import analytics
+
+from botengine_pytest import BotEnginePyTest
+
+import unittest
+from unittest.mock import call, patch
+
+class TestLocationAnalyticsMixpanelMicroservice(unittest.TestCase):
+
+    @patch('mixpanel.Mixpanel')
+    @patch('botengine_pytest.BotEnginePyTest.is_test_location')
+    def test_analytics_mixpanel_export(self, mock_is_test_location, mock_mixpanel):
+        botengine = BotEnginePyTest({})
+        mock_is_test_location.return_value = True
+
+        # Clear out any previous tests
+        botengine.reset()
+
+        # Initialize the location
+        location_object = Location(botengine, 0)
+        location_object.new_version(botengine)
+        location_object.initialize(botengine)
+
+        mut = location_object.intelligence_modules["intelligence.analytics_mixpanel.location_mixpanel_microservice"]
+        mock_is_test_location.return_value = False
+
+        mut.analytics_track(botengine, {"event_name": "test", "event_properties": {"test": "test"}})
+        mut.analytics_people_set(botengine, {"properties_dict": {"a": 1}})
+        mut.analytics_people_increment(botengine, {"properties_dict": {"b": 2}})
+        mut.analytics_people_unset(botengine, {"properties_list": ["c"]})
+
+        # Calls are buffered until the end of the execution
+        assert not mock_mixpanel.called
+        botengine.export_analytics()
+
+        mp = mock_mixpanel.return_value
+        assert mock_mixpanel.call_count == 1
+        assert mp.mock_calls == [
+            call.track(0, "test", {"test": "test"}),
+            call.people_set(0, {"a": 1}),
+            call.people_increment(0, {"b": 2}),
+            call.people_unset(0, ["c"]),
+            call.people_set(0, {"location_id": 0}),
+            call._consumer.flush()
+        ]
+
+        # Nothing is left to send
+        botengine.export_analytics()
+        assert mock_mixpanel.call_count == 1
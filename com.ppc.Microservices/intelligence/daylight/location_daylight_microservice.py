@@ -10,6 +10,7 @@ file 'LICENSE.txt', which is part of this source code package.
 @author: David Moss
 '''
 
+import bisect
 import importlib
 import datetime
 import utilities.utilities as utilities
@@ -25,6 +26,15 @@ SUNRISE = "sunrise"
 # Sunset identifier for timers
 SUNSET = "sunset"
 
+# Number of days of sunrise / sunset events to compute at a time
+SUN_EVENTS_DAYS = 30
+
+# Rebuild the table of sun events once it covers less than this much of the future
+SUN_EVENTS_MINIMUM_REMAINING_MS = 2 * 24 * 60 * 60 * 1000
+
+# ephem.Date of the unix epoch, in days
+EPHEM_UNIX_EPOCH = 25567.5
+
 
 class LocationDaylightMicroservice(Intelligence):
     """
@@ -39,6 +49,22 @@ class LocationDaylightMicroservice(Intelligence):
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info(">__init__()")
         Intelligence.__init__(self, botengine, parent)
 
+        # (latitude, longitude) the sun events were computed for
+        self.sun_events_coordinates = None
+
+        # Sorted timestamps of the upcoming sun events
+        self.sun_events_ms = []
+
+        # SUNRISE or SUNSET for each timestamp in sun_events_ms
+        self.sun_events = []
+
+        # True if the sun was up at the start of the table
+        self.sun_events_up = False
+
+        # Timestamps in ms the table of sun events covers
+        self.sun_events_start_ms = 0
+        self.sun_events_end_ms = 0
+
         if self.parent.latitude is not None and self.parent.longitude is not None:
             self._set_sunrise_sunset_alarm(botengine)
 
@@ -46,6 +72,21 @@ class LocationDaylightMicroservice(Intelligence):
         self.parent.is_daylight = self.is_daylight(botengine)
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<__init__() intelligence_id={}".format(self.intelligence_id))
 
+    def new_version(self, botengine):
+        """
+        Upgraded to a new bot version
+        :param botengine: BotEngine environment
+        """
+        # Added October 18, 2026
+        if not hasattr(self, 'sun_events_coordinates'):
+            self.sun_events_coordinates = None
+            self.sun_events_ms = []
+            self.sun_events = []
+            self.sun_events_up = False
+            self.sun_events_start_ms = 0
+            self.sun_events_end_ms = 0
+        return
+
     def initialize(self, botengine):
         """
         Initialize
@@ -231,6 +272,7 @@ class LocationDaylightMicroservice(Intelligence):
         :param longitude: Longitude
         """
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info("location_daylight_microservice: Lat/Long updated - recalculating sunrise/sunset times")
+        self.sun_events_coordinates = None
         self._set_sunrise_sunset_alarm(botengine)
 
     #===========================================================================
@@ -242,34 +284,19 @@ class LocationDaylightMicroservice(Intelligence):
         :param botengine: BotEngine environment
         :return: True if we think it's daytime at this location
         """
-        try:
-            ephem = importlib.import_module("ephem")
-        except ImportError:
-            ephem = None
-
-        try:
-            next_sunrise_ms = self.next_sunrise_timestamp_ms(botengine)
-            next_sunset_ms = self.next_sunset_timestamp_ms(botengine)
-
-        except ephem.AlwaysUpError:
-            return True
-
-        except ephem.NeverUpError:
-            return False
+        ephem = _import_ephem()
+        if self.parent.longitude is None or self.parent.latitude is None or ephem is None:
+            return self.next_sunset_timestamp_ms(botengine) < self.next_sunrise_timestamp_ms(botengine)
 
-        return next_sunset_ms < next_sunrise_ms
+        index = self._get_sun_events_index(botengine, ephem)
+        return self._is_sun_up(index)
 
     def next_sunrise_timestamp_ms(self, botengine):
         """
         :param botengine: BotEngine environment
         :return: The next sunrise timestamp in ms
         """
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info(">next_sunrise_timestamp_ms()")
-        try:
-            ephem = importlib.import_module("ephem")
-        except ImportError:
-            ephem = None
-
+        ephem = _import_ephem()
         if self.parent.longitude is None or self.parent.latitude is None or ephem is None:
             # Ya, we don't have any coordinate information. Call it 8 AM.
             dt = self.parent.get_local_datetime(botengine).replace(hour=8)
@@ -278,30 +305,14 @@ class LocationDaylightMicroservice(Intelligence):
                 dt = dt + datetime.timedelta(hours=24)
             return int(dt.timestamp()) * 1000
 
-        o = ephem.Observer()
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("|next_sunrise_timestamp_ms() current_date={}".format(self.parent.get_local_datetime(botengine)))
-        o.date = self.parent.get_local_datetime(botengine)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("|next_sunrise_timestamp_ms() latitude={} longitude".format(self.parent.latitude, self.parent.longitude))
-        o.lat = str(self.parent.latitude)
-        o.long = str(self.parent.longitude)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("|next_sunrise_timestamp_ms() next_rising={}".format(o.next_rising(ephem.Sun())))
-        from zoneinfo import ZoneInfo
-        zone = ZoneInfo(self.parent.get_local_timezone_string(botengine))
-        local_dt = ephem.to_timezone(o.next_rising(ephem.Sun()), zone)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<next_sunrise_timestamp_ms() local_dt={}".format(local_dt))
-        return int(local_dt.timestamp()) * 1000
+        return self._next_sun_event_timestamp_ms(botengine, ephem, SUNRISE)
 
     def next_sunset_timestamp_ms(self, botengine):
         """
         :param botengine: BotEngine environment
         :return: The next sunset timestamp in ms
         """
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info(">next_sunset_timestamp_ms()")
-        try:
-            ephem = importlib.import_module("ephem")
-        except ImportError:
-            ephem = None
-
+        ephem = _import_ephem()
         if self.parent.longitude is None or self.parent.latitude is None or ephem is None:
             # We don't have any coordinate information. Call it 8 PM.
             dt = self.parent.get_local_datetime(botengine).replace(hour=20)
@@ -311,17 +322,95 @@ class LocationDaylightMicroservice(Intelligence):
 
             return int(dt.timestamp()) * 1000
 
+        return self._next_sun_event_timestamp_ms(botengine, ephem, SUNSET)
+
+    def _next_sun_event_timestamp_ms(self, botengine, ephem, event):
+        """
+        Look up the next sunrise or sunset in the table of sun events
+        :param botengine: BotEngine environment
+        :param ephem: ephem module
+        :param event: SUNRISE or SUNSET
+        :return: The next timestamp in ms of the given event
+        :raises ephem.AlwaysUpError: The sun doesn't set again within the table
+        :raises ephem.NeverUpError: The sun doesn't rise again within the table
+        """
+        index = self._get_sun_events_index(botengine, ephem)
+        for i in range(index, len(self.sun_events)):
+            if self.sun_events[i] == event:
+                return self.sun_events_ms[i]
+
+        if self._is_sun_up(index):
+            raise ephem.AlwaysUpError()
+        raise ephem.NeverUpError()
+
+    def _is_sun_up(self, index):
+        """
+        :param index: Index of the next sun event in the table
+        :return: True if the sun is up before the sun event at this index
+        """
+        if index > 0:
+            return self.sun_events[index - 1] == SUNRISE
+        return self.sun_events_up
+
+    def _get_sun_events_index(self, botengine, ephem):
+        """
+        Find the next sun event after the current time, computing the table of sun events first if it's stale
+        :param botengine: BotEngine environment
+        :param ephem: ephem module
+        :return: Index of the next sun event in the table
+        """
+        now_ms = botengine.get_timestamp()
+        coordinates = (self.parent.latitude, self.parent.longitude)
+        if self.sun_events_coordinates != coordinates or now_ms < self.sun_events_start_ms or now_ms > self.sun_events_end_ms - SUN_EVENTS_MINIMUM_REMAINING_MS:
+            self._compute_sun_events(botengine, ephem, now_ms)
+
+        return bisect.bisect_right(self.sun_events_ms, now_ms)
+
+    def _compute_sun_events(self, botengine, ephem, start_ms):
+        """
+        Compute every sunrise and sunset at this location for the next SUN_EVENTS_DAYS
+        :param botengine: BotEngine environment
+        :param ephem: ephem module
+        :param start_ms: Timestamp in ms to start the table from
+        """
+        botengine.get_logger(f"{__name__}.{__class__.__name__}").info(">_compute_sun_events() latitude=%s longitude=%s start_ms=%s", self.parent.latitude, self.parent.longitude, start_ms)
         o = ephem.Observer()
-        o.date = self.parent.get_local_datetime(botengine)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("|next_sunset_timestamp_ms() current_date={}".format(self.parent.get_local_datetime(botengine)))
         o.lat = str(self.parent.latitude)
         o.long = str(self.parent.longitude)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("|next_sunset_timestamp_ms() latitude={} longitude".format(self.parent.latitude, self.parent.longitude))
-        from zoneinfo import ZoneInfo
-        zone = ZoneInfo(self.parent.get_local_timezone_string(botengine))
-        local_dt = ephem.to_timezone(o.next_setting(ephem.Sun()), zone)
-        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<next_sunset_timestamp_ms() local_dt={}".format(local_dt))
-        return int(local_dt.timestamp()) * 1000
+        o.date = ephem.Date(EPHEM_UNIX_EPOCH + start_ms / utilities.ONE_DAY_MS)
+        sun = ephem.Sun(o)
+
+        self.sun_events_up = sun.alt > o.horizon
+        self.sun_events_ms = []
+        self.sun_events = []
+
+        date = o.date
+        end_date = date + SUN_EVENTS_DAYS
+        while date < end_date:
+            candidates = []
+            for event, search in ((SUNRISE, o.next_rising), (SUNSET, o.next_setting)):
+                try:
+                    candidates.append((search(sun, start=date), event))
+                except (ephem.AlwaysUpError, ephem.NeverUpError):
+                    pass
+
+            if len(candidates) == 0:
+                # The sun is up or down all day here. Look again tomorrow.
+                date = ephem.Date(date + 1)
+                continue
+
+            event_date, event = min(candidates)
+            if event_date >= end_date:
+                break
+
+            self.sun_events_ms.append(int((event_date - EPHEM_UNIX_EPOCH) * utilities.ONE_DAY_MS / 1000) * 1000)
+            self.sun_events.append(event)
+            date = ephem.Date(event_date + ephem.second)
+
+        self.sun_events_start_ms = start_ms
+        self.sun_events_end_ms = start_ms + SUN_EVENTS_DAYS * utilities.ONE_DAY_MS
+        self.sun_events_coordinates = (self.parent.latitude, self.parent.longitude)
+        botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<_compute_sun_events() events=%s", len(self.sun_events))
 
     def _set_sunrise_sunset_alarm(self, botengine):
         """
@@ -333,9 +422,8 @@ class LocationDaylightMicroservice(Intelligence):
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info(">_set_sunrise_sunset_alarm()")
         self.cancel_timers(botengine)
 
-        try:
-            ephem = importlib.import_module("ephem")
-        except ImportError:
+        ephem = _import_ephem()
+        if ephem is None:
             # We don't have this ephem library. Avoid re-executing this code in the meantime and revisit in a future bot update.
             self.start_timer_ms(botengine, utilities.ONE_DAY_MS)
             botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<_set_sunrise_sunset_alarm()")
@@ -385,4 +473,13 @@ class LocationDaylightMicroservice(Intelligence):
             botengine.get_logger(f"{__name__}.{__class__.__name__}").info("Location: Setting sunset alarm for " + str(sunset_timestamp_ms))
             self.set_alarm(botengine, sunset_timestamp_ms, argument=SUNSET)
         botengine.get_logger(f"{__name__}.{__class__.__name__}").info("<_set_sunrise_sunset_alarm()")
-        return
\ No newline at end of file
+        return
+
+def _import_ephem():
+    """
+    :return: The ephem module, or None if it isn't available
+    """
+    try:
+        return importlib.import_module("ephem")
+    except ImportError:
+        return None
@@ -0,0 +1,71 @@
+from botengine_pytest import BotEnginePyTest
+
+from locations.location import Location
+from intelligence.daylight.location_daylight_microservice import LocationDaylightMicroservice
+
+import utilities.utilities as utilities
+
+import ephem
+import unittest
+from unittest.mock import patch
+
+# Sunday, May 14, 2023 15:06:35 UTC
+START_TIMESTAMP_MS = 1684076795000
+
+
+class TestDaylightMicroservice(unittest.TestCase):
+
+    def setUp(self):
+        self.botengine = BotEnginePyTest({})
+        self.botengine.reset()
+        self.botengine.set_timestamp(START_TIMESTAMP_MS)
+
+        self.location = Location(self.botengine, 0)
+        self.location.latitude = "37.3861"
+        self.location.longitude = "-122.0839"
+
+    def _ephem_next(self, timestamp_ms, search):
+        """
+        Compute the next sun event directly with ephem
+        """
+        o = ephem.Observer()
+        o.lat = self.location.latitude
+        o.long = self.location.longitude
+        o.date = self.location.get_local_datetime_from_timestamp(self.botengine, timestamp_ms)
+        return int(ephem.to_timezone(getattr(o, search)(ephem.Sun()), ephem.UTC).timestamp()) * 1000
+
+    def test_daylight_sun_events(self):
+        mut = LocationDaylightMicroservice(self.botengine, self.location)
+
+        # Sun events come from the table and match ephem, while ephem only runs when the table runs out
+        with patch.object(LocationDaylightMicroservice, '_compute_sun_events', autospec=True, side_effect=LocationDaylightMicroservice._compute_sun_events) as compute:
+            for hour in range(0, 24 * 60, 5):
+                timestamp_ms = START_TIMESTAMP_MS + hour * utilities.ONE_HOUR_MS
+                self.botengine.set_timestamp(timestamp_ms)
+
+                sunrise_ms = mut.next_sunrise_timestamp_ms(self.botengine)
+                sunset_ms = mut.next_sunset_timestamp_ms(self.botengine)
+                assert abs(sunrise_ms - self._ephem_next(timestamp_ms, "next_rising")) <= 1000
+                assert abs(sunset_ms - self._ephem_next(timestamp_ms, "next_setting")) <= 1000
+                assert mut.is_daylight(self.botengine) == (sunset_ms < sunrise_ms)
+
+            assert compute.call_count == 2
+
+            # New coordinates compute a new table
+            self.location.latitude = "64.8378"
+            self.location.longitude = "-147.7164"
+            mut.coordinates_updated(self.botengine, self.location.latitude, self.location.longitude)
+            assert compute.call_count == 3
+            assert abs(mut.next_sunset_timestamp_ms(self.botengine) - self._ephem_next(self.botengine.get_timestamp(), "next_setting")) <= 1000
+            assert compute.call_count == 3
+
+    def test_daylight_polar(self):
+        # Utqiagvik, Alaska has midnight sun in June
+        self.botengine.set_timestamp(1687262400000)
+        self.location.latitude = "71.2906"
+        self.location.longitude = "-156.7886"
+
+        mut = LocationDaylightMicroservice(self.botengine, self.location)
+        assert mut.is_daylight(self.botengine)
+        with self.assertRaises(ephem.AlwaysUpError):
+            mut.next_sunset_timestamp_ms(self.botengine)
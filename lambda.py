@@ -9,7 +9,9 @@ AWS Lambda execution environment wrapper
 """
 
 import botengine as BotEngine
+import collections
 import importlib
+import logging
 import time
 
 
@@ -90,6 +92,21 @@ def send_sqs_message(queue_name, msg_body, client_context):
     })
 
 
+# Most log events we keep for CloudWatch in one execution. Older events are dropped first.
+# This is also the most events CloudWatch accepts in a single PutLogEvents call.
+MAXIMUM_LOG_EVENTS = 10000
+
+# Log levels, named the way the server describes them, in the order of the standard logging module
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warn": logging.WARNING,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL
+}
+
+
 class LambdaLogger():
     
     def __init__(self, log_level="info"):
@@ -104,8 +121,8 @@ class LambdaLogger():
         # DEPRECATED: Use log_events instead
         self.logs = []
 
-        # Log events to return to the server
-        self.log_events = [] # [{"timestamp": time.time() * 1000, "message": "Log Me"}]
+        # Log events to return to the server, newest last, bounded to the most recent MAXIMUM_LOG_EVENTS
+        self.log_events = collections.deque(maxlen=MAXIMUM_LOG_EVENTS) # [{"timestamp": time.time() * 1000, "message": "Log Me"}]
 
         # Start Code - provided by the server in response to the Start API
         self.start_code = 0
@@ -113,78 +130,98 @@ class LambdaLogger():
         # Log level (info, debug, warn, error)
         self.log_level = log_level
 
+        # Numeric log level, so disabled messages are dropped with a single comparison
+        self.level = LOG_LEVELS.get(log_level, logging.INFO)
+
         # Start time
         self.start_time_ms = int(time.time() * 1000)
 
         # Invoking service logging this message
         self.service = "lambda"
 
-    def log(self, level, message):
+        # Logger handles for each service - { "service": LambdaServiceLogger }
+        self.service_loggers = {}
+
+    def get_service_logger(self, service):
+        """
+        Logger handle for a single service, sharing this logger's level and log events
+        :param service: Invoking service logging messages through the handle
+        :return: LambdaServiceLogger
+        """
+        if service not in self.service_loggers:
+            self.service_loggers[service] = LambdaServiceLogger(self, service)
+        return self.service_loggers[service]
+
+    def isEnabledFor(self, level):
+        """
+        :param level: Numeric log level from the logging module
+        :return: True if messages at this level will be logged
+        """
+        return level >= self.level
+
+    def log(self, level, message, *args):
         if level == "debug":
-            self.debug(message)
+            self.debug(message, *args)
 
         if level == "info":
-            self.info(message)
+            self.info(message, *args)
 
         if level == "warn":
-            self.warn(message)
+            self.warn(message, *args)
         
         if level == "error":
-            self.error(message)
-
-    def debug(self, message):
-        if self.log_level in ["debug"]:
-            # Too granular
-            # self.logs.append("{}: [{}] {} {}".format(time.time(), "DEBUG", self.service, message))
-            self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("DEBUG", self.service, message)
-            })
-
-    def info(self, message):
-        if self.log_level in ["debug", "info"]:
-            # Too granular
-            # self.logs.append("{}: [{}] {} {}".format(time.time(), "INFO", self.service, message))
-            self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("INFO", self.service, message)
-            })
-
-    def warning(self, message):
-        self.warn(message)
-
-    def warn(self, message):
-        if self.log_level in ["debug", "info", "warn"]:
-            self.logs.append("{}: [{}] {} {}".format(time.time(), "WARN", self.service, message))
-            self.error_message = "[{}] {} {}".format("WARN", self.service, message)
-            self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("WARN", self.service, message)
-            })
-
-    def error(self, message):
-        self.logs.append("{}: [{}] {} {}".format(time.time(), "ERROR", self.service, message))
-        self.error_message = "[{}] {} {}".format("ERROR", self.service, message)
-        self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("ERROR", self.service, message)
-            })
+            self.error(message, *args)
 
-    def critical(self, message):
-        self.logs.append("{}: [{}] {} {}".format(time.time(), "CRITICAL", self.service, message))
-        self.error_message = "[{}] {} {}".format("CRITICAL", self.service, message)
-        self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("CRITICAL", self.service, message)
-            })
+    def debug(self, message, *args):
+        if self.level <= logging.DEBUG:
+            self._log("DEBUG", self.service, message, args)
+
+    def info(self, message, *args):
+        if self.level <= logging.INFO:
+            self._log("INFO", self.service, message, args)
+
+    def warning(self, message, *args):
+        self.warn(message, *args)
+
+    def warn(self, message, *args):
+        if self.level <= logging.WARNING:
+            self._log("WARN", self.service, message, args, error=True)
+
+    def error(self, message, *args):
+        self._log("ERROR", self.service, message, args, error=True)
+
+    def critical(self, message, *args):
+        self._log("CRITICAL", self.service, message, args, error=True)
+
+    def exception(self, message, *args):
+        self._log("EXCEPTION", self.service, message, args, error=True)
+
+    def _log(self, level_name, service, message, args, error=False):
+        """
+        Format and record a message that passed the level check
+        :param level_name: Level to describe in the message
+        :param service: Invoking service logging this message
+        :param message: Message, or a %-style format string when there are arguments
+        :param args: Arguments for the format string, only applied now that the message will be logged
+        :param error: True to also record the message as the error message returned to the server
+        """
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = "{} {}".format(message, args)
+
+        message = "[{}] {} {}".format(level_name, service, message)
+        timestamp_ms = int(time.time() * 1000)
+
+        if error:
+            self.logs.append("{}: {}".format(timestamp_ms / 1000, message))
+            self.error_message = message
 
-    def exception(self, message):
-        self.logs.append("{}: [{}] {} {}".format(time.time(), "EXCEPTION", self.service, message))
-        self.error_message = "[{}] {} {}".format("EXCEPTION", self.service, message)
         self.log_events.append({
-                'timestamp': int(time.time() * 1000),
-                'message': "[{}] {} {}".format("EXCEPTION", self.service, message)
-            })
+            'timestamp': timestamp_ms,
+            'message': message
+        })
 
     def get_lambda_return(self, botengine=None, bot=None):
         """
@@ -197,7 +234,7 @@ class LambdaLogger():
         if botengine is None:
             response['startTime'] = self.start_time_ms
             response['endTime'] = int(time.time() * 1000)
-            response["logEvents"] = self.log_events
+            response["logEvents"] = list(self.log_events)
             if self.error_message is not None:
                 response['errorMessage'] = self.error_message
             
@@ -209,9 +246,9 @@ class LambdaLogger():
         # Include additional bot server statistics for individual microservices
         if botengine.is_server_version_newer_than(1, 38):
             response['startCode'] = self.start_code
-            response["logEvents"] = self.log_events
+            response["logEvents"] = list(self.log_events)
             if bot is not None:
-                response['microservices'] = bot.get_intelligence_statistics(botengine)
+                response['microservices'] = botengine.get_intelligence_statistics(bot)
             response['startTime'] = self.start_time_ms
             response['endTime'] = int(time.time() * 1000)
 
@@ -242,6 +279,51 @@ class LambdaLogger():
         try:
             import boto3
             client = boto3.client('logs')
-            client.put_log_events(logGroupName=log_group, logStreamName=stream_name, logEvents=self.log_events)
+            client.put_log_events(logGroupName=log_group, logStreamName=stream_name, logEvents=list(self.log_events))
         except Exception as e:
-            pass
\ No newline at end of file
+            pass
+
+
+class LambdaServiceLogger():
+    """
+    Handle for one service logging through the LambdaLogger of this execution
+    """
+
+    def __init__(self, parent, service):
+        """
+        :param parent: LambdaLogger
+        :param service: Invoking service logging messages through this handle
+        """
+        self.parent = parent
+        self.service = service
+
+    def isEnabledFor(self, level):
+        return self.parent.isEnabledFor(level)
+
+    def log(self, level, message, *args):
+        if level in LOG_LEVELS:
+            getattr(self, level)(message, *args)
+
+    def debug(self, message, *args):
+        if self.parent.level <= logging.DEBUG:
+            self.parent._log("DEBUG", self.service, message, args)
+
+    def info(self, message, *args):
+        if self.parent.level <= logging.INFO:
+            self.parent._log("INFO", self.service, message, args)
+
+    def warning(self, message, *args):
+        self.warn(message, *args)
+
+    def warn(self, message, *args):
+        if self.parent.level <= logging.WARNING:
+            self.parent._log("WARN", self.service, message, args, error=True)
+
+    def error(self, message, *args):
+        self.parent._log("ERROR", self.service, message, args, error=True)
+
+    def critical(self, message, *args):
+        self.parent._log("CRITICAL", self.service, message, args, error=True)
+
+    def exception(self, message, *args):
+        self.parent._log("EXCEPTION", self.service, message, args, error=True)
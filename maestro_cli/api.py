@@ -21,10 +21,13 @@ import json
 import os
 import sys
 import shutil
+import tempfile
 import datetime
 import pytz
 import zipfile
 import copy
+import re
+import threading
 import pandas as pd
 import openpyxl
 
@@ -33,6 +36,9 @@ _https_proxy = None
 # Requests session
 session = None
 
+# Guards the creation of the requests session, which is shared by every thread
+_session_lock = threading.Lock()
+
 # Narrative priority levels
 NARRATIVE_PRIORITY_ANALYTIC = -1
 NARRATIVE_PRIORITY_DEBUG = 0
@@ -71,20 +77,56 @@ DEFAULT_DAYS_TO_DOWNLOAD_IN_EACH_REQUEST = 14
 # Sleep time between data request polling attempts to appease the server gods
 SLEEP_TIME_BETWEEN_DATA_REQUESTS_SECONDS = 5
 
+# Number of data requests for one location to submit, download, and extract at the same time
+DATA_REQUEST_WORKERS = 8
+
+# Number of locations to export at the same time when pulling data from a whole organization
+DATA_REQUEST_LOCATION_WORKERS = 4
+
+# Progress of an organization-wide data pull, saved in the 'downloads' directory so an interrupted pull can resume where it left off
+DATA_REQUEST_PROGRESS_FILENAME = "progress-organization_{}-type_{}.json"
+
+# Maximum number of pooled HTTP connections to keep open to each host
+HTTP_POOL_MAXSIZE = DATA_REQUEST_WORKERS * DATA_REQUEST_LOCATION_WORKERS
+
 # When downloading data that may contain commas, this character will replace those commas
 COMMA_DELIMITER_REPLACEMENT_CHARACTER = '&&'
 
+# Number of characters to read at a time while tokenizing large data request .csv files
+CSV_READ_CHUNK_SIZE = 1024 * 1024
+
+# Characters that matter while splitting a row of a data request .csv file
+_CSV_SPECIAL_CHARACTERS = re.compile(r'[\[\]",]')
+
+# Recording formats for --playback
+RECORDING_FORMAT_JSON = "json"
+RECORDING_FORMAT_LZ4 = "lz4"
+
+# Binary recordings are concatenated LZ4 frames of JSON lines, with a sidecar index of byte offsets by timestamp
+RECORDING_LZ4_EXTENSION = ".jsonl.lz4"
+RECORDING_INDEX_EXTENSION = ".idx"
+RECORDING_LZ4_FORMAT_VERSION = 1
+
+# Number of data records in each LZ4 frame of a binary recording, which is how finely --playback can seek
+RECORDING_LZ4_RECORDS_PER_FRAME = 1000
+
 def _session():
     """
     Retrieve the current HTTP session
     :return: Requests session
     """
     global session
-    if session is None:
-        session = requests.Session()
-        session.headers.update({
-            'Content-Type': 'application/json'
-        })
+    with _session_lock:
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'Content-Type': 'application/json'
+            })
+
+            # Keep enough connections open for every thread of a data request pipeline
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
 
     return session
 
@@ -625,13 +667,14 @@ def get_location_ids(cloud_url, admin_key, organization_id, has_gateway=True, de
 
     download_path = data_request(cloud_url, admin_key, DATA_REQUEST_TYPE_ORGANIZATION_LOCATIONS, organization_id=organization_id,
                                  device_types=device_types)
-    narratives_path = os.path.join(os.getcwd(), 'downloads', 'locations')
+    locations_path = os.path.join(os.getcwd(), 'downloads', 'locations')
 
     locations = []
-    with zipfile.ZipFile(download_path, "r") as z:
+    # Other requests may be extracting the same file names at the same time, so extract into our own directory
+    with zipfile.ZipFile(download_path, "r") as z, tempfile.TemporaryDirectory(dir=locations_path) as extract_path:
         for extracted_filename in z.namelist():
-            z.extract(extracted_filename, narratives_path)
-            extracted_path = os.path.join(narratives_path, extracted_filename)
+            z.extract(extracted_filename, extract_path)
+            extracted_path = os.path.join(extract_path, extracted_filename)
             print("Extracted: {}".format(extracted_path))
 
             with open(extracted_path, 'r') as in_file:
@@ -679,7 +722,7 @@ def generate_bill(cloud_url, admin_key, organization_id, date=None):
     return j
 
 
-def data_request(cloud_url, admin_key, type, location_id=None, organization_id=None, start_time_ms=None, end_time_ms=None, device_types=None, ordered=1, compression=1, no_download=False):
+def data_request(cloud_url, admin_key, type, location_id=None, organization_id=None, start_time_ms=None, end_time_ms=None, device_types=None, ordered=1, compression=1, no_download=False, recording_format=RECORDING_FORMAT_JSON):
     """
     Submit a data request. Blocks until the data request is ready, downloads it, extracts it, and returns the file reference.
     https://iotapps.docs.apiary.io/#reference/device-measurements/data-requests/submit-data-request
@@ -697,10 +740,12 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
     :param ordered: 1=ASC (default); -1=DESC
     :param compression: 0=LZ4; 1=ZIP (default); 2=None
     :param no_download: True to only make the data request and then not actually do the download. This is useful for prepping a ton of downloads in the background before performing the downloads one-by-one. Default is False.
+    :param recording_format: Format of the --playback recordings generated from device parameters, RECORDING_FORMAT_JSON (default) or RECORDING_FORMAT_LZ4
     :return: Unique request key to be used in the retrieve_data_request() method to request this data.
     """
     import uuid
     import time
+    from concurrent.futures import ThreadPoolExecutor
 
     # Each request key we need to download
     request_keys = []
@@ -999,34 +1044,36 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
 
         data_requests.append(request)
 
-    print("Executing data requests")
-    total_requests = 0
-    for request in data_requests:
-        sys.stdout.write('.')
-        sys.stdout.flush()
+    def submit(request):
+        """
+        Submit one data request, waiting out any lockouts from the server
+        :param request: Data request for the HTTP body
+        """
         body = {
             "byEmail": False,
             "dataRequests": [request]
         }
 
-        # print("Headers: {}".format(json.dumps(headers, indent=2, sort_keys=True)))
-        # print("Params: {}".format(json.dumps(params, indent=2, sort_keys=True)))
-        # print("Body: {}".format(json.dumps(body, indent=2, sort_keys=True)))
-
-        downloaded = False
-        while not downloaded:
+        submitted = False
+        while not submitted:
             try:
                 r = _session().post(cloud_url + "/cloud/json/dataRequests", params=params, headers=headers, data=json.dumps(body))
                 j = json.loads(r.text)
-                # print("DATA REQUEST RESPONSE: {}".format(json.dumps(j, indent=2, sort_keys=True)))
                 _check_for_errors(j)
-                downloaded = True
+                submitted = True
 
             except ApiError as e:
                 if e.is_locked_out():
                     e.wait_for_lock_timeout()
                     print("Trying again...")
 
+        sys.stdout.write('.')
+        sys.stdout.flush()
+
+    print("Executing data requests")
+    with ThreadPoolExecutor(max_workers=DATA_REQUEST_WORKERS) as executor:
+        list(executor.map(submit, data_requests))
+
     if no_download:
         return
 
@@ -1073,13 +1120,11 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
         if stop:
             break
 
-        # Attempt the data request again
+        # Attempt the data requests we're still missing again
         if attempts % 50 == 0:
             print("Attempting the data request again...")
-            r = _session().post(cloud_url + "/cloud/json/dataRequests", params=params, headers=headers,
-                                data=json.dumps(body))
-            j = json.loads(r.text)
-            _check_for_errors(j)
+            with ThreadPoolExecutor(max_workers=DATA_REQUEST_WORKERS) as executor:
+                list(executor.map(submit, [request for request in data_requests if request['key'] not in results]))
 
         if attempts > 320:
             print("SKIPPING LOCATION {}; \n\nDATA REQUESTS {}; \n\nRESULTS {}".format(location_id,
@@ -1106,33 +1151,23 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
         print("No data request results were provided by the server.")
         raise ApiError("No data request results were provided by the server.", -1)
 
-    for result_key in results:
-        if results[result_key] is None:
-            continue
+    server_type = 'prod'
+    if 'sbox' in cloud_url:
+        server_type = 'sbox'
 
-        server_type = 'prod'
-        if 'sbox' in cloud_url:
-            server_type = 'sbox'
+    narratives_path = os.path.join(os.getcwd(), 'downloads', 'narratives')
+    locations_path = os.path.join(os.getcwd(), 'downloads', 'locations')
+    data_path = os.path.join(os.getcwd(), 'downloads', 'data')
 
-        narratives_path = os.path.join(os.getcwd(), 'downloads', 'narratives')
-        locations_path = os.path.join(os.getcwd(), 'downloads', 'locations')
-        data_path = os.path.join(os.getcwd(), 'downloads', 'data')
+    # Other locations may be downloading at the same time
+    os.makedirs(narratives_path, exist_ok=True)
+    os.makedirs(locations_path, exist_ok=True)
+    os.makedirs(data_path, exist_ok=True)
 
+    for result_key in results:
         final_path = os.path.join(os.getcwd(), 'downloads', "{}.zip".format(result_key))
         download_path = os.path.join(os.path.join(os.getcwd(), 'downloads'), "{}.zip".format(result_key))
 
-        if not os.path.exists(os.path.join(os.getcwd(), 'downloads')):
-            os.makedirs(os.path.join(os.getcwd(), 'downloads'))
-
-        if not os.path.exists(narratives_path):
-            os.makedirs(narratives_path)
-
-        if not os.path.exists(locations_path):
-            os.makedirs(locations_path)
-
-        if not os.path.exists(data_path):
-            os.makedirs(data_path)
-
         if type == DATA_REQUEST_TYPE_ORGANIZATION_LOCATIONS:
             filename_no_extension = "{}_{}_locations_from_org_{}".format(datetime.datetime.now().strftime("%Y.%m.%d"),
                                                                          server_type, organization_id)
@@ -1150,7 +1185,8 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
             filename_no_extension = "location_{}-{}_days_of_data".format(location_id, days)
             final_path = os.path.join(data_path, "{}.zip".format(filename_no_extension))
             download_path = os.path.join(data_path, "{}.zip".format(result_key))
-            download_paths[result_key] = download_path
+
+        download_paths[result_key] = download_path
 
         if os.path.exists(final_path):
             os.remove(final_path)
@@ -1158,8 +1194,51 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
         if os.path.exists(download_path):
             os.remove(download_path)
 
-        download_file(results[result_key], download_path)
-        print("Downloaded file: {}".format(download_path))
+    def fetch(result_key):
+        """
+        Download one data request result. Device data gets extracted as soon as it arrives, and modes and data streams get transformed.
+        :param result_key: Request key
+        :return: List of extracted device data files
+        """
+        download_file(results[result_key], download_paths[result_key])
+        print("Downloaded file: {}".format(download_paths[result_key]))
+
+        if type != DATA_REQUEST_TYPE_DEVICE_PARAMETERS:
+            return []
+
+        extracted_paths = []
+        with zipfile.ZipFile(download_paths[result_key], "r") as z:
+            for extracted_filename in z.namelist():
+                if extracted_filename.endswith("/"):
+                    continue
+
+                # Results are extracted side by side, so keep each one's files apart
+                extracted_path = os.path.join(data_path, "{}_{}".format(result_key, os.path.basename(extracted_filename)))
+                with z.open(extracted_filename) as source, open(extracted_path, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+                print("Extracted: {}".format(extracted_path))
+
+                if result_key in modes_keys:
+                    transformed_path = transform_modes_csv(extracted_path, location_object)
+                    os.remove(extracted_path)
+                    extracted_path = transformed_path
+
+                elif result_key in datastreams_keys:
+                    transformed_path = transform_datastreams_csv(extracted_path, location_object)
+                    os.remove(extracted_path)
+                    extracted_path = transformed_path
+
+                extracted_paths.append(extracted_path)
+
+        # Delete the original downloaded .zip file
+        if os.path.exists(download_paths[result_key]):
+            os.remove(download_paths[result_key])
+
+        return extracted_paths
+
+    # Download, extract, and transform every result at the same time
+    with ThreadPoolExecutor(max_workers=DATA_REQUEST_WORKERS) as executor:
+        extractedpaths_by_requestkey = dict(zip(results.keys(), executor.map(fetch, results.keys())))
 
     # STEP 4 : Transform and finalize all previously downloaded data
     if type == DATA_REQUEST_TYPE_LOCATION_NARRATIVES:
@@ -1168,8 +1247,13 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
 
         with zipfile.ZipFile(download_path, "r") as z:
             for extracted_filename in z.namelist():
-                z.extract(extracted_filename, narratives_path)
-                extracted_path = os.path.join(narratives_path, extracted_filename)
+                if extracted_filename.endswith("/"):
+                    continue
+
+                # Other locations may be extracting the same file names at the same time, so keep our files apart
+                extracted_path = os.path.join(narratives_path, "{}_{}".format(result_key, os.path.basename(extracted_filename)))
+                with z.open(extracted_filename) as source, open(extracted_path, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
                 print("Extracted: {}".format(extracted_path))
                 filename = transform_narrative_csv(extracted_path,
                                                    filename_no_extension + ".csv",
@@ -1206,45 +1290,26 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
         # { device : [extracted_file, extracted_file, extracted_file] }
         extracted_alerts_paths_by_device = {}
 
-        # Extract all our files
-        all_extracted_paths = []
-        for request_key in download_paths:
-            with zipfile.ZipFile(download_paths[request_key], "r") as z:
-                for extracted_filename in z.namelist():
-                    z.extract(extracted_filename, data_path)
-                    # extracted_filename = extracted_filename.replace(":", "_" )
-                    extracted_path = os.path.join(data_path, extracted_filename)
-                    all_extracted_paths.append(extracted_path)
-                    extractedpath_by_requestkey[request_key] = extracted_path
-
-                    # Log which ones of these relate to a device's parameters, activities, and alerts
-                    if request_key in device_by_requestkey:
-                        device = device_by_requestkey[request_key]
-
-                        if 'measures' in extracted_path:
-                            if device["id"] not in extracted_parameters_paths_by_device:
-                                extracted_parameters_paths_by_device[device["id"]] = []
-                            extracted_parameters_paths_by_device[device["id"]].append(extracted_path)
-                        elif 'alerts' in extracted_path:
-                            if device["id"] not in extracted_alerts_paths_by_device:
-                                extracted_alerts_paths_by_device[device["id"]] = []
-                            extracted_alerts_paths_by_device[device["id"]].append(extracted_path)
-
-                    elif request_key in modes_keys:
-                        transformed_files.append(transform_modes_csv(extracted_path, location_object))
-                        if os.path.exists(extracted_path):
-                            os.remove(extracted_path)
-
-                    elif request_key in datastreams_keys:
-                        transformed_files.append(transform_datastreams_csv(extracted_path, location_object))
-                        if os.path.exists(extracted_path):
-                            os.remove(extracted_path)
-
-                    print("Extracted: {}".format(extracted_path))
-
-            # Delete the original downloaded .zip files
-            if os.path.exists(download_paths[request_key]):
-                os.remove(download_paths[request_key])
+        # Sort out which of our extracted files relate to a device's parameters, activities, and alerts
+        for request_key in extractedpaths_by_requestkey:
+            for extracted_path in extractedpaths_by_requestkey[request_key]:
+                extractedpath_by_requestkey[request_key] = extracted_path
+
+                if request_key in device_by_requestkey:
+                    device = device_by_requestkey[request_key]
+
+                    if 'measures' in extracted_path:
+                        if device["id"] not in extracted_parameters_paths_by_device:
+                            extracted_parameters_paths_by_device[device["id"]] = []
+                        extracted_parameters_paths_by_device[device["id"]].append(extracted_path)
+                    elif 'alerts' in extracted_path:
+                        if device["id"] not in extracted_alerts_paths_by_device:
+                            extracted_alerts_paths_by_device[device["id"]] = []
+                        extracted_alerts_paths_by_device[device["id"]].append(extracted_path)
+
+                elif request_key in modes_keys or request_key in datastreams_keys:
+                    # Already transformed while it was downloading
+                    transformed_files.append(extracted_path)
 
         print("Extracted paths by device: {}".format(json.dumps(extractedpath_by_requestkey, indent=2, sort_keys=True)))
         print("Extracted parameter paths by device: {}".format(json.dumps(extracted_parameters_paths_by_device, indent=2, sort_keys=True)))
@@ -1383,13 +1448,17 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
                 zip_all_these_file_paths.append(filename)
                 data_request_files["{}_alert".format(key)] = filename
 
-        zip_all_these_file_paths += _generate_recordings(cloud_url, admin_key, location_id, transformed_files, data_request_files, data_path, start_time_ms=start_time_ms, end_time_ms=end_time_ms)
+        zip_all_these_file_paths += _generate_recordings(cloud_url, admin_key, location_id, transformed_files, data_request_files, data_path, start_time_ms=start_time_ms, end_time_ms=end_time_ms, recording_format=recording_format)
         #zip_all_these_file_paths.append(_generate_ism(transformed_files, os.path.join(data_path, "ism_{}.pickle".format(location_id))))
 
         print("Final Path: {}".format(final_path))
         zip_out = zipfile.ZipFile(final_path, 'w', zipfile.ZIP_DEFLATED)
         for filename in zip_all_these_file_paths:
-            zip_out.write(filename, arcname=os.path.basename(filename))
+            if filename.endswith(RECORDING_LZ4_EXTENSION):
+                # Already compressed, and storing it as-is lets --playback seek inside the .zip file
+                zip_out.write(filename, arcname=os.path.basename(filename), compress_type=zipfile.ZIP_STORED)
+            else:
+                zip_out.write(filename, arcname=os.path.basename(filename))
             if os.path.exists(filename):
                 os.remove(filename)
         zip_out.close()
@@ -1397,6 +1466,60 @@ def data_request(cloud_url, admin_key, type, location_id=None, organization_id=N
     return final_path
 
 
+def data_request_locations(cloud_url, admin_key, type, location_ids, progress_filename=None, workers=DATA_REQUEST_LOCATION_WORKERS, **kwargs):
+    """
+    Run data_request() for many locations at the same time, such as every location in an organization.
+
+    Progress is saved to the progress file after each location finishes. Running the same pull again with the same
+    progress file skips every location that already finished, and tries the locations that failed again.
+
+    :param cloud_url: Cloud URL
+    :param admin_key: Administrative API key
+    :param type: See DATA_REQUEST_TYPE_*
+    :param location_ids: List of location IDs to extract data from
+    :param progress_filename: Optional .json file to resume from and save progress to
+    :param workers: Number of locations to export at the same time, default is DATA_REQUEST_LOCATION_WORKERS
+    :param kwargs: Any other arguments for data_request()
+    :return: { location_id : final path } for every location that finished, including the ones that finished in earlier runs
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    progress = {
+        "completed": {},
+        "failed": {}
+    }
+
+    if progress_filename is not None and os.path.exists(progress_filename):
+        with open(progress_filename, 'r') as f:
+            progress["completed"] = json.load(f).get("completed", {})
+
+    remaining_location_ids = [location_id for location_id in location_ids if str(location_id) not in progress["completed"]]
+    print("{} of {} locations already exported".format(len(location_ids) - len(remaining_location_ids), len(location_ids)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for location_id in remaining_location_ids:
+            futures[executor.submit(data_request, cloud_url, admin_key, type, location_id=location_id, **kwargs)] = location_id
+
+        for index, future in enumerate(as_completed(futures)):
+            location_id = futures[future]
+            try:
+                progress["completed"][str(location_id)] = future.result()
+                print("({} of {}) Exported location ID {}".format(index + 1, len(futures), location_id))
+
+            except Exception as e:
+                progress["failed"][str(location_id)] = str(e)
+                print("({} of {}) Error exporting location ID {} - {}".format(index + 1, len(futures), location_id, str(e)))
+
+            if progress_filename is not None:
+                # Write the whole file next to the old one first, so an interruption never leaves a half-written progress file behind
+                with open(progress_filename + ".tmp", 'w') as f:
+                    json.dump(progress, f, indent=2, sort_keys=True)
+                os.replace(progress_filename + ".tmp", progress_filename)
+
+    return progress["completed"]
+
+
 def get_service_plans(cloud_url, admin_key, location_id=None, organization_id=None):
     """
     Get service plans
@@ -1491,7 +1614,7 @@ def download_file(from_url, to_path):
     :param to_path: Full file path to download to
     :return: Full path to the local filename
     """
-    with requests.get(from_url, stream=True) as r:
+    with _session().get(from_url, stream=True) as r:
         with open(to_path, 'wb') as f:
             shutil.copyfileobj(r.raw, f)
 
@@ -1610,123 +1733,82 @@ def transform_device_csv(original_csv_file, device_object, type=DATA_REQUEST_TYP
         PARAMETER_VALUE_COLUMN = 4
 
         parameters = {}
-        with open(original_csv_file, 'r') as f:
-            for index, line in enumerate(f.readlines()):
-                if index > 0:
-                    value = ""
-                    in_bracket = 0
-                    in_quote = 0
-                    line_list = []
-                    for c in line:
-                        if c == '[':
-                            in_bracket += 1
-                        elif c == ']':
-                            in_bracket -= 1
-
-                        if c == '\"' and in_quote > 0:
-                            in_quote -= 1
-                        elif c == '\"':
-                            in_quote += 1
-
-                        if in_bracket == 0 and in_quote == 0:
-                            if c == ',':
-                                line_list.append(value)
-                                value = ""
-                                continue
-
-                        value += c
+        for line_list in _tokenize_csv(original_csv_file):
+            param_name = line_list[PARAMETER_NAME_COLUMN].strip()
+            param_index = line_list[PARAMETER_INDEX_COLUMN].strip()
 
-                    line_list.append(value)
+            if len(param_index) > 0:
+                param_name = param_name + "." + param_index
 
-                    param_name = line_list[PARAMETER_NAME_COLUMN].strip()
-                    param_index = line_list[PARAMETER_INDEX_COLUMN].strip()
+            if param_name not in parameters:
+                parameters[param_name] = line_list[PARAMETER_VALUE_COLUMN].strip()
 
-                    if len(param_index) > 0:
-                        param_name = param_name + "." + param_index
+        # Every parameter was discovered above, so the columns never change from here on
+        sorted_parameters = sorted(parameters.keys())
 
-                    if param_name not in parameters:
-                        parameters[param_name] = line_list[PARAMETER_VALUE_COLUMN].strip()
+        timezone_string = "America/Los_Angeles"
+        if 'timezone' in device_object:
+            timezone_string = device_object['timezone']['id']
+        timezone = pytz.timezone(timezone_string)
 
         with open(new_file_path, 'w') as out:
             # STEP 2. Output CSV header
             out.write("trigger,location_id,device_type,device_id,description,timestamp_ms,timestamp_iso,timestamp_excel,behavior")
 
 
-            for p in sorted(list(parameters.keys())):
+            for p in sorted_parameters:
                 out.write("," + p)
             out.write("\n")
 
             # STEP 3. Read from the original file and export all columns
-            with open(original_csv_file, 'r') as f:
-                line_buffer = ""
-                last_timestamp_ms = 0
+            line_buffer = ""
+            last_timestamp_ms = 0
+            timestamp_iso = None
 
-                for index, line in enumerate(f.readlines()):
-                    if index > 0:
-                        value = ""
-                        in_bracket = 0
-                        in_quote = 0
-                        line_list = []
-                        for c in line:
-                            if c == '[':
-                                in_bracket += 1
-                            elif c == ']':
-                                in_bracket -= 1
-
-                            if c == '\"' and in_quote > 0:
-                                in_quote -= 1
-                            elif c == '\"':
-                                in_quote += 1
-
-                            if in_bracket == 0 and in_quote == 0:
-                                if c == ',':
-                                    line_list.append(value)
-                                    value = ""
-                                    continue
-
-                            value += c
-
-                        line_list.append(value)
-
-                        param_name = line_list[PARAMETER_NAME_COLUMN].strip()
-                        param_index = line_list[PARAMETER_INDEX_COLUMN].strip()
-                        timestamp_ms = int(line_list[TIMESTAMP_COLUMN].strip())
-
-                        if last_timestamp_ms != timestamp_ms:
-                            if last_timestamp_ms > 0:
-                                line_buffer += "\n"
-
-                            out.write(line_buffer)
-                            last_timestamp_ms = timestamp_ms
-
-                        if len(param_index) > 0:
-                            param_name = param_name + "." + param_index
-
-                        parameters[param_name] = line_list[PARAMETER_VALUE_COLUMN].strip()
-
-                        trigger = 8
-                        if param_name == "[online]":
-                            trigger = 4
-
-                        # ISO is UTC time while the Excel timestamp is in the user's local timezone
-                        timestamp_iso = datetime.datetime.utcfromtimestamp(timestamp_ms / 1000.0).isoformat() + "Z"
-                        timezone_string = "America/Los_Angeles"
-                        if 'timezone' in device_object:
-                            timezone_string = device_object['timezone']['id']
-                        timestamp_excel = datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, pytz.timezone(timezone_string)).strftime('%m/%d/%Y %H:%M:%S')
-
-                        line_buffer = "{},{},{},{},{},{},{},{},{}".format(trigger, location_id, device_type, device_id,
-                                                                        device_description, timestamp_ms, timestamp_iso,
-                                                                        timestamp_excel, behavior)
-
-                        for p in sorted(list(parameters.keys())):
-                            # Remove quotes on values - not sure where the quotes came from but it would be more ideal to remove them earlier.
-                            if parameters[p].startswith("\"") and parameters[p].endswith("\""):
-                                parameters[p] = parameters[p][1:-1]
-                            line_buffer += ",{}".format(parameters[p].replace(",", COMMA_DELIMITER_REPLACEMENT_CHARACTER))
+            for line_list in _tokenize_csv(original_csv_file):
+                param_name = line_list[PARAMETER_NAME_COLUMN].strip()
+                param_index = line_list[PARAMETER_INDEX_COLUMN].strip()
+                timestamp_ms = int(line_list[TIMESTAMP_COLUMN].strip())
 
-                line_buffer += "\n"
-                out.write(line_buffer)
+                if last_timestamp_ms != timestamp_ms:
+                    if last_timestamp_ms > 0:
+                        line_buffer += "\n"
+
+                    out.write(line_buffer)
+                    last_timestamp_ms = timestamp_ms
+                    timestamp_iso = None
+
+                if timestamp_iso is None:
+                    # ISO is UTC time while the Excel timestamp is in the user's local timezone.
+                    # Every parameter at the same timestamp shares them.
+                    timestamp_iso = datetime.datetime.utcfromtimestamp(timestamp_ms / 1000.0).isoformat() + "Z"
+                    timestamp_excel = datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, timezone).strftime('%m/%d/%Y %H:%M:%S')
+
+                if len(param_index) > 0:
+                    param_name = param_name + "." + param_index
+
+                parameters[param_name] = line_list[PARAMETER_VALUE_COLUMN].strip()
+
+                trigger = 8
+                if param_name == "[online]":
+                    trigger = 4
+
+                line_buffer = "{},{},{},{},{},{},{},{},{}".format(trigger, location_id, device_type, device_id,
+                                                                device_description, timestamp_ms, timestamp_iso,
+                                                                timestamp_excel, behavior)
+
+                values = []
+                for p in sorted_parameters:
+                    # Remove quotes on values - not sure where the quotes came from but it would be more ideal to remove them earlier.
+                    if parameters[p].startswith("\"") and parameters[p].endswith("\""):
+                        parameters[p] = parameters[p][1:-1]
+                    values.append(parameters[p].replace(",", COMMA_DELIMITER_REPLACEMENT_CHARACTER))
+
+                if len(values) > 0:
+                    line_buffer += "," + ",".join(values)
+
+            line_buffer += "\n"
+            out.write(line_buffer)
 
     elif type == DATA_REQUEST_TYPE_DEVICE_ALERTS:
 
@@ -1744,44 +1826,17 @@ def transform_device_csv(original_csv_file, device_object, type=DATA_REQUEST_TYP
         alert_name = ""
         alert_params = {}
         if os.path.exists(original_csv_file):
-            with open(original_csv_file, 'r') as f:
-                for index, line in enumerate(f.readlines()):
-                    if index > 0:
-                        value = ""
-                        in_bracket = 0
-                        in_quote = 0
-                        line_list = []
-                        for c in line:
-                            if c == '[':
-                                in_bracket += 1
-                            elif c == ']':
-                                in_bracket -= 1
-
-                            if c == '\"' and in_quote > 0:
-                                in_quote -= 1
-                            elif c == '\"':
-                                in_quote += 1
-
-                            if in_bracket == 0 and in_quote == 0:
-                                if c == ',':
-                                    line_list.append(value)
-                                    value = ""
-                                    continue
-
-                            value += c
-
-                        line_list.append(value)
-
-                        alert_name = line_list[ALERT_NAME_COLUMN].strip()
-                        params = line_list[ALERT_PARAM_GROUP_COLUMN].strip()
-                        if len(params) > 0:
-                            try:
-                                params_json = json.loads(params.replace('"{','{').replace('}"','}').replace('""','"'))
-                            except:
-                                continue
-                            for param_name in params_json.keys():
-                                if param_name not in alert_params:
-                                    alert_params[param_name] = params_json[param_name]
+            for line_list in _tokenize_csv(original_csv_file):
+                alert_name = line_list[ALERT_NAME_COLUMN].strip()
+                params = line_list[ALERT_PARAM_GROUP_COLUMN].strip()
+                if len(params) > 0:
+                    try:
+                        params_json = json.loads(params.replace('"{','{').replace('}"','}').replace('""','"'))
+                    except:
+                        continue
+                    for param_name in params_json.keys():
+                        if param_name not in alert_params:
+                            alert_params[param_name] = params_json[param_name]
 
         with open(new_file_path, 'w') as out:
             # STEP 2. Output CSV header
@@ -1795,85 +1850,57 @@ def transform_device_csv(original_csv_file, device_object, type=DATA_REQUEST_TYP
 
             # STEP 3. Read from the original file and export all columns
             if os.path.exists(original_csv_file):
-                with open(original_csv_file, 'r') as f:
-                    line_buffer = ""
-                    last_timestamp_ms = 0
-
-                    for index, line in enumerate(f.readlines()):
-                        if index > 0:
-                            value = ""
-                            in_bracket = 0
-                            in_quote = 0
-                            line_list = []
-                            for c in line:
-                                if c == '[':
-                                    in_bracket += 1
-                                elif c == ']':
-                                    in_bracket -= 1
-
-                                if c == '\"' and in_quote > 0:
-                                    in_quote -= 1
-                                elif c == '\"':
-                                    in_quote += 1
-
-                                if in_bracket == 0 and in_quote == 0:
-                                    if c == ',':
-                                        line_list.append(value)
-                                        value = ""
-                                        continue
-
-                                value += c
-
-                            line_list.append(value)
-
-
-                            timestamp_ms = int(line_list[TIMESTAMP_COLUMN].strip())
-
-                            if last_timestamp_ms != timestamp_ms:
-                                if last_timestamp_ms > 0:
-                                    line_buffer += "\n"
-
-                                out.write(line_buffer)
-                                last_timestamp_ms = timestamp_ms
-
-                            alert_name = line_list[ALERT_NAME_COLUMN].strip()
-                            params = line_list[ALERT_PARAM_GROUP_COLUMN].strip()
-                            cur_alert_params = {}
-                            if len(params) > 0:
-                                try:
-                                    params_json = json.loads(params.replace('"{','{').replace('}"','}').replace('""','"'))
-                                except:
-                                    continue
-                                for param_name in params_json.keys():
-                                    if param_name not in cur_alert_params:
-                                        cur_alert_params[param_name] = params_json[param_name]
-                            print(alert_params)
-                            print(cur_alert_params)
-                            # asfd
-                            trigger = 4
-
-                            # ISO is UTC time while the Excel timestamp is in the user's local timezone
-                            timestamp_iso = datetime.datetime.utcfromtimestamp(timestamp_ms / 1000.0).isoformat() + "Z"
-                            timezone_string = "America/Los_Angeles"
-                            if 'timezone' in device_object:
-                                timezone_string = device_object['timezone']['id']
-                            timestamp_excel = datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, pytz.timezone(timezone_string)).strftime('%m/%d/%Y %H:%M:%S')
-
-                            line_buffer = "{},{},{},{},{},{},{},{},{},{}".format(trigger, location_id, device_type, device_id,
-                                                                            device_description, timestamp_ms, timestamp_iso,
-                                                                            timestamp_excel, behavior, alert_name)
-
-                            for p in sorted(list(alert_params.keys())):
-                                if p not in cur_alert_params:
-                                    line_buffer += ","
-                                    continue        
-                                # Remove quotes on values - not sure where the quotes came from but it would be more ideal to remove them earlier.
-                                if cur_alert_params[p].startswith("\"") and cur_alert_params[p].endswith("\""):
-                                    cur_alert_params[p] = cur_alert_params[p][1:-1]
-                                line_buffer += ",{}".format(cur_alert_params[p].replace(",", COMMA_DELIMITER_REPLACEMENT_CHARACTER))
-
-                    line_buffer += "\n"
-                    out.write(line_buffer)
+                timezone_string = "America/Los_Angeles"
+                if 'timezone' in device_object:
+                    timezone_string = device_object['timezone']['id']
+                timezone = pytz.timezone(timezone_string)
+
+                line_buffer = ""
+                last_timestamp_ms = 0
+
+                for line_list in _tokenize_csv(original_csv_file):
+                    timestamp_ms = int(line_list[TIMESTAMP_COLUMN].strip())
+
+                    if last_timestamp_ms != timestamp_ms:
+                        if last_timestamp_ms > 0:
+                            line_buffer += "\n"
+
+                        out.write(line_buffer)
+                        last_timestamp_ms = timestamp_ms
+
+                    alert_name = line_list[ALERT_NAME_COLUMN].strip()
+                    params = line_list[ALERT_PARAM_GROUP_COLUMN].strip()
+                    cur_alert_params = {}
+                    if len(params) > 0:
+                        try:
+                            params_json = json.loads(params.replace('"{','{').replace('}"','}').replace('""','"'))
+                        except:
+                            continue
+                        for param_name in params_json.keys():
+                            if param_name not in cur_alert_params:
+                                cur_alert_params[param_name] = params_json[param_name]
+
+                    trigger = 4
+
+                    # ISO is UTC time while the Excel timestamp is in the user's local timezone
+                    timestamp_iso = datetime.datetime.utcfromtimestamp(timestamp_ms / 1000.0).isoformat() + "Z"
+                    timestamp_excel = datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, timezone).strftime('%m/%d/%Y %H:%M:%S')
+
+                    line_buffer = "{},{},{},{},{},{},{},{},{},{}".format(trigger, location_id, device_type, device_id,
+                                                                    device_description, timestamp_ms, timestamp_iso,
+                                                                    timestamp_excel, behavior, alert_name)
+
+                    for p in sorted(list(alert_params.keys())):
+                        if p not in cur_alert_params:
+                            line_buffer += ","
+                            continue
+                        # Remove quotes on values - not sure where the quotes came from but it would be more ideal to remove them earlier.
+                        if cur_alert_params[p].startswith("\"") and cur_alert_params[p].endswith("\""):
+                            cur_alert_params[p] = cur_alert_params[p][1:-1]
+                        line_buffer += ",{}".format(cur_alert_params[p].replace(",", COMMA_DELIMITER_REPLACEMENT_CHARACTER))
+
+                line_buffer += "\n"
+                out.write(line_buffer)
 
     return new_file_path
 
@@ -2156,105 +2183,297 @@ def __zipdir(path, z):
             z.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), os.path.join(path, '..')))
 
 
-def _generate_recordings(cloud_url, admin_key, location_id, transformed_files, data_request_files, output_directory, start_time_ms=None, end_time_ms=None):
+def _generate_recordings(cloud_url, admin_key, location_id, transformed_files, data_request_files, output_directory, start_time_ms=None, end_time_ms=None, recording_format=RECORDING_FORMAT_JSON):
     """
-    Generate recordings for --playback from our downloaded, transformed files
+    Generate recordings for --playback from our downloaded, transformed files.
+
+    Each transformed file is already in timestamp order, so the files are merged as streams into the combined recording
+    while every device's own recording is written out in the same pass. Memory is bounded by the number of open files, not the amount of data.
+
     :param transformed_files:
+    :param recording_format: RECORDING_FORMAT_JSON (default) for readable and editable .json recordings, or RECORDING_FORMAT_LZ4 for compact .jsonl.lz4 recordings with a sidecar index
     :return: List of recordings
     """
+    import heapq
+    from concurrent.futures import ThreadPoolExecutor
     print("Generating recordings for --playback...")
     location_info = get_location(cloud_url, admin_key, location_id)
     devices = get_devices(cloud_url, admin_key, location_id)
     device_properties = {}
-    for device in devices:
-        device_properties[device['id']] = get_device_properties(cloud_url, admin_key, location_id, device['id'])
-
-    all_data = []
+    with ThreadPoolExecutor(max_workers=DATA_REQUEST_WORKERS) as executor:
+        for device, properties in zip(devices, executor.map(lambda d: get_device_properties(cloud_url, admin_key, location_id, d['id']), devices)):
+            device_properties[device['id']] = properties
+
+    # Find the span of time covered by our data, and make sure each file really is in timestamp order before we merge it.
+    streams = []
+    oldest_timestamp_ms = None
+    newest_timestamp_ms = None
     for f in transformed_files:
-        all_data += _csv_file_to_python(f)
-
-    # Massive amount of data to sort by timestamp - btw, hope your computer has a lot of memory.
-    all_data = sorted(all_data, key=lambda d: d['timestamp_ms'])
+        in_order = True
+        previous_timestamp_ms = None
+        for line in _iter_csv_file(f):
+            timestamp_ms = line['timestamp_ms']
+            if previous_timestamp_ms is not None and timestamp_ms < previous_timestamp_ms:
+                in_order = False
+            previous_timestamp_ms = timestamp_ms
+
+            if oldest_timestamp_ms is None or timestamp_ms < oldest_timestamp_ms:
+                oldest_timestamp_ms = timestamp_ms
+            if newest_timestamp_ms is None or timestamp_ms > newest_timestamp_ms:
+                newest_timestamp_ms = timestamp_ms
+
+        if in_order:
+            streams.append(_iter_csv_file(f))
+        else:
+            print("\t=> {} is out of order, sorting it in memory...".format(f))
+            streams.append(iter(sorted(_csv_file_to_python(f), key=lambda d: d['timestamp_ms'])))
 
     if start_time_ms is not None:
         oldest_timestamp_ms = start_time_ms
-    else:
-        oldest_timestamp_ms = all_data[0]['timestamp_ms']
 
     if end_time_ms is not None:
         newest_timestamp_ms = end_time_ms
-    else:
-        newest_timestamp_ms = all_data[-1]['timestamp_ms']
 
     subdomain = _get_subdomain_from_url(cloud_url)
 
-    days = int((newest_timestamp_ms - oldest_timestamp_ms) / ONE_DAY_MS)
+    days = 0
+    if oldest_timestamp_ms is not None and newest_timestamp_ms is not None:
+        days = int((int(newest_timestamp_ms) - int(oldest_timestamp_ms)) / ONE_DAY_MS)
     filename_no_extension = "recording-location_{}-{}_days_of_data".format(location_id, days)
 
-    output_filename = os.path.join(output_directory, filename_no_extension + ".json")
-    saved_files = [output_filename]
+    if recording_format == RECORDING_FORMAT_LZ4:
+        recording_writer = _Lz4RecordingWriter
+        extension = RECORDING_LZ4_EXTENSION
+    else:
+        recording_writer = _JsonRecordingWriter
+        extension = ".json"
+
+    header = {}
+    if data_request_files:
+        header["data_requests"] = {}
+        for key, filename in data_request_files.items():
+            if "_param" in key:
+                header["data_requests"][key.replace("_param","")] = os.path.basename(filename)
+        data_request_files.clear()
+
+    header["location_info"] = location_info
+    header["device_properties"] = device_properties
+
+    # Each device gets its own recording, opened the first time we see a measurement or alert from that device
+    device_descriptions = {}
+    for device in devices:
+        device_descriptions[device['id']] = device['desc']
+
+    device_header = {
+        "location_info": location_info,
+        "device_properties": device_properties
+    }
+    device_writers = {}
 
     # Extract all data into a total combined recording
-    print("\t=> Exporting {}...".format(output_filename))
-    with open(output_filename, 'w') as out:
+    writer = recording_writer(os.path.join(output_directory, filename_no_extension + extension), header)
+    try:
+        for line in heapq.merge(*streams, key=lambda d: d['timestamp_ms']):
+            writer.write(line)
+
+            if int(line['trigger']) not in [4, 8]:
+                continue
+
+            device_id = line.get('device_id')
+            if device_id not in device_descriptions:
+                continue
+
+            if device_id not in device_writers:
+                output_filename = os.path.join(output_directory, slugify("recording__{}_{}_location-{}".format(device_id, device_descriptions[device_id], location_id)) + extension)
+                device_writers[device_id] = recording_writer(output_filename, device_header)
+
+            device_writers[device_id].write(line)
+
+    finally:
+        saved_files = writer.close()
+        for device in devices:
+            if device['id'] in device_writers:
+                saved_files += device_writers[device['id']].close()
+
+    return saved_files
+
+
+class _JsonRecordingWriter():
+    """
+    Write a readable and editable .json recording for --playback one data record at a time
+    """
+    def __init__(self, output_filename, header):
+        """
+        :param output_filename: Recording filename ending in .json
+        :param header: Dictionary of everything in the recording besides the data
+        """
+        print("\t=> Exporting {}...".format(output_filename))
+        self.output_filename = output_filename
+        self.records = 0
+        self.out = open(output_filename, 'w')
+
         # We do it this way so our file remains totally readable and editable later.
-        out.write("{\n")
-        if data_request_files:
-            param_data_request_files = {}
-            for key, filename in data_request_files.items():
-                if "_param" in key:
-                    param_data_request_files[key.replace("_param","")] = os.path.basename(filename)
-
-            out.write("\"data_requests\":" + json.dumps(param_data_request_files) + ",\n")
-            data_request_files.clear()
-
-        out.write("\"location_info\":" + json.dumps(location_info) + ",\n")
-        out.write("\"device_properties\":" + json.dumps(device_properties) + ",\n")
-        out.write("\"data\":[\n")
-        for index, line in enumerate(all_data):
-            out.write("{}".format(json.dumps(line)))
-
-            if index < len(all_data) - 1:
-                out.write(",\n")
-            else:
-                out.write("\n")
+        self.out.write("{\n")
+        for key, value in header.items():
+            self.out.write("\"{}\":".format(key) + json.dumps(value) + ",\n")
+        self.out.write("\"data\":[\n")
 
-        out.write("\n]}\n")
+    def write(self, record):
+        """
+        Append the next data record
+        :param record: Data record, in timestamp order
+        """
+        if self.records > 0:
+            self.out.write(",\n")
+        self.out.write(json.dumps(record))
+        self.records += 1
 
-    # Now extract out each device into its own recording
-    for device in devices:
-        device_id = device['id']
-        output_filename = os.path.join(output_directory, slugify("recording__{}_{}_location-{}".format(device['id'], device['desc'], location_id)) + ".json")
+    def close(self):
+        """
+        Finish the recording
+        :return: [ recording filename ]
+        """
+        if self.records > 0:
+            self.out.write("\n")
+        self.out.write("\n]}\n")
+        self.out.close()
+        return [self.output_filename]
 
-        lines_for_this_device = []
-        for line in all_data:
-            if int(line['trigger']) in [4,8]:
-                if line['device_id'] != device_id:
-                    continue
-                lines_for_this_device.append(line)
 
-        if len(lines_for_this_device) > 0:
-            print("\t=> Exporting {}...".format(output_filename))
-            with open(output_filename, 'w') as out:
-                # We do it this way so our file remains totally readable and editable later.
-                lines = 0
-                out.write("{\n")
-                out.write("\"location_info\":" + json.dumps(location_info) + ",\n")
-                out.write("\"device_properties\":" + json.dumps(device_properties) + ",\n")
-                out.write("\"data\":[\n")
-                for index, line in enumerate(lines_for_this_device):
-                    out.write("{}".format(json.dumps(line)))
+class _Lz4RecordingWriter():
+    """
+    Write a compact binary recording for --playback one data record at a time, along with its sidecar index.
 
-                    if index < len(lines_for_this_device) - 1:
-                        out.write(",\n")
-                    else:
-                        out.write("\n")
+    The recording is a series of LZ4 frames holding JSON lines. The first frame holds the header line,
+    and every other frame holds up to RECORDING_LZ4_RECORDS_PER_FRAME data records in timestamp order.
+    The index is a .json file { "version": 1, "frames": [ [ first_timestamp_ms, byte_offset ], ... ] } locating each frame of data records.
+    """
+    def __init__(self, output_filename, header):
+        """
+        :param output_filename: Recording filename ending in RECORDING_LZ4_EXTENSION
+        :param header: Dictionary of everything in the recording besides the data
+        """
+        import lz4.frame
+        print("\t=> Exporting {}...".format(output_filename))
+        self.output_filename = output_filename
+        self.frames = []
+        self.records = []
+        self.out = open(output_filename, 'wb')
+        self.out.write(lz4.frame.compress((json.dumps(header) + "\n").encode('utf-8')))
+
+    def write(self, record):
+        """
+        Append the next data record
+        :param record: Data record, in timestamp order
+        """
+        self.records.append(record)
+        if len(self.records) >= RECORDING_LZ4_RECORDS_PER_FRAME:
+            self._flush()
 
-                out.write("\n]}\n")
+    def close(self):
+        """
+        Finish the recording and write its index
+        :return: [ recording filename, index filename ]
+        """
+        self._flush()
+        self.out.close()
 
-            saved_files.append(output_filename)
+        index_filename = self.output_filename + RECORDING_INDEX_EXTENSION
+        with open(index_filename, 'w') as out:
+            json.dump({"version": RECORDING_LZ4_FORMAT_VERSION, "frames": self.frames}, out)
+
+        return [self.output_filename, index_filename]
+
+    def _flush(self):
+        """
+        Compress the pending data records into the next frame
+        """
+        import lz4.frame
+        if len(self.records) == 0:
+            return
+
+        self.frames.append([int(self.records[0]['timestamp_ms']), self.out.tell()])
+        self.out.write(lz4.frame.compress("".join([json.dumps(line) + "\n" for line in self.records]).encode('utf-8')))
+        self.records = []
+
+
+def _write_lz4_recording(output_filename, header, records):
+    """
+    Write a compact binary recording for --playback, along with its sidecar index. See _Lz4RecordingWriter.
+    :param output_filename: Recording filename ending in RECORDING_LZ4_EXTENSION
+    :param header: Dictionary of everything in the recording besides the data
+    :param records: List of data records sorted by timestamp
+    :return: [ recording filename, index filename ]
+    """
+    writer = _Lz4RecordingWriter(output_filename, header)
+    for line in records:
+        writer.write(line)
+    return writer.close()
+
+
+def _tokenize_csv(csv_file, chunk_size=CSV_READ_CHUNK_SIZE):
+    """
+    Stream the rows of a data request .csv file in the server's format, skipping the header row.
+
+    measureTime,paramName,index,group,value
+    1589920192201,buttonStatus,,,0
+    1589920192201,json,,,"{""a"": [1, 2]}"
+
+    Commas inside [brackets] or "quotes" don't separate values, so JSON content stays in one piece along with its brackets and quotes.
+    The file is read in chunks, and only the brackets, quotes, and commas of each row are examined one at a time.
+
+    :param csv_file: Original CSV filename
+    :param chunk_size: Number of characters to read at a time
+    :return: Generator of a list of values for each row
+    """
+    with open(csv_file, 'r') as f:
+        header = True
+        remainder = ""
+        while True:
+            chunk = f.read(chunk_size)
+            if len(chunk) == 0:
+                break
+
+            lines = (remainder + chunk).split("\n")
+            remainder = lines.pop()
+            for line in lines:
+                if header:
+                    header = False
+                elif len(line) > 0:
+                    yield _split_csv_line(line)
+
+        if len(remainder) > 0 and not header:
+            yield _split_csv_line(remainder)
+
+
+def _split_csv_line(line):
+    """
+    Split one row of a data request .csv file into its values
+    :param line: Row without its newline
+    :return: List of values
+    """
+    if '"' not in line and '[' not in line and ']' not in line:
+        return line.split(",")
+
+    values = []
+    start = 0
+    in_bracket = 0
+    in_quote = False
+    for match in _CSV_SPECIAL_CHARACTERS.finditer(line):
+        c = match.group()
+        if c == '[':
+            in_bracket += 1
+        elif c == ']':
+            in_bracket -= 1
+        elif c == '"':
+            in_quote = not in_quote
+        elif in_bracket == 0 and not in_quote:
+            values.append(line[start:match.start()])
+            start = match.end()
+
+    values.append(line[start:])
+    return values
 
-    return saved_files
 
 def _csv_file_to_python(csv_file):
     """
@@ -2262,11 +2481,18 @@ def _csv_file_to_python(csv_file):
     :param csv_file: CSV file path
     :return: [ { bunch of transformed csv data here } ]
     """
+    return list(_iter_csv_file(csv_file))
+
+def _iter_csv_file(csv_file):
+    """
+    Stream a CSV file as dictionary content, one line at a time
+    :param csv_file: CSV file path
+    :return: Generator of { bunch of transformed csv data here }
+    """
     headers = []
-    all_data = []
     trim_dangling_comma = False
     with open(csv_file, 'r') as f:
-        for index, line in enumerate(f.readlines()):
+        for index, line in enumerate(f):
             line = line.strip()
             if trim_dangling_comma:
                 line = line[:-1]
@@ -2289,8 +2515,7 @@ def _csv_file_to_python(csv_file):
                     if len(values[i]) == 0:
                         continue
                     data[h] = values[i].replace(COMMA_DELIMITER_REPLACEMENT_CHARACTER, ",")
-                all_data.append(data)
-    return all_data
+                yield data
 
 def _generate_ism(transformed_files, ism_path):
     """
@@ -2301,12 +2526,9 @@ def _generate_ism(transformed_files, ism_path):
     :param ism_path: File path to save the resulting ISM file
     :return: ism_path if successful
     """
+    import ism
     print("Generating ISM {}...".format(ism_path))
-    modes_csv = None
-    csv_strings = []
-    csv_types = []
-    csv_total_headers = []
-    is_file_broken = False
+    builder = ism.IntegratedSensorMatrixBuilder()
     for transformed_filename in transformed_files:
         print("\t=> Processing {}".format(transformed_filename))
         device_type = int(os.path.basename(transformed_filename).split('_')[0])
@@ -2319,123 +2541,92 @@ def _generate_ism(transformed_files, ism_path):
 
         # Currently not supporting other devices besides Entry and Motion
         # Currently not supporting index numbers
-        if is_motion or is_pressurepad or is_entry or is_vayyar:
-            focused_csv = "device_type,device_id,description,behavior,timestamp_ms,timestamp_iso"
-            with open(transformed_filename, 'r') as f:
-                for index, line in enumerate(f.readlines()):
-                    if index == 0:
-                        original_headers = line.replace('\n', '').replace('\r', '').split(",")
-                        # The current_parameter_state will maintain the current state of each parameter
-                        # Because the server doesn't fill out the complete state for each parameter at every timestamp
-                        current_parameter_state = {}
-
-                        for i in range(0, 9):
-                            # Only keep the device param
-                            del (original_headers[0])
-
-                        # Add a placeholder for PIR motion detection events with Vayyar Home
-                        # Note that this now produces more CSV headers than we have columns for in our data
-                        if is_vayyar:
-                            original_headers.append("motionStatus")
+        if not (is_motion or is_pressurepad or is_entry or is_vayyar):
+            continue
 
-                        if is_entry and 'doorStatus' not in original_headers:
-                            is_file_broken = True
-                            break
+        if is_motion or is_vayyar:
+            csv_type = "motion"
 
-                        is_file_broken = False
-
-                        # Add the header to our csv headers
-                        for header in original_headers:
-                            focused_csv += ",{}".format(header)
-                            current_parameter_state[header] = None
-
-                        csv_total_headers.append(len(focused_csv.split(',')))
-
-                        # Line break
-                        focused_csv += "\r\n"
-                    else:
-                        line = line.replace('\n', '').replace('\r', '')
-                        value = ""
-                        in_bracket = 0
-                        in_quote = 0
-                        line_list = []
-                        for c in line:
-                            if c == '[':
-                                in_bracket += 1
-                            elif c == ']':
-                                in_bracket -= 1
-
-                            if c == '\"' and in_quote > 0:
-                                in_quote -= 1
-                            elif c == '\"':
-                                in_quote += 1
-
-                            if in_bracket == 0 and in_quote == 0:
-                                if c == ',':
-                                    line_list.append(value)
-                                    value = ""
-                                    continue
-
-                            value += c
-
-                        line_list.append(value)
-
-                        for i in range(9, len(line_list)):
-                            index = i - 9
-                            try:
-                                value = normalize_measurement(line_list[i])
-                            except:
-                                # Probably a Vayyar Home device where the 'motionStatus' header we added isn't in the real original headers of this device.
-                                continue
+        elif is_entry:
+            csv_type = "entry"
 
-                            if value != '':
-                                current_parameter_state[original_headers[index]] = value
+        else:
+            csv_type = "pressure"
+
+        # Columns parsed straight out of the file, handed to the ISM without ever going back into a .csv string
+        description = None
+        timestamps_ms = []
+        timestamps_iso = []
+        readings = []
+        behaviors = []
+        is_file_broken = False
+        with open(transformed_filename, 'r') as f:
+            for index, line in enumerate(f):
+                line = line.replace('\n', '').replace('\r', '')
+                if index == 0:
+                    # Only keep the device params
+                    original_headers = line.split(",")[9:]
 
-                                if is_vayyar:
-                                    # Special handling for Vayyar Home to transform it into a PIR motion detector.
-                                    if original_headers[index] == "occupancy":
-                                        try:
-                                            current_parameter_state["motionStatus"] = value > 0
-                                        except Exception as e:
-                                            print("Exception")
+                    # Add a placeholder for PIR motion detection events with Vayyar Home
+                    if is_vayyar:
+                        original_headers.append("motionStatus")
 
-                                    elif original_headers[index] == "occupancyTarget":
-                                        current_parameter_state[original_headers[index]] = str(value).replace("-", ";")
-                                        current_parameter_state["motionStatus"] = value != ""
+                    if is_entry and 'doorStatus' not in original_headers:
+                        is_file_broken = True
+                        break
 
-                        focused_csv += "{},{},{},{},{},{}".format(line_list[2], line_list[3],
-                                                                  line_list[4], line_list[8],
-                                                                  line_list[5], line_list[6])
+                    reading_header = None
+                    for header in ism.ISM_READING_COLUMNS:
+                        if header in original_headers:
+                            reading_header = header
+                            break
 
-                        for header in original_headers:
-                            focused_csv += ",{}".format(current_parameter_state[header])
+                    # The current_parameter_state will maintain the current state of each parameter
+                    # Because the server doesn't fill out the complete state for each parameter at every timestamp
+                    current_parameter_state = {}
+                    for header in original_headers:
+                        current_parameter_state[header] = None
+                    continue
 
-                        focused_csv += "\r\n"
+                line_list = _split_csv_line(line)
+                for i in range(9, len(line_list)):
+                    header = original_headers[i - 9]
+                    try:
+                        value = normalize_measurement(line_list[i])
+                    except:
+                        # Probably a Vayyar Home device where the 'motionStatus' header we added isn't in the real original headers of this device.
+                        continue
 
-            if is_file_broken:
-                continue
+                    if value != '':
+                        current_parameter_state[header] = value
+
+                        if is_vayyar:
+                            # Special handling for Vayyar Home to transform it into a PIR motion detector.
+                            if header == "occupancy":
+                                try:
+                                    current_parameter_state["motionStatus"] = value > 0
+                                except Exception as e:
+                                    print("Exception")
 
-            # CONCLUDE
-            csv_strings.append(focused_csv)
+                            elif header == "occupancyTarget":
+                                current_parameter_state[header] = str(value).replace("-", ";")
+                                current_parameter_state["motionStatus"] = value != ""
 
-            if is_motion or is_vayyar:
-                csv_types.append("motion")
+                description = line_list[4]
+                timestamps_ms.append(int(line_list[5]))
+                timestamps_iso.append(line_list[6])
+                behaviors.append(line_list[8])
+                readings.append("{}".format(current_parameter_state.get(reading_header)))
 
-            elif is_entry:
-                csv_types.append("entry")
+        if is_file_broken or description is None:
+            continue
 
-            elif is_pressurepad:
-                csv_types.append("pressure")
+        builder.add_sensor(csv_type, description, timestamps_ms, readings, behaviors, timestamps_iso)
 
-    # TODO properly extract the modes CSV for the ISM
-    if modes_csv is not None:
-        csv_strings.append(modes_csv)
-        csv_types.append("modes")
-        csv_total_headers.append(5)
+    builder.add_notes_csv(get_csv())
 
     print("\t=> Generating ISM")
-    import ism
-    integrated_sensor_matrix = ism.create_integrated_sensor_matrix_str(csv_strings, csv_types, csv_total_headers, get_csv())
+    integrated_sensor_matrix = builder.build().to_str()
 
     import pickle
     if os.path.exists(ism_path):
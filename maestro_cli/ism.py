@@ -21,8 +21,10 @@ def create_integrated_sensor_matrix_str(str_batch, types, h_len, ml_note):
     if behavior_flag is False:
         ser = np.array([[0, 0, 0, 0]])
         wid = 4
+    # Collect every sensor's matrix and concatenate them all at once at the end
+    parts = [ser]
     for x in range(len(str_batch)):
-        # then through this loop we append each new sensor's matrix to the master
+        # then through this loop we collect each new sensor's matrix for the master
         if behavior_flag:
             tmp = extract_sensor_data_behaviors(str_batch[x], types[x], h_len[x])
         if behavior_flag is False:
@@ -30,7 +32,7 @@ def create_integrated_sensor_matrix_str(str_batch, types, h_len, ml_note):
         if len(tmp.shape) == 2:
             # ADD EXTRA DIMENSION HERE TOO
             if tmp.shape[1] == wid:
-                ser = np.r_[ser, tmp]
+                parts.append(tmp)
             if tmp.shape[1] != wid:
                 print('Matrix for ' + types[x] + ' is too narrow')
                 print('It has shape ' + str(tmp.shape))
@@ -41,6 +43,7 @@ def create_integrated_sensor_matrix_str(str_batch, types, h_len, ml_note):
             print('It has shape ' + str(tmp.shape))
             print('It looks like:')
             print(tmp)
+    ser = np.concatenate(parts)
     print('Overall matrix has dimension ' + str(ser.shape))
     string_a = np.array(ml_note.split(','))
     s_ln = len(string_a)
@@ -115,7 +118,7 @@ def del_sec_basic(arr):
     :param arr: an array of timestamps
     :return an array of millisecond intervals
     """
-    tmp = np.array([intify_tstmp(x) for x in arr])
+    tmp = iso_to_ms(arr)
     return tmp[1:] - tmp[0:-1]
 
 
@@ -217,3 +220,305 @@ def intify_tstmp(tstmp):
     return int(time.mktime(tmp.timetuple()) * 1000) + val
 
 
+
+
+def iso_to_ms(tstmp):
+    """
+    Convert an array of ISO 8601 UTC timestamps to millisecond ints all at once
+    :param tstmp: an array of timestamps like '2022-12-06T05:34:02.123000Z'
+    :return an int64 array of milliseconds since the epoch
+    """
+    tstmp = np.char.rstrip(np.asarray(tstmp, dtype=str), 'Z')
+    return tstmp.astype('datetime64[ms]').astype(np.int64)
+
+
+# Columns holding the reading of each type of sensor in a device .csv, in order of preference
+ISM_READING_COLUMNS = ['Status', 'event', 'source', 'doorStatus', 'motionStatus', 'pressureStatus']
+
+# How each type of sensor gets interpreted: (readings when it turns on and off, minimum milliseconds between readings, True to keep every raw reading)
+ISM_SENSOR_RULES = {
+    'entry': (['open', 'close'], 1000, False),
+    'motion': (['start', 'stop'], 5000, False),
+    'pressure': (['pressure on', 'pressure off'], 1000, False),
+    'modes': (['none', 'none'], 0, True)
+}
+
+# Anything else keeps every raw reading
+ISM_OTHER_SENSOR_RULE = (['none', 'none'], 0, True)
+
+# Sensors with fewer rows than this don't contribute to the matrix
+ISM_MINIMUM_ROWS = 5
+
+# Sensor type of notification rows
+ISM_NOTE_TYPE = 'note'
+
+
+def ms_to_iso(timestamp_ms):
+    """
+    Format millisecond timestamps the same way Maestro writes the timestamp_iso column of its .csv files
+    :param timestamp_ms: an array of milliseconds since the epoch
+    :return an array of ISO 8601 UTC timestamps like '2022-12-06T05:34:02.123000Z'
+    """
+    return np.array([datetime.datetime.utcfromtimestamp(t / 1000.0).isoformat() + "Z" for t in timestamp_ms], dtype=str)
+
+
+class IntegratedSensorMatrix(object):
+    """
+    Typed integrated sensor matrix, sorted by time.
+
+    Every row is an int64 timestamp in milliseconds plus a categorical code for the reading, device name, sensor type, and behavior.
+    The categories behind each code are in the readings, names, types, and behaviors arrays.
+    The original ISO 8601 timestamp strings are kept alongside, for to_str().
+    """
+
+    def __init__(self, timestamp_ms, timestamp_iso, reading, name, type, behavior, readings, names, types, behaviors):
+        """
+        :param timestamp_ms: int64 array of timestamps in milliseconds
+        :param timestamp_iso: Array of the original ISO 8601 timestamp strings
+        :param reading: Codes into readings
+        :param name: Codes into names
+        :param type: Codes into types
+        :param behavior: Codes into behaviors
+        :param readings: Array of reading categories, like 'open' or 'stop'
+        :param names: Array of device names
+        :param types: Array of sensor types, like 'entry' or 'motion'
+        :param behaviors: Array of device behaviors
+        """
+        self.timestamp_ms = timestamp_ms
+        self.timestamp_iso = timestamp_iso
+        self.reading = reading
+        self.name = name
+        self.type = type
+        self.behavior = behavior
+        self.readings = readings
+        self.names = names
+        self.types = types
+        self.behaviors = behaviors
+
+    def __len__(self):
+        return len(self.timestamp_ms)
+
+    def intervals_ms(self):
+        """
+        :return: int64 array of milliseconds between each row and the row before it
+        """
+        return np.diff(self.timestamp_ms)
+
+    def select(self, type):
+        """
+        :param type: Sensor type, like 'entry' or 'motion'
+        :return: Boolean index of the rows from that type of sensor
+        """
+        codes = np.flatnonzero(self.types == type)
+        if len(codes) == 0:
+            return np.zeros(len(self), dtype=bool)
+        return self.type == codes[0]
+
+    def to_str(self):
+        """
+        The same nx5 string array as create_integrated_sensor_matrix_str(), sorted by time.
+
+        Entry, motion, and pressure rows are [timestamp_iso, reading, name, type, behavior].
+        Like the string matrix, rows that keep every raw reading (modes and other devices) are [timestamp_iso, reading, 'none', name, type],
+        and notification rows are [timestamp_iso, 'note', 'none', '0.0', '0.0'].
+
+        :return: nx5 string array
+        """
+        name = self.names[self.name]
+        type_s = self.types[self.type]
+        matrix = np.c_[self.timestamp_iso,
+                       self.readings[self.reading],
+                       name,
+                       type_s,
+                       self.behaviors[self.behavior],
+                       np.repeat('0.0', len(self))]
+
+        raw = np.array([ISM_SENSOR_RULES.get(t, ISM_OTHER_SENSOR_RULE)[2] and t != ISM_NOTE_TYPE for t in type_s], dtype=bool)
+        matrix[raw, 2] = 'none'
+        matrix[raw, 3] = name[raw]
+        matrix[raw, 4] = type_s[raw]
+
+        note = type_s == ISM_NOTE_TYPE
+        matrix[note, 3] = '0.0'
+        matrix[note, 4] = '0.0'
+        return matrix[:, 0:5]
+
+
+class IntegratedSensorMatrixBuilder(object):
+    """
+    Builds a typed integrated sensor matrix from parsed columns, one sensor at a time.
+    Nothing is copied into the final matrix until build(), which concatenates everything once.
+    """
+
+    def __init__(self):
+        # [ (timestamp_ms, reading, name, type, behavior), ... ] with one entry for each sensor
+        self.parts = []
+
+    def add_sensor(self, type_s, name, timestamp_ms, values, behaviors=None, timestamp_iso=None):
+        """
+        Add one device's readings
+        :param type_s: 'entry', 'motion', 'pressure', 'modes', or anything else
+        :param name: Device name
+        :param timestamp_ms: Timestamps in milliseconds, oldest first
+        :param values: Reading at each timestamp
+        :param behaviors: Optional behavior at each timestamp
+        :param timestamp_iso: Optional ISO 8601 string of each timestamp, formatted from timestamp_ms by default
+        :return: Number of rows added to the matrix
+        """
+        timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+        values = np.asarray(values).astype(str)
+        if behaviors is None:
+            behaviors = np.repeat('none', len(timestamp_ms))
+        behaviors = np.asarray(behaviors).astype(str)
+
+        readings, cut, keep_raw = ISM_SENSOR_RULES.get(type_s, ISM_OTHER_SENSOR_RULE)
+        if type_s == 'motion' and ('entry' in name or 'Entry' in name or 'door' in name or 'Door' in name):
+            # Motion sensors on doors are read as entry sensors, with motion's cutoff
+            type_s = 'entry'
+            readings = ['close', 'open']
+
+        if len(timestamp_ms) < ISM_MINIMUM_ROWS:
+            return 0
+
+        if timestamp_iso is None:
+            timestamp_iso = ms_to_iso(timestamp_ms)
+        timestamp_iso = np.asarray(timestamp_iso).astype(str)
+
+        if keep_raw:
+            # Modes and other devices keep every reading as-is, without a behavior
+            behaviors = np.repeat('none', len(timestamp_ms))
+            reading = values
+
+        else:
+            # Switch boolean strings to binary ints, then finite differencing tracks the changes
+            val = (values == 'True').astype(np.int8)
+            if np.sum(val) == 0:
+                val = (values == '1').astype(np.int8)
+
+            diff = np.diff(val)
+            changed = np.flatnonzero(diff) + 1
+            timestamp_ms = timestamp_ms[changed]
+            timestamp_iso = timestamp_iso[changed]
+            behaviors = behaviors[changed]
+            reading = np.where(diff[changed - 1] == 1, readings[0], readings[1])
+
+            # Both intervals before AND after a reading must be longer than the cutoff
+            valid = np.diff(timestamp_ms) > cut
+            keep = np.r_[True, valid] & np.r_[valid, True]
+            timestamp_ms = timestamp_ms[keep]
+            timestamp_iso = timestamp_iso[keep]
+            behaviors = behaviors[keep]
+            reading = reading[keep]
+
+        self.parts.append((timestamp_ms, timestamp_iso, reading, np.repeat(name, len(timestamp_ms)), np.repeat(type_s, len(timestamp_ms)), behaviors))
+        return len(timestamp_ms)
+
+    def add_notes(self, timestamp_ms, timestamp_iso=None):
+        """
+        Add notification timestamps
+        :param timestamp_ms: Timestamps in milliseconds
+        :param timestamp_iso: Optional ISO 8601 string of each timestamp, formatted from timestamp_ms by default
+        :return: Number of rows added to the matrix
+        """
+        timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+        if timestamp_iso is None:
+            timestamp_iso = ms_to_iso(timestamp_ms)
+        timestamp_iso = np.asarray(timestamp_iso).astype(str)
+
+        total = len(timestamp_ms)
+        self.parts.append((timestamp_ms, timestamp_iso, np.repeat('note', total), np.repeat('none', total), np.repeat(ISM_NOTE_TYPE, total), np.repeat('none', total)))
+        return total
+
+    def add_notes_csv(self, ml_note):
+        """
+        Add notifications from a .csv string
+        :param ml_note: .csv string of notifications, location_id,timestamp_ms,timestamp_iso,type
+        :return: Number of rows added to the matrix
+        """
+        notes = np.array(ml_note.split(','))
+        rows = len(notes) // 4
+        notes = np.reshape(notes[0:rows * 4], (rows, 4))[1:]
+        notes = notes[notes[:, 1] != '']
+        return self.add_notes(notes[:, 1].astype(np.int64), notes[:, 2])
+
+    def build(self):
+        """
+        :return: IntegratedSensorMatrix sorted by time, without any rows at timestamp 0
+        """
+        if len(self.parts) == 0:
+            self.parts.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=str), np.zeros(0, dtype=str), np.zeros(0, dtype=str), np.zeros(0, dtype=str), np.zeros(0, dtype=str)))
+
+        timestamp_ms, timestamp_iso, reading, name, type_s, behavior = [np.concatenate(column) for column in zip(*self.parts)]
+        keep = (timestamp_ms != 0) & (timestamp_iso != '0')
+        order = np.argsort(timestamp_ms[keep], kind='stable')
+
+        columns = []
+        for column in [reading, name, type_s, behavior]:
+            categories, codes = np.unique(column[keep][order], return_inverse=True)
+            columns.append((categories, codes.astype(np.int32)))
+
+        return IntegratedSensorMatrix(timestamp_ms[keep][order], timestamp_iso[keep][order],
+                                      columns[0][1], columns[1][1], columns[2][1], columns[3][1],
+                                      columns[0][0], columns[1][0], columns[2][0], columns[3][0])
+
+
+def csv_string_to_columns(string):
+    """
+    Parse a .csv string one line at a time
+    :param string: a comma-delimited string of data from a single device, with a header row
+    :return: { header: array of that column's values }
+    """
+    lines = [line for line in string.splitlines() if line != '']
+    if len(lines) == 0:
+        return {}
+
+    headers = lines[0].split(',')
+    rows = [line.split(',') for line in lines[1:]]
+
+    columns = {}
+    for index, header in enumerate(headers):
+        columns[header] = np.array([row[index] if index < len(row) else '' for row in rows], dtype=str)
+    return columns
+
+
+def create_integrated_sensor_matrix(str_batch, types, ml_note=None):
+    """
+    Typed version of create_integrated_sensor_matrix_str()
+    :param str_batch: List of .csv strings where each .csv string element is an entire .csv file
+    :param types: List of "motion", "entry", "pressure" or "modes" strings in the same position as the .csv data in str_batch
+    :param ml_note: Optional .csv string of notifications, location_id,timestamp_ms,timestamp_iso,type
+    :return: IntegratedSensorMatrix
+    """
+    builder = IntegratedSensorMatrixBuilder()
+    for csv_string, type_s in zip(str_batch, types):
+        if csv_string is None:
+            continue
+
+        columns = csv_string_to_columns(csv_string)
+        if 'timestamp_ms' in columns:
+            timestamp_ms = columns['timestamp_ms'].astype(np.int64)
+        elif 'timestamp_iso' in columns:
+            timestamp_ms = iso_to_ms(columns['timestamp_iso'])
+        else:
+            continue
+
+        values = np.zeros(len(timestamp_ms), dtype=str)
+        for header in ISM_READING_COLUMNS:
+            if header in columns:
+                values = columns[header]
+                break
+
+        # Like the string matrix, files without a description (or with the description first) are named 'modes'
+        headers = list(columns.keys())
+        name = 'modes'
+        if 'description' in columns and headers.index('description') > 0 and len(columns['description']) > 0:
+            name = columns['description'][0]
+
+        # Files without a behavior column take their behavior from the first column
+        behaviors = columns.get('behavior', columns[headers[0]])
+        builder.add_sensor(type_s, name, timestamp_ms, values, behaviors, columns.get('timestamp_iso'))
+
+    if ml_note is not None:
+        builder.add_notes_csv(ml_note)
+
+    return builder.build()
@@ -79,6 +79,8 @@ def main():
     functional_group.add_argument("--start_time_ms", dest="start_time_ms", help="For data downloads, this is an optional absolute Unix epoch start time in milliseconds")
     functional_group.add_argument("--days_ago", dest="days_ago", help="Number of days ago to start a data request. Instead of looking up a start_time_ms, this will figure it out for you.")
     functional_group.add_argument("--end_time_ms", dest="end_time_ms", help="For data downloads, this is an optional absolute Unix epoch end time in milliseconds")
+    functional_group.add_argument("--recording_format", dest="recording_format", choices=[api.RECORDING_FORMAT_JSON, api.RECORDING_FORMAT_LZ4], default=api.RECORDING_FORMAT_JSON, help="Format of the --playback recordings generated by --data. 'lz4' is a compact binary recording with a seekable index.")
+    functional_group.add_argument("--workers", dest="workers", type=int, default=api.DATA_REQUEST_LOCATION_WORKERS, help="Number of locations to download at the same time when downloading from a whole organization (default is {}). Interrupted organization downloads resume where they left off.".format(api.DATA_REQUEST_LOCATION_WORKERS))
     functional_group.add_argument("--care_active", dest="care_active", help="CareActive folder path, merge care active datas with PPC location datas.")
     functional_group.add_argument("--care_option", dest="care_option", choices=['default', 'merged'], default='default', help="The option for zip file, default is the whole data json file.")
 
@@ -144,14 +146,13 @@ def main():
         else:
             locations = [args.location_id]
 
-        index = 0
-        for location_id in locations:
-            index += 1
-            print("({} of {}) Narrative request for this location ID: {}".format(index, len(locations), location_id))
-            try:
-                api.data_request(args.cloud_url, args.admin_key, api.DATA_REQUEST_TYPE_LOCATION_NARRATIVES, location_id=location_id, start_time_ms=start_time_ms, end_time_ms=args.end_time_ms)
-            except Exception as e:
-                print("Error requesting narratives for location ID {} - {}".format(location_id, str(e)))
+        import os
+        progress_filename = None
+        if args.location_id is None:
+            progress_filename = os.path.join(os.getcwd(), 'downloads', api.DATA_REQUEST_PROGRESS_FILENAME.format(args.organization_id, api.DATA_REQUEST_TYPE_LOCATION_NARRATIVES))
+            os.makedirs(os.path.dirname(progress_filename), exist_ok=True)
+
+        api.data_request_locations(args.cloud_url, args.admin_key, api.DATA_REQUEST_TYPE_LOCATION_NARRATIVES, locations, progress_filename=progress_filename, workers=args.workers, start_time_ms=start_time_ms, end_time_ms=args.end_time_ms)
 
     if args.data:
         if args.organization_id is None and args.location_id is None:
@@ -174,11 +175,15 @@ def main():
         #     time.sleep(5)
 
         print(Color.BOLD + "\nDOWNLOADING DEVICE DATA" + Color.END)
-        index = 0
-        for location_id in locations:
-            index += 1
-            print("({} of {}) Data download request for this location ID: {}".format(index, len(locations), location_id))
-            api.data_request(args.cloud_url, args.admin_key, api.DATA_REQUEST_TYPE_DEVICE_PARAMETERS, location_id=location_id, no_download=False, start_time_ms=start_time_ms, end_time_ms=args.end_time_ms)
+        import os
+        if args.organization_id is not None:
+            progress_filename = os.path.join(os.getcwd(), 'downloads', api.DATA_REQUEST_PROGRESS_FILENAME.format(args.organization_id, api.DATA_REQUEST_TYPE_DEVICE_PARAMETERS))
+            os.makedirs(os.path.dirname(progress_filename), exist_ok=True)
+            api.data_request_locations(args.cloud_url, args.admin_key, api.DATA_REQUEST_TYPE_DEVICE_PARAMETERS, locations, progress_filename=progress_filename, workers=args.workers, no_download=False, start_time_ms=start_time_ms, end_time_ms=args.end_time_ms, recording_format=args.recording_format)
+
+        else:
+            print("Data download request for this location ID: {}".format(args.location_id))
+            api.data_request(args.cloud_url, args.admin_key, api.DATA_REQUEST_TYPE_DEVICE_PARAMETERS, location_id=args.location_id, no_download=False, start_time_ms=start_time_ms, end_time_ms=args.end_time_ms, recording_format=args.recording_format)
 
     if args.lz4_request is not None:
         if args.location_id is None:
@@ -12,17 +12,19 @@ from maestro_cli.api import DATA_REQUEST_TYPE_DATA_STREAMS
 from maestro_cli.api import DATA_REQUEST_TYPE_DEVICE_ALERTS
 
 from unittest.mock import MagicMock
+from unittest.mock import patch
+
+LOCATION = {"addrStreet1": "123 Main", "addrCity": "Small Town", "zip": "12345", "id": 123, "name": "My Home", "timezone": {"id": "America/Los_Angeles", "offset": -480, "dst": True, "name": "Pacific Standard Time"}, "organizationId": 123}
 
 class TestMaestroCLI():
 
+    @patch.object(api, 'get_location', MagicMock(return_value=LOCATION))
+    @patch.object(api, 'get_devices', MagicMock(return_value=[{"id": "abc123", "type": 123, "goalId": -1, "typeCategory": 123, "desc": "Device", "modelId": "devicemodel", "lastDataReceivedDate": "2022-12-12T04:10:03.492Z", "lastDataReceivedDateMs": 1670818203492, "lastMeasureDate": "2022-12-12T04:10:02.046Z", "lastMeasureDateMs": 1670818202046, "connected": False, "newDevice": False, "proxyId": "02000001300001FA", "startDate": "2021-05-23T14:57:19Z", "startDateMs": 1621781839000, "location": LOCATION}]))
+    @patch.object(api, 'get_device_properties', MagicMock(return_value=[]))
     def test_maestro_cli_api(self):
         """
         :return:
         """
-        api.get_location = MagicMock(return_value={"addrStreet1": "123 Main", "addrCity": "Small Town", "zip": "12345", "id": 123, "name": "My Home", "timezone": {"id": "America/Los_Angeles", "offset": -480, "dst": True, "name": "Pacific Standard Time"}, "organizationId": 123})
-        api.get_devices = MagicMock(return_value=[{"id": "abc123", "type": 123, "goalId": -1, "typeCategory": 123, "desc": "Device", "modelId": "devicemodel", "lastDataReceivedDate": "2022-12-12T04:10:03.492Z", "lastDataReceivedDateMs": 1670818203492, "lastMeasureDate": "2022-12-12T04:10:02.046Z", "lastMeasureDateMs": 1670818202046, "connected": False, "newDevice": False, "proxyId": "02000001300001FA", "startDate": "2021-05-23T14:57:19Z", "startDateMs": 1621781839000, "location": api.get_location()}])
-        api.get_device_properties = MagicMock(return_value=[])
-
         tests_dir_path = os.path.join(os.getcwd(), 'tests')
         parameters_file = os.path.join(tests_dir_path, 'resources', 'device_parameters.csv')
         alerts_file = os.path.join(tests_dir_path, 'resources', 'device_alerts.csv')
@@ -73,3 +75,215 @@ class TestMaestroCLI():
 
 
         
+    def test_maestro_cli_tokenize_csv(self, tmp_path):
+        """
+        :return:
+        """
+        csv_file = os.path.join(str(tmp_path), 'device_parameters.csv')
+        with open(csv_file, 'w') as f:
+            f.write('measureTime,paramName,index,group,value\n')
+            f.write('1670270287513,temp,,,21.5\n')
+            f.write('1670270287513,[online],,,"true"\n')
+            f.write('1670270288513,json,1,,"{""a"": [1, 2], ""b"": ""x,y""}"\n')
+            f.write('1670270289513,list,,,[1,[2,3]]')
+
+        rows = [
+            ['1670270287513', 'temp', '', '', '21.5'],
+            ['1670270287513', '[online]', '', '', '"true"'],
+            ['1670270288513', 'json', '1', '', '"{""a"": [1, 2], ""b"": ""x,y""}"'],
+            ['1670270289513', 'list', '', '', '[1,[2,3]]']
+        ]
+        assert list(api._tokenize_csv(csv_file)) == rows
+
+        # Rows split across chunks come out the same
+        assert list(api._tokenize_csv(csv_file, chunk_size=5)) == rows
+
+    @patch.object(api, 'get_location', MagicMock(return_value={"id": 123}))
+    @patch.object(api, 'get_devices', MagicMock(return_value=[{"id": "b", "desc": "B"}, {"id": "a", "desc": "A"}, {"id": "c", "desc": "C"}]))
+    @patch.object(api, 'get_device_properties', MagicMock(return_value=[]))
+    def test_maestro_cli_merge_recordings(self, tmp_path):
+        """
+        :return:
+        """
+        import json
+
+        transformed_files = []
+        for device_id, timestamps in [("a", [1000, 3000, 5000]), ("b", [2000, 3000, 86402000]), ("c", [4000])]:
+            csv_file = os.path.join(str(tmp_path), 'device_{}.csv'.format(device_id))
+            transformed_files.append(csv_file)
+            with open(csv_file, 'w') as f:
+                f.write('timestamp_ms,trigger,device_id,value,\n')
+                for timestamp_ms in timestamps:
+                    f.write('{},{},{},{}&&{},\n'.format(timestamp_ms, 8 if device_id != "c" else 1, device_id, device_id, timestamp_ms))
+
+        saved_files = api._generate_recordings("https://app.example.com", "key", 123, transformed_files, None, str(tmp_path))
+        assert saved_files == [
+            os.path.join(str(tmp_path), 'recording-location_123-1_days_of_data.json'),
+            os.path.join(str(tmp_path), 'recording__b_b_location-123.json'),
+            os.path.join(str(tmp_path), 'recording__a_a_location-123.json')
+        ]
+
+        with open(saved_files[0], 'r') as f:
+            data = json.load(f)['data']
+        assert [(d['timestamp_ms'], d['device_id']) for d in data] == [("1000", "a"), ("2000", "b"), ("3000", "a"), ("3000", "b"), ("4000", "c"), ("5000", "a"), ("86402000", "b")]
+        assert data[0]['value'] == "a,1000"
+
+        with open(saved_files[1], 'r') as f:
+            assert [d['timestamp_ms'] for d in json.load(f)['data']] == ["2000", "3000", "86402000"]
+
+    def test_maestro_cli_data_request_locations(self, tmp_path, monkeypatch):
+        """
+        :return:
+        """
+        import io
+        import json
+        import threading
+        import zipfile
+        import urllib.parse
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        submitted = {}
+        lock = threading.Lock()
+
+        contents = {
+            DATA_REQUEST_TYPE_DEVICE_PARAMETERS: ('measures.csv', 'measureTime,paramName,index,group,value\n1600000001000,doorStatus,,,1\n'),
+            DATA_REQUEST_TYPE_DEVICE_ACTIVITIES: ('activities.csv', 'startTime,endTime\n1600000000000,5000000000001\n'),
+            DATA_REQUEST_TYPE_LOCATION_MODES: ('modes.csv', 'time,mode,sourceType\n1600000001000,HOME,0\n')
+        }
+
+        class StandInServer(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, body, content_type='application/json'):
+                if isinstance(body, dict):
+                    body = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                location_id = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)['locationId'][0]
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with lock:
+                    for request in body['dataRequests']:
+                        submitted[request['key']] = (location_id, request)
+                self.respond({"resultCode": 0})
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                location_id = urllib.parse.parse_qs(url.query).get('locationId', [None])[0]
+                if url.path == '/admin/json/locations':
+                    self.respond({"resultCode": 0, "locations": [{"id": int(location_id), "timezone": {"id": "UTC"}}]})
+
+                elif url.path == '/admin/json/devices':
+                    self.respond({"resultCode": 0, "devices": [{"id": "door-{}".format(location_id), "type": 10014, "desc": "Door", "startDateMs": 0, "location": {"id": int(location_id)}, "timezone": {"id": "UTC"}}]})
+
+                elif url.path.endswith('/properties'):
+                    self.respond({"resultCode": 0, "properties": []})
+
+                elif url.path == '/cloud/json/dataRequests':
+                    results = []
+                    with lock:
+                        for key, (request_location_id, request) in submitted.items():
+                            if request_location_id != location_id:
+                                continue
+                            if request['type'] in contents:
+                                results.append({"key": key, "url": "http://127.0.0.1:{}/download/{}".format(server.server_port, key), "dataLength": 1})
+                            else:
+                                results.append({"key": key, "dataLength": 0})
+                    self.respond({"resultCode": 0, "results": results})
+
+                elif url.path.startswith('/download/'):
+                    filename, content = contents[submitted[url.path.split('/')[-1]][1]['type']]
+                    f = io.BytesIO()
+                    with zipfile.ZipFile(f, 'w') as z:
+                        z.writestr(filename, content)
+                    self.respond(f.getvalue(), 'application/zip')
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        monkeypatch.chdir(tmp_path)
+
+        try:
+            cloud_url = "http://127.0.0.1:{}".format(server.server_port)
+            progress_filename = os.path.join(str(tmp_path), 'progress.json')
+            completed = api.data_request_locations(cloud_url, "key", DATA_REQUEST_TYPE_DEVICE_PARAMETERS, [1, 2], progress_filename=progress_filename, workers=2, start_time_ms=0, end_time_ms=20 * api.ONE_DAY_MS)
+
+            data_path = os.path.join(str(tmp_path), 'downloads', 'data')
+            assert completed == {
+                "1": os.path.join(data_path, 'location_1-20_days_of_data.zip'),
+                "2": os.path.join(data_path, 'location_2-20_days_of_data.zip')
+            }
+
+            # 2 chunks of parameters, activities, alerts, modes, and data streams for each location
+            assert len(submitted) == 12
+            assert sorted(os.listdir(data_path)) == ['location_1-20_days_of_data.zip', 'location_2-20_days_of_data.zip']
+
+            with zipfile.ZipFile(completed["1"], 'r') as z:
+                names = z.namelist()
+                recording = json.loads(z.read('recording-location_1-20_days_of_data.json'))
+            assert 'location_1_modes_history.csv' in names
+            assert 'recording__door-1_door_location-1.json' in names
+            assert [(d['trigger'], d['timestamp_ms']) for d in recording['data']] == [("4", "1600000000000"), ("2", "1600000001000"), ("8", "1600000001000")]
+
+            with open(progress_filename, 'r') as f:
+                assert json.load(f) == {"completed": completed, "failed": {}}
+
+            # Resuming the same pull doesn't make any more data requests
+            assert api.data_request_locations(cloud_url, "key", DATA_REQUEST_TYPE_DEVICE_PARAMETERS, [1, 2], progress_filename=progress_filename, workers=2, start_time_ms=0, end_time_ms=20 * api.ONE_DAY_MS) == completed
+            assert len(submitted) == 12
+
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_maestro_cli_ism(self):
+        """
+        :return:
+        """
+        import numpy as np
+        import maestro_cli.ism as ism
+
+        def iso(t):
+            return "{}Z".format(np.datetime_as_string(np.datetime64(t, 'ms'), unit='us'))
+
+        header = "device_type,device_id,description,behavior,timestamp_ms,timestamp_iso,doorStatus\r\n"
+        rows = [(1600000000000, True), (1600000010000, False), (1600000010500, True), (1600000020000, False), (1600000030000, True), (1600000040000, True)]
+        entry_csv = header + "".join(["10014,a,Front Door,3,{},{},{}\r\n".format(t, iso(t), v) for t, v in rows])
+        motion_csv = entry_csv.replace("doorStatus", "motionStatus").replace("Front Door", "Hallway").replace(",3,", ",0,")
+        door_motion_csv = motion_csv.replace("Hallway", "Back Door").replace(",a,", ",b,")
+        pressure_csv = entry_csv.replace("doorStatus", "pressureStatus").replace("Front Door", "Bed").replace(",a,", ",c,").replace("False", "0").replace("True", "1")
+
+        # Modes don't have a description column, and other devices have no behavior column
+        modes_csv = "timestamp_ms,timestamp_iso,event\r\n" + "".join(["{},{},{}\r\n".format(t, iso(t), mode) for t, mode in zip([r[0] for r in rows], ["HOME", "AWAY", "HOME", "SLEEP", "HOME", "AWAY"])])
+        other_csv = "device_id,description,timestamp_ms,timestamp_iso,source\r\n" + "".join(["d,Light,{},{},{}\r\n".format(t, iso(t), i) for i, t in enumerate([r[0] for r in rows])])
+
+        notes = "location_id,timestamp_ms,timestamp_iso,type,0,0,0,0,5,1600000025000,{},info,".format(iso(1600000025000))
+
+        str_batch = [entry_csv, motion_csv, door_motion_csv, pressure_csv, modes_csv, other_csv]
+        types = ["entry", "motion", "motion", "pressure", "modes", "light"]
+        legacy = ism.create_integrated_sensor_matrix_str(str_batch, types, [7, 7, 7, 7, 3, 5], notes)
+        matrix = ism.create_integrated_sensor_matrix(str_batch, types, notes)
+
+        # The 500ms blip is too short to keep the readings on either side of it
+        entry = ism.create_integrated_sensor_matrix([entry_csv, motion_csv], ["entry", "motion"])
+        assert entry.timestamp_ms.dtype == np.int64
+        assert list(entry.timestamp_ms) == [1600000020000, 1600000020000, 1600000030000, 1600000030000]
+        assert list(entry.readings[entry.reading]) == ["close", "stop", "open", "start"]
+        assert list(entry.names[entry.name]) == ["Front Door", "Hallway", "Front Door", "Hallway"]
+        assert list(entry.select("entry")) == [True, False, True, False]
+        assert list(entry.intervals_ms()) == [0, 10000, 0]
+
+        # A motion sensor on a door reads as an entry sensor
+        assert set(matrix.names[matrix.name][matrix.select("entry")]) == {"Front Door", "Back Door"}
+
+        # Exactly the same rows as the string matrix, in time order
+        assert sorted([tuple(row) for row in matrix.to_str()]) == sorted([tuple(row) for row in legacy])
+        assert list(matrix.to_str()[:, 0]) == sorted(legacy[:, 0])
+        assert list(matrix.timestamp_ms) == sorted(ism.iso_to_ms(legacy[:, 0]))
+        assert ("{}".format(iso(1600000025000)), "note", "none", "0.0", "0.0") in [tuple(row) for row in matrix.to_str()]
+        assert ("{}".format(iso(1600000010000)), "AWAY", "none", "modes", "modes") in [tuple(row) for row in matrix.to_str()]
+        assert ("{}".format(iso(1600000010000)), "1", "none", "Light", "light") in [tuple(row) for row in matrix.to_str()]
@@ -118,6 +118,31 @@ class TestBotEngine(unittest.TestCase):
         botengine._download_core_variables()
         assert botengine.variables == {"-core-": {"[c]": 0, "[q]": None, "[t]": None, "a": 1}}
 
+    @requests_mock.mock()
+    def test_botengine_prefetch_core_variables(self, mock_for_requests):
+        # Import BotEngine class
+        from botengine import BotEngine
+
+        # Initialize BotEngine
+        host = 'https://app.host.com'
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': host})
+
+        # Add a logger
+        add_logger(botengine)
+
+        import dill
+        core = mock_for_requests.get(host + "/analytic/variables/-core-", headers={}, content=dill.dumps({"a": 1}))
+
+        # The first method that needs the core variables waits for the background download
+        botengine._start_core_variables_thread()
+        assert botengine.load_variable("a") == 1
+        assert botengine.is_core_variables_downloaded()
+        assert botengine.variables == {"-core-": {"[c]": 0, "[q]": None, "[t]": None, "a": 1}}
+
+        botengine.save_variable("b", 2, required_for_each_execution=True)
+        assert botengine.load_variable("b") == 2
+        assert core.call_count == 1
+
     def test_botengine_get_secret(self):
         # Import BotEngine class
         from botengine import BotEngine
@@ -138,6 +163,380 @@ class TestBotEngine(unittest.TestCase):
 
         assert s is None
 
+    def test_botengine_extract_device_types(self):
+        import botengine
+
+        device_types = botengine._extract_device_types('./com.ppc.Bot')
+
+        assert device_types['10014'] == {"module": "devices.entry.entry", "class": "EntryDevice"}
+
+        # Alphabetically first module wins when more than one class declares a device type
+        assert device_types['9001'] == {"module": "devices.light.lightswitch_ge", "class": "LightswitchGeDevice"}
+
+    def test_botengine_intelligence_statistics(self):
+        from botengine import BotEngine
+
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': 'https://app.host.com'})
+        add_logger(botengine)
+
+        # The bot is only asked for its statistics once per execution
+        bot = MagicMock()
+        bot.get_intelligence_statistics.return_value = [{"name": "intelligence.test"}]
+        assert botengine.get_intelligence_statistics(bot) == [{"name": "intelligence.test"}]
+        assert botengine.get_intelligence_statistics(bot) == [{"name": "intelligence.test"}]
+        assert bot.get_intelligence_statistics.call_count == 1
+
+        # Bots without statistics report none
+        botengine.intelligence_statistics = None
+        assert botengine.get_intelligence_statistics(object()) == []
+
+    def test_botengine_flush_scheduler(self):
+        import time
+        import botengine as module
+        from botengine import BotEngine
+
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': 'https://app.host.com'})
+        add_logger(botengine)
+
+        finished = []
+
+        def flush(name, duration_sec):
+            time.sleep(duration_sec)
+            finished.append(name)
+
+        # Independent flushes overlap, and dependent flushes wait for their dependencies
+        start_sec = time.time()
+        scheduler = module._FlushScheduler(botengine)
+        scheduler.submit("analytics", flush, "analytics", 0.1)
+        scheduler.submit("states", flush, "states", 0.2, after=["analytics"])
+        scheduler.submit("variables", flush, "variables", 0.1, after=["analytics"])
+        scheduler.submit("alarm", flush, "alarm", 0, after=["variables"])
+        scheduler.submit("tags", flush, "tags", 0.2)
+        scheduler.wait()
+
+        assert time.time() - start_sec < 0.5
+        assert finished.index("analytics") < finished.index("variables") < finished.index("alarm")
+        assert finished.index("analytics") < finished.index("states")
+        assert len(finished) == 5
+
+        # Every flush finishes before the first exception is raised
+        def fail():
+            raise ValueError()
+
+        finished = []
+        scheduler = module._FlushScheduler(botengine)
+        scheduler.submit("analytics", fail)
+        scheduler.submit("variables", flush, "variables", 0, after=["analytics"])
+        try:
+            scheduler.wait()
+            assert False, "Expected the ValueError from the analytics flush"
+        except ValueError:
+            pass
+        assert finished == ["variables"]
+
+    @requests_mock.mock()
+    def test_botengine_batch_state_writes(self, mock_for_requests):
+        # Import BotEngine class
+        from botengine import BotEngine
+
+        # Initialize BotEngine
+        host = 'https://app.host.com'
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': host})
+        botengine.inputs = {'locationId': 1}
+
+        # Add a logger
+        add_logger(botengine)
+
+        state = mock_for_requests.put(host + "/cloud/json/locations/1/state", json={})
+        time_states = mock_for_requests.put(host + "/cloud/json/locations/1/timeStates", json={})
+
+        # Without batching, every state we haven't retrieved is written immediately
+        botengine.set_state("a", {"x": 1})
+        botengine.set_state("a", {"y": 2}, overwrite=False)
+        assert state.call_count == 2
+
+        # With batching, repeated writes to the same address are merged and flushed once
+        botengine.batch_state_writes = True
+        botengine.set_state("b", {"x": 1}, overwrite=False)
+        botengine.set_state("b", {"y": 2}, overwrite=False, fields_updated=["y"])
+        botengine.set_state("c", {"x": 1})
+        botengine.set_state("c", {"x": 2}, fields_updated=["x"])
+        botengine.set_state("d", {"x": 1}, timestamp_ms=1000)
+        botengine.set_state("d", {"x": 2}, timestamp_ms=1000)
+        botengine.set_state("d", {"x": 3}, timestamp_ms=2000)
+        assert state.call_count == 2
+        assert time_states.call_count == 0
+        assert botengine.get_state("c") == {"x": 2}
+
+        botengine.delete_state("e")
+        botengine.set_state("e", {"x": 1})
+        botengine.delete_state("e")
+        assert state.call_count == 4
+
+        botengine.flush_states()
+        assert state.call_count == 6
+        assert time_states.call_count == 2
+
+        import json
+        b = json.loads(state.request_history[4].text)
+        assert b == {"value": {"x": 1, "y": 2}}
+        assert state.request_history[4].qs['overwrite'] == ['false']
+        assert state.request_history[5].qs['upd'] == ['x']
+
+    @requests_mock.mock()
+    def test_botengine_timeseries_state_cache(self, mock_for_requests):
+        # Import BotEngine class
+        from botengine import BotEngine
+
+        # Initialize BotEngine
+        host = 'https://app.host.com'
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': host})
+        botengine.inputs = {'locationId': 1, 'time': 10000}
+
+        # Add a logger
+        add_logger(botengine)
+
+        get_state = mock_for_requests.get(host + "/cloud/json/locations/1/timeStates", json={"states": [{"stateDateMs": 1000, "value": {"x": 1}}, {"stateDateMs": 2000, "value": {"x": 2}}]})
+        put_state = mock_for_requests.put(host + "/cloud/json/locations/1/timeStates", json={})
+
+        # Every time range inside one we already downloaded is served from the cache
+        assert botengine.get_timeseries_state("a", 0) == {1000: {"x": 1}, 2000: {"x": 2}}
+        assert botengine.get_timeseries_state("a", 1500, 5000) == {2000: {"x": 2}}
+        assert botengine.get_state("a", timestamp_ms=1000) == {"x": 1}
+        assert get_state.call_count == 1
+
+        # Individual time-series states are only downloaded once
+        mock_for_requests.get(host + "/cloud/json/locations/1/timeStates", json={"states": [{"stateDateMs": 20000, "value": {"x": 20}}]})
+        assert botengine.get_state("b", timestamp_ms=20000) == {"x": 20}
+        assert botengine.get_state("b", timestamp_ms=20000) == {"x": 20}
+        assert get_state.call_count == 1
+        assert mock_for_requests.call_count == 2
+
+        # Saved states are written through to the cache
+        botengine.set_state("a", {"x": 3}, timestamp_ms=3000)
+        assert put_state.call_count == 1
+        assert botengine.get_state("a", timestamp_ms=3000) == {"x": 3}
+        assert botengine.get_timeseries_state("a", 0, 5000) == {1000: {"x": 1}, 2000: {"x": 2}, 3000: {"x": 3}}
+        assert mock_for_requests.call_count == 3
+
+        # Partial updates we don't know the full content of throw away the time ranges that include them
+        botengine.set_state("a", {"y": 4}, overwrite=False, timestamp_ms=2000)
+        botengine.get_timeseries_state("a", 0, 5000)
+        assert mock_for_requests.call_count == 5
+
+        # Deleting the time-series state forgets everything about it
+        botengine.delete_state("a", timeseries_property=True)
+        botengine.get_timeseries_state("a", 0, 5000)
+        assert mock_for_requests.call_count == 7
+
+    def test_botengine_playback_recording(self):
+        import os
+        import json
+        import zipfile
+        import tempfile
+        from botengine import PlaybackRecording
+        import maestro_cli.api as api
+
+        location_info = {"id": 1, "name": "Home", "timezone": {"id": "US/Pacific"}}
+        data = [{"trigger": "8", "timestamp_ms": str(1000 * i), "device_id": "a"} for i in range(10)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            # .json recordings are read in a single pass, with the data last
+            json_filename = os.path.join(directory, "recording.json")
+            with open(json_filename, "w") as f:
+                json.dump({"location_info": location_info, "device_properties": {"a": []}, "data": data}, f)
+
+            with PlaybackRecording(json_filename) as recording:
+                assert recording.location_info == location_info
+                assert recording.device_properties == {"a": []}
+                assert recording.data_requests is None
+                assert list(recording.records()) == data
+
+            # .jsonl.lz4 recordings seek to the frame holding the start time, straight out of the .zip file
+            with patch.object(api, "RECORDING_LZ4_RECORDS_PER_FRAME", 3):
+                filenames = api._write_lz4_recording(os.path.join(directory, "recording.jsonl.lz4"), {"location_info": location_info, "data_requests": {"a": "a.csv"}}, data)
+
+            with open(os.path.join(directory, "a.csv"), "w") as f:
+                f.write("paramName,measureTime\n")
+
+            zip_filename = os.path.join(directory, "recording.zip")
+            with zipfile.ZipFile(zip_filename, "w") as z:
+                for filename in filenames + [os.path.join(directory, "a.csv")]:
+                    z.write(filename, arcname=os.path.basename(filename))
+
+            with zipfile.ZipFile(zip_filename, "r") as z:
+                assert [filename for filename in z.namelist() if PlaybackRecording.is_recording(filename)] == ["recording.jsonl.lz4"]
+
+            with PlaybackRecording(zip_filename, "recording.jsonl.lz4") as recording:
+                assert recording.location_info == location_info
+                assert recording.data_requests == {"a": "a.csv"}
+                assert recording.read_file("a.csv") == b"paramName,measureTime\n"
+                assert [frame[0] for frame in recording.get_index()] == [0, 3000, 6000, 9000]
+                assert list(recording.records(start_timestamp_ms=7000)) == data[7:]
+                assert list(recording.records()) == data
+
+    def test_botengine_playback_schedules(self):
+        import datetime
+        import pytz
+        from botengine import PlaybackSchedules
+
+        assert PlaybackSchedules.to_cron("0 0 0/1 1/1 * ? *") == "0 0/1 1/1 * *"
+
+        schedules = PlaybackSchedules({"MIDNIGHT": "0 0 0 1/1 * ? *", "HOUR": "0 0 0/1 1/1 * ? *", "NOON": "0 0 12 1/1 * ? *"})
+        timezone = pytz.timezone("America/Los_Angeles")
+        start_timestamp_ms = int(timezone.localize(datetime.datetime(2024, 3, 9, 22, 30)).timestamp() * 1000)
+        schedules.start(start_timestamp_ms, "America/Los_Angeles")
+
+        # Nothing is due before the first firing
+        assert list(schedules.due(start_timestamp_ms + 1000)) == []
+
+        # Midnight and the hour fire together
+        midnight_timestamp_ms = int(timezone.localize(datetime.datetime(2024, 3, 10)).timestamp() * 1000)
+        fired = list(schedules.due(midnight_timestamp_ms))
+        assert [schedule_ids for timestamp_ms, schedule_ids in fired] == [["HOUR"], ["HOUR", "MIDNIGHT"]]
+        assert fired[-1][0] == midnight_timestamp_ms
+
+        # Daylight saving time skips 2am local time, and noon fires on local time
+        noon_timestamp_ms = int(timezone.localize(datetime.datetime(2024, 3, 10, 12)).timestamp() * 1000)
+        fired = list(schedules.due(noon_timestamp_ms))
+        assert len(fired) == 11
+        assert fired[-1] == (noon_timestamp_ms, ["HOUR", "NOON"])
+
+    def test_botengine_playback_batch(self):
+        import os
+        import json
+        import tempfile
+        import argparse
+        import botengine as module
+
+        def run(command, **kwargs):
+            # Pretend to play back the recording by writing the output of its session
+            session_id = command[command.index("--playback_session") + 1]
+            recording = command[command.index("--playback") + 1]
+            with open("playback_{}_log.txt".format(session_id), "w") as f:
+                f.write("2024-01-01 00:00:00.000000-08:00 INFO     botengine    Running\n")
+                if "broken" in recording:
+                    f.write("2024-01-01 00:00:01.000000-08:00 ERROR    botengine    Traceback (most recent call last):\n")
+                    f.write("ValueError: broken\n")
+                f.write("2024-01-01 00:00:02.000000-08:00 INFO     botengine    Done\n")
+            with open("playback_{}_narratives.txt".format(session_id), "w") as f:
+                f.write("[0 - 2024-01-01T00:00:00-08:00 - NARRATIVE]: title=Hello\n")
+            with open("playback_{}_results.json".format(session_id), "w") as f:
+                json.dump({"states": {"None": {"a": 1}}, "microservices": [{"name": "intelligence.x", "calls": 1, "time": 5}]}, f)
+            return MagicMock(returncode=0)
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.makedirs("recordings")
+                for filename in ["a.json", "broken.jsonl.lz4", "broken.jsonl.lz4.idx", "notes.txt"]:
+                    open(os.path.join("recordings", filename), "w").close()
+
+                args = argparse.Namespace(loglevel="info", server=None, core_directory=None, playback_options="default", playback_start=None, playback_to_now=False)
+                with patch("subprocess.run", side_effect=run) as subprocess_run:
+                    assert module._playback_batch("com.ppc.Bot", "recordings", args, workers=2) == 1
+                    assert subprocess_run.call_count == 2
+
+                report_directory = [filename for filename in os.listdir(".") if filename.startswith("playback_batch_")][0]
+                with open(os.path.join(report_directory, "report.json")) as f:
+                    report = json.load(f)
+
+                a, broken = report["recordings"]
+                assert a["recording"] == os.path.join("recordings", "a.json")
+                assert a["exceptions"] == []
+                assert a["narratives"] == ["[0 - 2024-01-01T00:00:00-08:00 - NARRATIVE]: title=Hello"]
+                assert a["states"] == {"None": {"a": 1}}
+                assert a["microservices"] == [{"name": "intelligence.x", "calls": 1, "time": 5}]
+                assert broken["exceptions"] == ["2024-01-01 00:00:01.000000-08:00 ERROR    botengine    Traceback (most recent call last):\nValueError: broken"]
+                assert os.path.exists(os.path.join(broken["output"], "log.txt"))
+                assert not any(filename.startswith("playback_") and filename.endswith(".txt") for filename in os.listdir("."))
+
+            finally:
+                os.chdir(cwd)
+
+    def test_botengine_timer_store(self):
+        import dill
+        from botengine import BotEngine, TimerStore, TIMERS_VARIABLE_NAME, MAXINT
+
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': 'https://app.host.com'})
+        botengine.inputs = {'time': 1000, 'trigger': 1}
+        botengine._reset_core_variable()
+
+        # Add a logger
+        add_logger(botengine)
+
+        # Timers saved as a sorted list by previous versions are converted
+        botengine.variables['-core-'][TIMERS_VARIABLE_NAME] = [(2000, print, "a", "a"), (3000, print, "b", "b"), (MAXINT, 500, None, None)]
+        saved_timers = botengine._load_timers()
+        assert isinstance(saved_timers, TimerStore)
+        assert saved_timers.modified_ms == 500
+        assert list(saved_timers) == [(2000, print, "a", "a"), (3000, print, "b", "b")]
+
+        # Setting a timer replaces the timer with the same reference
+        botengine.set_alarm(4000, print, "c", "c")
+        botengine.set_alarm(1500, print, "a2", "a")
+        assert botengine.is_timer_running("a")
+        assert botengine.timer_timestamp_ms("a") == 1500
+        assert saved_timers.peek() == (1500, print, "a2", "a")
+
+        botengine.cancel_timers("b")
+        assert not botengine.is_timer_running("b")
+        assert botengine.timer_timestamp_ms("b") is None
+        assert [entry[4] for entry in saved_timers.expired(4000)] == ["a", "c"]
+        assert saved_timers.expired(1000) == []
+
+        # Timers that were reset after they expired are not discarded
+        expired = saved_timers.expired(1500)
+        saved_timers.set(5000, print, "a3", "a")
+        saved_timers.discard(expired[0])
+        assert saved_timers.timestamp_ms("a") == 5000
+
+        # Only live timers are persisted
+        for i in range(100):
+            saved_timers.set(10000 + i, print, None, "t")
+        restored = dill.loads(dill.dumps(saved_timers))
+        assert list(restored) == list(saved_timers) == [(4000, print, "c", "c"), (5000, print, "a3", "a"), (10099, print, None, "t")]
+        assert len(saved_timers.heap) < 20
+
+    def test_botengine_profiler(self):
+        import json
+        import os
+        import tempfile
+        import botengine as module
+        from botengine import BotEngine
+
+        botengine = BotEngine({'apiKey': '1234567890', 'apiHost': 'https://app.host.com'})
+        add_logger(botengine)
+
+        with botengine.profile("variables.pickle.a") as phase:
+            phase.size_bytes = 100
+        with botengine.profile("variables.pickle.a", size_bytes=50):
+            pass
+        with botengine.profile("controller.load"):
+            pass
+
+        # Flushes are profiled without the time spent waiting on other flushes
+        scheduler = module._FlushScheduler(botengine)
+        scheduler.submit("analytics", lambda: None)
+        scheduler.submit("variables", lambda: None, after=["analytics"])
+        scheduler.wait()
+
+        stats = {stat["name"]: stat for stat in botengine.profiler.get_statistics()}
+        assert stats["variables.pickle.a"]["calls"] == 2
+        assert stats["variables.pickle.a"]["bytes"] == 150
+        assert "bytes" not in stats["controller.load"]
+        assert stats["flush.analytics"]["calls"] == 1
+        assert stats["flush.variables"]["calls"] == 1
+
+        filename = os.path.join(tempfile.mkdtemp(), "profile.jsonl")
+        botengine.profiler.write_json_lines(botengine, filename)
+        botengine.profiler.write_json_lines(botengine, filename)
+        with open(filename) as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 2
+        assert lines[0]["phases"][0]["name"] in stats
+
 # Helper functions
 
 def add_logger(botengine):
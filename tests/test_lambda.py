@@ -0,0 +1,91 @@
+import unittest
+import importlib
+import logging
+
+# Import botengine without .py extension, which lambda.py imports
+import imp
+botengine = imp.load_source('botengine', './botengine')
+
+# 'lambda' is a keyword, so the module can only be imported by name
+lambda_module = importlib.import_module('lambda')
+
+
+class Formatted():
+    """
+    Counts how many times it was formatted into a log message
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "formatted"
+
+
+class TestLambda(unittest.TestCase):
+
+    def test_lambda_logger_levels(self):
+        logger = lambda_module.LambdaLogger()
+        assert logger.isEnabledFor(logging.INFO)
+        assert not logger.isEnabledFor(logging.DEBUG)
+
+        # Arguments are only formatted when the level is enabled
+        argument = Formatted()
+        logger.debug("debug %s", argument)
+        assert argument.count == 0
+        assert len(logger.log_events) == 0
+
+        logger.info("info %s", argument)
+        assert argument.count == 1
+        assert logger.log_events[-1]['message'] == "[INFO] lambda info formatted"
+
+        logger.warn("warn {}".format(1))
+        assert logger.error_message == "[WARN] lambda warn 1"
+        assert len(logger.logs) == 1
+
+        # Debug logging formats everything
+        logger = lambda_module.LambdaLogger(log_level="debug")
+        logger.debug("debug %s", argument)
+        assert argument.count == 2
+
+        # Messages that don't match their arguments are still logged
+        logger.debug("debug", argument)
+        assert logger.log_events[-1]['message'].startswith("[DEBUG] lambda debug (")
+
+        # The server may describe the warning level either way
+        logger = lambda_module.LambdaLogger(log_level="warning")
+        assert logger.isEnabledFor(logging.WARNING)
+        assert not logger.isEnabledFor(logging.INFO)
+        logger.get_service_logger("intelligence.test").log("warning", "Careful")
+        assert logger.log_events[-1]['message'] == "[WARN] intelligence.test Careful"
+
+    def test_lambda_logger_service_loggers(self):
+        logger = lambda_module.LambdaLogger()
+        service_logger = logger.get_service_logger("intelligence.test")
+        assert logger.get_service_logger("intelligence.test") is service_logger
+
+        service_logger.info("Hello %s", "world")
+        service_logger.error("Oops")
+        assert [e['message'] for e in logger.log_events] == ["[INFO] intelligence.test Hello world", "[ERROR] intelligence.test Oops"]
+        assert logger.error_message == "[ERROR] intelligence.test Oops"
+
+        # botengine hands out the same handle for each service during a Lambda execution
+        (bot_loggers, bot_logger_config) = (botengine._bot_loggers, botengine._bot_logger_config)
+        try:
+            botengine._bot_loggers = {"botengine": logger}
+            botengine._bot_logger_config = None
+            assert botengine.BotEngine.get_logger("intelligence.test") is service_logger
+            assert logger.service == "lambda"
+        finally:
+            (botengine._bot_loggers, botengine._bot_logger_config) = (bot_loggers, bot_logger_config)
+
+    def test_lambda_logger_log_events_bounded(self):
+        logger = lambda_module.LambdaLogger()
+        for i in range(lambda_module.MAXIMUM_LOG_EVENTS + 10):
+            logger.info("message %s", i)
+
+        # The oldest log events are dropped first
+        response = logger.get_lambda_return()
+        assert len(response['logEvents']) == lambda_module.MAXIMUM_LOG_EVENTS
+        assert response['logEvents'][0]['message'] == "[INFO] lambda message 10"
+        assert isinstance(response['logEvents'], list)